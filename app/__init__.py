@@ -1,5 +1,7 @@
 from flask import Flask
-from .extensions import babel, get_locale
+from .extensions import (babel, get_locale, registry, sparql, result_cache, catalogue_index, viz_store,
+                         metrics, http_cache, assets, search_index, snapshots, result_store)
+from .cli import index_cli, assets_cli, static_cli
 from .routes import main
 
 
@@ -7,9 +9,25 @@ def create_app():
     app = Flask(__name__)
     app.jinja_env.globals['get_locale'] = get_locale
     app.config["BABEL_TRANSLATION_DIRECTORIES"] = "../translations"
+    # Deployment settings (ADMIN_TOKEN, SPARQL_*, CACHE_*, ...) via FLASK_* env vars
+    app.config.from_prefixed_env()
 
     babel.init_app(app, locale_selector=get_locale)
+    registry.init_app(app)
+    sparql.init_app(app)
+    result_store.init_app(app)
+    result_cache.init_app(app)
+    catalogue_index.init_app(app)
+    snapshots.init_app(app)
+    viz_store.init_app(app)
+    search_index.init_app(app)
+    metrics.init_app(app)
+    assets.init_app(app)
+    http_cache.init_app(app)
 
     app.register_blueprint(main)
+    app.cli.add_command(index_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(static_cli)
 
     return app
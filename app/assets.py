@@ -0,0 +1,186 @@
+"""Fingerprinted, precompressed static assets.
+
+`build_assets` copies every file under `app/static` to the assets
+directory with a content hash in its name (`css/style.1a2b3c4d5e.css`),
+rewrites `url(...)` references inside stylesheets to the hashed names and
+writes gzip (and, when the `brotli` package is installed, brotli)
+variants of the compressible ones next to them, plus a `manifest.json`.
+
+At runtime `Assets` makes `url_for('static', ...)` return the hashed URL
+of any file listed in the manifest and serves those with far-future
+`immutable` caching, picking the precompressed variant the client
+accepts. Without a built manifest (development) the plain files are
+served as before.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from urllib.parse import urlsplit
+
+from flask import abort, request, send_file, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.map', '.ttf', '.eot')
+# Smaller files are not worth a compressed variant
+MIN_COMPRESS_SIZE = 512
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _hashed_name(rel_path, content):
+    digest = hashlib.sha1(content).hexdigest()[:10]
+    root, ext = posixpath.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def _rewrite_css(rel_path, text, manifest):
+    """Point relative url(...) references of a stylesheet at hashed files."""
+    base = posixpath.dirname(rel_path)
+
+    def repl(m):
+        quote, url = m.group(1), m.group(2)
+        parts = urlsplit(url)
+        if parts.scheme or parts.netloc or url.startswith(('/', '#', 'data:')):
+            return m.group(0)
+        target = posixpath.normpath(posixpath.join(base, parts.path))
+        hashed = manifest.get(target)
+        if hashed is None:
+            return m.group(0)
+        # The content hash makes any cache-busting query string redundant
+        new = posixpath.relpath(hashed, base or '.')
+        if parts.fragment:
+            new += '#' + parts.fragment
+        return f"url({quote}{new}{quote})"
+
+    return _CSS_URL.sub(repl, text)
+
+
+def _write_variants(path, content):
+    if len(content) < MIN_COMPRESS_SIZE:
+        return
+    with gzip.GzipFile(path + '.gz', 'wb', compresslevel=9, mtime=0) as f:
+        f.write(content)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def build_assets(static_dir, out_dir):
+    """Build hashed copies of `static_dir` into `out_dir`.
+
+    Returns the manifest (logical path -> hashed path). The previous
+    build is replaced.
+    """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            files.append(os.path.relpath(path, static_dir).replace(os.sep, '/'))
+    # Stylesheets last, so the files they reference already have hashes
+    files.sort(key=lambda p: (p.endswith('.css'), p))
+
+    tmp_dir = out_dir.rstrip('/\\') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    manifest = {}
+    for rel_path in files:
+        with open(os.path.join(static_dir, rel_path), 'rb') as f:
+            content = f.read()
+        if rel_path.endswith('.css'):
+            content = _rewrite_css(rel_path, content.decode('utf-8'), manifest).encode('utf-8')
+        hashed = _hashed_name(rel_path, content)
+        manifest[rel_path] = hashed
+        target = os.path.join(tmp_dir, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+        if rel_path.endswith(COMPRESSIBLE):
+            _write_variants(target, content)
+    with open(os.path.join(tmp_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return manifest
+
+
+class Assets:
+    """Serves the built assets of an app's static folder."""
+
+    def __init__(self, max_age=365 * 24 * 3600):
+        self.max_age = max_age
+        self.out_dir = None
+        self.static_dir = None
+        self.url_path = '/static'
+        self.manifest = {}
+        self._hashed = set()
+
+    def init_app(self, app):
+        self.max_age = int(app.config.get('ASSETS_MAX_AGE', self.max_age))
+        self.out_dir = app.config.get('ASSETS_DIR') or os.path.join(app.instance_path, 'assets')
+        self.static_dir = app.static_folder
+        self.url_path = app.static_url_path
+        self.load()
+        app.url_defaults(self._url_defaults)
+        app.jinja_env.filters['static_url'] = self.url
+        app.view_functions['static'] = self.send_static
+        app.extensions['assets'] = self
+
+    def load(self):
+        """(Re)read the manifest of the last build, if any."""
+        try:
+            with open(os.path.join(self.out_dir, MANIFEST), encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self._hashed = set(self.manifest.values())
+
+    def build(self):
+        build_assets(self.static_dir, self.out_dir)
+        self.load()
+        return self.manifest
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static':
+            hashed = self.manifest.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = hashed
+
+    def url(self, url):
+        """Hashed form of a `/static/...` URL, e.g. one from a config."""
+        prefix = self.url_path + '/'
+        if isinstance(url, str) and url.startswith(prefix):
+            hashed = self.manifest.get(url[len(prefix):])
+            if hashed is not None:
+                return prefix + hashed
+        return url
+
+    def send_static(self, filename):
+        if filename not in self._hashed:
+            return send_from_directory(self.static_dir, filename)
+        path = os.path.join(self.out_dir, filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[name] and os.path.exists(path + suffix):
+                path, encoding = path + suffix, name
+                break
+        if not os.path.exists(path):
+            abort(404)
+        resp = send_file(path, mimetype=mimetype, max_age=self.max_age, etag=False)
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        if encoding:
+            resp.content_encoding = encoding
+        if filename.endswith(COMPRESSIBLE):
+            resp.vary.add('Accept-Encoding')
+        return resp
@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+
+# Quoted literals are kept verbatim, any other whitespace run collapses
+_QUERY_TOKENS = re.compile(
+    r'("""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|\s+')
+
+
+def normalize_query(query: str) -> str:
+    """Collapse insignificant whitespace so equivalent queries share a key."""
+    return _QUERY_TOKENS.sub(lambda m: m.group(1) or ' ', query).strip()
+
+
+def query_key(endpoint, query):
+    return (endpoint, normalize_query(query))
+
+
+def resolved(value):
+    """An already completed Future holding `value`."""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class ResultCache:
+    """Bounded in-process LRU cache with per-entry TTL.
+
+    Entries carry a tag (the collection id) so one collection can be
+    flushed without touching the others.
+
+    `fetch` adds request coalescing (concurrent misses of one key share a
+    single computation) and, with `stale_ttl`, stale-while-revalidate:
+    an entry expired less than `stale_ttl` seconds ago is still served
+    while one background refresh replaces it.
+
+    With a `shared` store (see `result_store`), `fetch` looks there
+    before computing a missing value and stores what it computes there,
+    so the other worker processes find it.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=300, stale_ttl=0, shared=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._flights = {}
+        # Bumped by flush: results of queries started before it are dropped
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+
+    def init_app(self, app):
+        self.max_entries = int(app.config.get(
+            'CACHE_MAX_ENTRIES', self.max_entries))
+        self.default_ttl = float(app.config.get(
+            'CACHE_DEFAULT_TTL', self.default_ttl))
+        self.stale_ttl = float(app.config.get(
+            'CACHE_STALE_TTL', self.stale_ttl))
+        app.extensions['result_cache'] = self
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, _tag, value = entry
+            if expires <= now:
+                # Stale entries stay around for `fetch` to serve
+                if expires + self.stale_ttl <= now:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, tag=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._put(key, value, ttl, tag)
+
+    def _put(self, key, value, ttl, tag):
+        """Store `key`; a negative `ttl` stores it as already stale."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, tag, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def fetch(self, key, start, ttl=None, tag=None, refresh=None):
+        """Future of the value of `key`, computed at most once at a time.
+
+        A fresh entry resolves immediately. On a miss, `start()` (returning
+        a Future) computes the value, unless a computation of `key` is
+        already in flight, whose Future is then shared. A stale entry is
+        resolved as is and `refresh()` (default `start`) runs once in the
+        background to replace it. Results are stored with `ttl` and `tag`.
+        A miss found in the shared store is treated like an entry of this
+        cache, fresh or stale.
+        """
+        now = time.monotonic()
+        stale = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, _tag, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return resolved(value)
+                if expires + self.stale_ttl > now:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key in self._flights:
+                        return resolved(value)
+                    stale = value
+                else:
+                    del self._entries[key]
+            if stale is None:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    self.coalesced += 1
+                    return flight
+                self.misses += 1
+            flight = self._flights[key] = Future()
+            generation = self._generation
+        # Shared by several callers: one giving up must not cancel it for all
+        flight.set_running_or_notify_cancel()
+        ttl = self.default_ttl if ttl is None else ttl
+
+        if stale is None and self.shared is not None:
+            found = self.shared.get(key, self.stale_ttl)
+            if found is not None:
+                value, expires_in = found
+                self._put(key, value, expires_in, tag)
+                with self._lock:
+                    self.shared_hits += 1
+                    if expires_in > 0 and self._flights.get(key) is flight:
+                        del self._flights[key]
+                if expires_in > 0:
+                    flight.set_result(value)
+                    return flight
+                stale = value
+
+        def _done(f):
+            try:
+                error = f.exception()
+            except CancelledError as exc:
+                error = exc
+            if error is None and generation == self._generation:
+                # Stored before the flight ends, so later callers hit
+                self.set(key, f.result(), ttl=ttl, tag=tag)
+                if self.shared is not None:
+                    self.shared.set(key, f.result(), ttl, tag=tag)
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            if error is None:
+                flight.set_result(f.result())
+            else:
+                flight.set_exception(error)
+
+        try:
+            future = (refresh or start)() if stale is not None else start()
+        except Exception as exc:
+            future = Future()
+            future.set_exception(exc)
+        future.add_done_callback(_done)
+        return resolved(stale) if stale is not None else flight
+
+    def flush(self, tag=None):
+        """Drop every entry (or only those tagged `tag`); return the count.
+
+        The shared store, if any, is flushed too; other processes keep
+        their in-memory entries until they expire.
+        """
+        if self.shared is not None:
+            self.shared.flush(tag)
+        with self._lock:
+            self._generation += 1
+            if tag is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            tagged = [k for k, (_, t, _) in self._entries.items() if t == tag]
+            for k in tagged:
+                del self._entries[k]
+            return len(tagged)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'stale_hits': self.stale_hits,
+                'shared_hits': self.shared_hits,
+                'in_flight': len(self._flights),
+            }
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
@@ -0,0 +1,338 @@
+"""Local SQLite materialization of each collection's catalogue.
+
+`build_index` pulls the card rows (in both languages) and every filter's
+item -> value memberships from the SPARQL endpoint once; `IndexReader`
+then answers card pages, totals and filter option lists in-process, with
+filter intersections done by SQLite and year ranges through a sorted
+index. The routes fall back to live SPARQL whenever the index is missing,
+older than `INDEX_MAX_AGE` or was built from a different config.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .queries import LANGS, compile_config, paged, range_year
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE cards (lang TEXT, pos INTEGER, item TEXT, sort_key TEXT, row TEXT,
+                    PRIMARY KEY (lang, pos));
+CREATE INDEX cards_item ON cards (lang, item);
+CREATE INDEX cards_sort ON cards (lang, sort_key, item);
+CREATE TABLE facets (lang TEXT, key TEXT, value TEXT, item TEXT,
+                     PRIMARY KEY (lang, key, value, item)) WITHOUT ROWID;
+CREATE INDEX facets_item ON facets (lang, item);
+CREATE TABLE ranges (lang TEXT, key TEXT, begin_year INTEGER, end_year INTEGER, item TEXT);
+CREATE INDEX ranges_years ON ranges (lang, key, begin_year, end_year);
+CREATE TABLE facet_results (lang TEXT, key TEXT, payload TEXT, PRIMARY KEY (lang, key));
+"""
+
+
+def config_fingerprint(config):
+    """Hash of the config parts the index content depends on."""
+    relevant = {k: config.get(k) for k in ('sparql_endpoint', 'cards', 'filters')}
+    raw = json.dumps(relevant, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+def _value(binding, key):
+    x = binding.get(key)
+    return x.get('value') if isinstance(x, dict) else None
+
+
+def _year(binding, key):
+    try:
+        return int(float(_value(binding, key)))
+    except (TypeError, ValueError):
+        return None
+
+
+def build_index(config, path, run, chunk_size=5000):
+    """Materialize one collection into a fresh SQLite file at `path`.
+
+    `run(query)` must execute a SPARQL query and return the JSON result.
+    The file is written next to `path` and swapped in atomically.
+    """
+    compiled = compile_config(config)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        for lang in LANGS:
+            queries = compiled[lang]
+            conn.executemany(
+                "INSERT INTO cards VALUES (?, ?, ?, ?, ?)",
+                ((lang, pos, _value(b, 'item'), _value(b, 'sort_key') or '',
+                  json.dumps(b, separators=(',', ':')))
+                 for pos, b in enumerate(paged(run, queries.all_cards(), chunk_size))))
+
+            for facet in queries.facets:
+                if facet.type == 'range':
+                    conn.executemany(
+                        "INSERT INTO ranges VALUES (?, ?, ?, ?, ?)",
+                        ((lang, facet.key, _year(b, 'b'), _year(b, 'e'), _value(b, 'item'))
+                         for b in paged(run, queries.memberships(facet.key), chunk_size)))
+                elif facet.var:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO facets VALUES (?, ?, ?, ?)",
+                        ((lang, facet.key, _value(b, 'v'), _value(b, 'item'))
+                         for b in paged(run, queries.memberships(facet.key), chunk_size)))
+                if facet.options_query:
+                    raw = run(facet.options_query)
+                    conn.execute("INSERT INTO facet_results VALUES (?, ?, ?)",
+                                 (lang, facet.key, json.dumps(raw, separators=(',', ':'))))
+
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('built_at', str(time.time())),
+            ('fingerprint', config_fingerprint(config)),
+        ])
+        conn.commit()
+        conn.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        conn.close()
+        os.unlink(tmp_path)
+        raise
+
+
+class IndexReader:
+    """Read-only queries against one built collection index."""
+
+    def __init__(self, path, built_at):
+        self.path = path
+        self.built_at = built_at
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def _item_conditions(self, lang, config_filters, selected):
+        """SQL conditions on cards.item mirroring `CardQueries.where`.
+
+        Raises ValueError for a range bound that isn't a year.
+        """
+        conds, params = [], []
+        if not isinstance(selected, dict):
+            return conds, params
+        for group in config_filters or []:
+            key = group.get('key')
+            sel_val = selected.get(key)
+            if not sel_val:
+                continue
+            gtype = (group.get('type') or 'checkbox').lower()
+            if gtype == 'range' and isinstance(sel_val, dict):
+                min_y, max_y = sel_val.get('min'), sel_val.get('max')
+                if min_y is None and max_y is None:
+                    continue
+                sub, sub_params = [], []
+                if isinstance(min_y, (int, float, str)) and str(min_y).strip():
+                    sub.append("end_year >= ?")
+                    sub_params.append(range_year(min_y))
+                if isinstance(max_y, (int, float, str)) and str(max_y).strip():
+                    sub.append("begin_year <= ?")
+                    sub_params.append(range_year(max_y))
+                conds.append(
+                    "item IN (SELECT item FROM ranges WHERE lang = ? AND key = ?"
+                    + "".join(f" AND {c}" for c in sub) + ")")
+                params += [lang, key] + sub_params
+            elif isinstance(sel_val, list) and group.get('var'):
+                marks = ",".join("?" * len(sel_val))
+                conds.append(
+                    "item IN (SELECT item FROM facets WHERE lang = ? AND key = ?"
+                    f" AND value IN ({marks}))")
+                params += [lang, key] + [str(v) for v in sel_val]
+        return conds, params
+
+    def cards(self, lang, config_filters, selected, limit, offset=0, after=None,
+              with_total=True, items=None):
+        """Return (bindings, total) for one page, in the SPARQL JSON shape.
+
+        `items`, if given, restricts the page to those item URIs (search
+        matches).
+        """
+        conds, params = self._item_conditions(lang, config_filters, selected)
+        if items is not None:
+            conds.append("item IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(items)))
+        where = " AND ".join(["lang = ?"] + conds)
+        params = [lang] + params
+        conn = self._connect()
+        try:
+            total = None
+            if with_total:
+                total = conn.execute(
+                    f"SELECT COUNT(DISTINCT item) FROM cards WHERE {where}",
+                    params).fetchone()[0]
+            page_where, page_params = where, list(params)
+            if after:
+                sort_key, item = after
+                page_where += " AND (sort_key > ? OR (sort_key = ? AND item > ?))"
+                page_params += [sort_key, sort_key, item]
+                offset = 0
+            rows = conn.execute(
+                f"SELECT row FROM cards WHERE {page_where} ORDER BY pos LIMIT ? OFFSET ?",
+                page_params + [limit, offset]).fetchall()
+        finally:
+            conn.close()
+        return [json.loads(r[0]) for r in rows], total
+
+    def iter_cards(self, lang, config_filters, selected, chunk_size=1000):
+        """Yield lists of card bindings matching `selected`, in catalogue order."""
+        conds, params = self._item_conditions(lang, config_filters, selected)
+        where = " AND ".join(["lang = ?"] + conds)
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f"SELECT row FROM cards WHERE {where} ORDER BY pos",
+                                  [lang] + params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [json.loads(r[0]) for r in rows]
+        finally:
+            conn.close()
+
+    def item_rows(self, lang, items):
+        """Map item -> its first card binding, for the indexed ones of `items`."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT item, row FROM cards WHERE lang = ?"
+                " AND item IN (SELECT value FROM json_each(?)) ORDER BY pos",
+                (lang, json.dumps(list(items)))).fetchall()
+        finally:
+            conn.close()
+        found = {}
+        for item, row in rows:
+            if item not in found:
+                found[item] = json.loads(row)
+        return found
+
+    def item_values(self, lang, items):
+        """Map item -> {filter key: [values]} of checkbox filters for `items`."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT item, key, value FROM facets WHERE lang = ?"
+                " AND item IN (SELECT value FROM json_each(?)) ORDER BY item, key, value",
+                (lang, json.dumps(list(items)))).fetchall()
+        finally:
+            conn.close()
+        values = {}
+        for item, key, value in rows:
+            values.setdefault(item, {}).setdefault(key, []).append(value)
+        return values
+
+    def facet_counts(self, lang, config_filters, selected, key):
+        """Map value -> item count for facet `key`, ignoring its own selection."""
+        others = {k: v for k, v in (selected or {}).items() if k != key}
+        conds, params = self._item_conditions(lang, config_filters, others)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT value, COUNT(DISTINCT item) FROM facets"
+                " WHERE lang = ? AND key = ? AND item IN (SELECT item FROM cards WHERE "
+                + " AND ".join(["lang = ?"] + conds) + ") GROUP BY value",
+                [lang, key, lang] + params).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def titles(self, lang):
+        """Yield (item, sort key, [title, label]) of every card row."""
+        conn = self._connect()
+        try:
+            for item, sort_key, row in conn.execute(
+                    "SELECT item, sort_key, row FROM cards WHERE lang = ?", (lang,)):
+                binding = json.loads(row)
+                yield item, sort_key, [_value(binding, k) or '' for k in ('title', 'label')]
+        finally:
+            conn.close()
+
+    def facet_result(self, lang, key):
+        """Stored SPARQL JSON result of a filter's option/range query."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT payload FROM facet_results WHERE lang = ? AND key = ?",
+                (lang, key)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+
+class CatalogueIndex:
+    """Locates per-collection index files and decides whether they are fresh."""
+
+    def __init__(self, index_dir=None, max_age=24 * 3600):
+        self.index_dir = index_dir
+        self.max_age = max_age
+        self._meta = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.index_dir = app.config.get(
+            'INDEX_DIR', os.path.join(app.instance_path, 'catalogue-index'))
+        self.max_age = float(app.config.get('INDEX_MAX_AGE', self.max_age))
+        app.extensions['catalogue_index'] = self
+
+    def path(self, collection_id):
+        return os.path.join(self.index_dir, f"{collection_id}.sqlite")
+
+    def _read_meta(self, path):
+        """Return the meta table of `path`, re-read only when the file changes."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._meta.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+            finally:
+                conn.close()
+        except sqlite3.Error as exc:
+            logger.warning("Unreadable catalogue index %s: %s", path, exc)
+            return None
+        with self._lock:
+            self._meta[path] = (mtime, meta)
+        return meta
+
+    def _fingerprint(self, collection_id, config):
+        # Registry configs are shared objects, replaced on reload
+        cached = self._fingerprints.get(collection_id)
+        if cached and cached[0] is config:
+            return cached[1]
+        fingerprint = config_fingerprint(config)
+        self._fingerprints[collection_id] = (config, fingerprint)
+        return fingerprint
+
+    def reader(self, collection_id, config):
+        """IndexReader for a fresh index of `collection_id`, else None."""
+        if self.index_dir is None:
+            return None
+        path = self.path(collection_id)
+        meta = self._read_meta(path)
+        if not meta:
+            return None
+        built_at = float(meta.get('built_at', 0))
+        if self.max_age > 0 and time.time() - built_at > self.max_age:
+            return None
+        if meta.get('fingerprint') != self._fingerprint(collection_id, config):
+            return None
+        return IndexReader(path, built_at)
+
+    def build(self, collection_id, config, run, chunk_size=5000):
+        build_index(config, self.path(collection_id), run, chunk_size=chunk_size)
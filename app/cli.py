@@ -0,0 +1,96 @@
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .extensions import assets, catalogue_index, registry, sparql
+from .static_site import SiteExport
+
+index_cli = AppGroup('index', help="Build and inspect the local catalogue index.")
+assets_cli = AppGroup('assets', help="Build fingerprinted static assets.")
+static_cli = AppGroup('static', help="Export the portal as static files.")
+
+
+def _target_collections(collection_ids):
+    ids = list(collection_ids) or [
+        c['id'] for c in registry.collections() if registry.config(c['id'])]
+    for collection_id in ids:
+        config = registry.config(collection_id)
+        if config is None:
+            raise click.BadParameter(
+                f"Unknown collection or missing config: {collection_id}")
+        yield collection_id, config
+
+
+@index_cli.command('build')
+@click.argument('collection_ids', nargs=-1)
+@click.option('--chunk-size', default=5000, show_default=True,
+              help="Rows fetched per SPARQL request.")
+def build_index_command(collection_ids, chunk_size):
+    """(Re)build the index of the given collections, or of all of them.
+
+    Meant to be run on demand or from cron; the running app picks up the
+    new file on its next request.
+    """
+    for collection_id, config in _target_collections(collection_ids):
+        endpoint = config['sparql_endpoint']
+        started = time.monotonic()
+        catalogue_index.build(collection_id, config,
+                              lambda q: sparql.query(endpoint, q, label='index'),
+                              chunk_size=chunk_size)
+        click.echo(f"{collection_id}: built in {time.monotonic() - started:.1f}s "
+                   f"-> {catalogue_index.path(collection_id)}")
+
+
+@index_cli.command('status')
+@click.argument('collection_ids', nargs=-1)
+def index_status_command(collection_ids):
+    """Show whether each collection's index is fresh enough to be used."""
+    for collection_id, config in _target_collections(collection_ids):
+        reader = catalogue_index.reader(collection_id, config)
+        if reader is None:
+            click.echo(f"{collection_id}: missing or stale (SPARQL fallback)")
+        else:
+            built = datetime.fromtimestamp(reader.built_at).isoformat(timespec='seconds')
+            click.echo(f"{collection_id}: fresh, built {built}")
+
+
+@assets_cli.command('build')
+def build_assets_command():
+    """Hash, rewrite and precompress app/static into ASSETS_DIR.
+
+    Run on deploy, before starting the app: workers read the manifest
+    at startup.
+    """
+    started = time.monotonic()
+    manifest = assets.build()
+    click.echo(f"{len(manifest)} files in {time.monotonic() - started:.1f}s -> {assets.out_dir}")
+
+
+@static_cli.command('build')
+@click.argument('out_dir', type=click.Path(file_okay=False))
+@click.argument('collection_ids', nargs=-1)
+@click.option('--lang', 'langs', multiple=True, default=('it', 'en'), show_default=True,
+              type=click.Choice(['it', 'en']), help="Languages to export.")
+@click.option('--base-path', default='', help="URL path the site is served under.")
+@click.option('--workers', type=int, default=None,
+              help="Processes rendering item pages [default: CPU count].")
+@click.option('--chunk-size', default=500, show_default=True,
+              help="Items read per SPARQL request.")
+@click.option('--full', is_flag=True, help="Re-render every item, changed or not.")
+def build_static_command(out_dir, collection_ids, langs, base_path, workers, chunk_size, full):
+    """Pre-render every page of the given collections, or of all of them.
+
+    Later runs only re-render the items whose data changed. Build the
+    assets first to export the fingerprinted ones.
+    """
+    started = time.monotonic()
+    ids = [collection_id for collection_id, _ in _target_collections(collection_ids)]
+    run = SiteExport(current_app._get_current_object(), out_dir, base_path=base_path,
+                     workers=workers, chunk_size=chunk_size, full=full, echo=click.echo)
+    stats = run.run(ids, list(langs))
+    click.echo(f"{stats['pages']} pages, {stats['items']} items rendered "
+               f"({stats['unchanged']} unchanged, {stats['degraded']} degraded, "
+               f"{stats['removed']} removed) in {time.monotonic() - started:.1f}s -> {out_dir}")
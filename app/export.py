@@ -0,0 +1,124 @@
+"""Streaming export of a filtered catalogue as NDJSON or CSV.
+
+Cards are pulled in chunks (keyset pages from the SPARQL endpoint, or a
+cursor over the SQLite catalogue index) and written out chunk by chunk,
+so memory use depends on the chunk size, not on the result size.
+"""
+import csv
+import io
+import json
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+CARD_FIELDS = ('id', 'title', 'begin', 'end', 'type_label', 'technique_label',
+               'conservation_org_label')
+
+
+def _value(binding, key):
+    x = binding.get(key)
+    return x.get('value') if isinstance(x, dict) else None
+
+
+def position(binding):
+    """(sort key, item) of a cursor page binding."""
+    return _value(binding, 'sort_key') or '', _value(binding, 'item') or ''
+
+
+def card(binding):
+    """Card fields of one SPARQL binding."""
+    item = _value(binding, 'item') or _value(binding, 'id') or _value(binding, 'uri')
+    return {
+        'id': item,
+        'title': _value(binding, 'title') or _value(binding, 'label') or (item or 'Untitled'),
+        # Optional metadata, when present in the SELECT
+        'begin': _value(binding, 'begin'),
+        'end': _value(binding, 'end'),
+        'type_label': _value(binding, 'type_label'),
+        'technique_label': _value(binding, 'technique_label'),
+        'conservation_org_label': _value(binding, 'conservation_org_label'),
+    }
+
+
+def value_facets(queries):
+    """Keys of the filters whose values can be listed per item."""
+    return [f.key for f in queries.facets if f.type != 'range' and f.var]
+
+
+def sparql_chunks(queries, selected, run, chunk_size):
+    """Yield lists of card bindings matching `selected`, in catalogue order.
+
+    `run(query)` must execute a SPARQL query and return the JSON result.
+    Chunks are keyset pages, so the endpoint never skips OFFSET rows.
+    """
+    after = None
+    while True:
+        rows = run(queries.cursor_page(selected, chunk_size, 0, after))['results']['bindings']
+        if len(rows) < chunk_size:
+            if rows:
+                yield rows
+            return
+        # An item can span several rows (e.g. one per type): hold back the
+        # rows of the last item and start the next chunk with it
+        last = position(rows[-1])
+        cut = len(rows)
+        while cut > 0 and position(rows[cut - 1]) == last:
+            cut -= 1
+        if cut == 0:
+            cut = len(rows)
+        yield rows[:cut]
+        after = position(rows[cut - 1])
+
+
+def sparql_item_values(queries, items, run):
+    """Map item -> {filter key: [values]} for `items`."""
+    values = {}
+    for key in value_facets(queries):
+        raw = run(queries.memberships(key, items))
+        for b in raw['results']['bindings']:
+            item, value = _value(b, 'item'), _value(b, 'v')
+            if item and value:
+                values.setdefault(item, {}).setdefault(key, []).append(value)
+    return values
+
+
+def cards(chunks, item_values=None):
+    """Yield lists of cards from chunks of bindings.
+
+    `item_values(items)`, if given, returns item -> {filter key: [values]};
+    each card then gets them under `filters`.
+    """
+    for bindings in chunks:
+        rows = [card(b) for b in bindings]
+        if item_values is not None:
+            values = item_values(list(dict.fromkeys(r['id'] for r in rows if r['id'])))
+            for row in rows:
+                row['filters'] = values.get(row['id'], {})
+        yield rows
+
+
+def ndjson(chunks):
+    """Yield one NDJSON text block per chunk of cards."""
+    for rows in chunks:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def csv_text(chunks, facet_keys=()):
+    """Yield CSV text: a header, then one block per chunk of cards.
+
+    Filter values (when exported) get one column per filter key, joined
+    with '|'.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CARD_FIELDS + tuple(facet_keys))
+    yield buf.getvalue()
+    for rows in chunks:
+        buf.seek(0)
+        buf.truncate()
+        for row in rows:
+            filters = row.get('filters') or {}
+            writer.writerow([row.get(f) or '' for f in CARD_FIELDS]
+                            + ['|'.join(filters.get(k, ())) for k in facet_keys])
+        yield buf.getvalue()
@@ -1,5 +1,16 @@
 from flask import request
 from flask_babel import Babel
+from .registry import CollectionRegistry
+from .sparql import SparqlClient
+from .cache import ResultCache
+from .result_store import SharedResultStore
+from .catalogue_index import CatalogueIndex
+from .viz import VizStore
+from .snapshots import SnapshotStore
+from .metrics import Metrics
+from .http_cache import HttpCache
+from .assets import Assets
+from .search import SearchIndex
 
 
 def get_locale():
@@ -18,3 +29,14 @@ def get_locale():
 
 
 babel = Babel()
+registry = CollectionRegistry()
+sparql = SparqlClient()
+result_store = SharedResultStore()
+result_cache = ResultCache(shared=result_store)
+catalogue_index = CatalogueIndex()
+snapshots = SnapshotStore()
+viz_store = VizStore(sparql, snapshots)
+metrics = Metrics(sparql, registry)
+http_cache = HttpCache(registry)
+assets = Assets()
+search_index = SearchIndex(registry, sparql, catalogue_index)
@@ -0,0 +1,95 @@
+"""Conditional GET support for the pages and JSON APIs.
+
+A response's ETag is derived up front from what it depends on (the
+release, the registry/config version, the knowledge-graph version, the
+language and the normalized request), so a matching `If-None-Match` is
+answered with 304 before any SPARQL runs. The knowledge graph has no
+version of its own: operators set `KG_VERSION` (or a collection's
+`kg_version` config key) when they reload data. Without one, data-bearing
+responses fall back to an ETag hashed from the rendered body, which still
+saves the transfer but not the work.
+"""
+import hashlib
+import json
+import os
+
+from flask import current_app, request
+
+
+def _tree_digest(digest, root):
+    """Feed every file under `root` (path and content) into `digest`."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            digest.update(os.path.relpath(path, root).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+
+
+class HttpCache:
+    """Builds validators and cache headers for views."""
+
+    def __init__(self, registry, max_age=300):
+        self.registry = registry
+        self.max_age = max_age
+        self.kg_version = None
+        self.release = ''
+
+    def init_app(self, app):
+        self.max_age = int(app.config.get('HTTP_MAX_AGE', self.max_age))
+        self.kg_version = app.config.get('KG_VERSION', self.kg_version)
+        # Templates, translations and assets change what pages render: a
+        # deploy must not be answered with 304s for the previous release.
+        release = app.config.get('RELEASE')
+        if not release:
+            digest = hashlib.sha1()
+            for root in (app.template_folder, app.static_folder,
+                         app.config.get('BABEL_TRANSLATION_DIRECTORIES')):
+                if root:
+                    _tree_digest(digest, os.path.join(app.root_path, root))
+            # Built assets change the URLs pages link to
+            assets = app.extensions.get('assets')
+            if assets is not None:
+                digest.update(json.dumps(assets.manifest, sort_keys=True).encode('utf-8'))
+            release = digest.hexdigest()
+        self.release = str(release)
+        app.extensions['http_cache'] = self
+
+    def etag(self, lang, *parts, config=None):
+        """ETag for a response in `lang` identified by `parts`.
+
+        Pass the collection `config` when the response carries knowledge
+        graph data; None is returned if that data has no known version.
+        """
+        kg_version = None
+        if config is not None:
+            kg_version = config.get('kg_version') or self.kg_version
+            if not kg_version:
+                return None
+        raw = json.dumps([self.release, self.registry.version(), str(kg_version),
+                          lang, parts], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def not_modified(self, etag, vary_lang=True):
+        """A 304 response if the client already holds `etag`, else None."""
+        if etag is None or not request.if_none_match.contains(etag):
+            return None
+        return self.finish(current_app.response_class(status=304), etag, vary_lang)
+
+    def finish(self, resp, etag=None, vary_lang=True, max_age=None):
+        """Add validator and cache headers, answering 304 when they match.
+
+        `vary_lang` is for responses whose language comes from
+        `get_locale` (cookie first, then Accept-Language) rather than an
+        explicit `lang` parameter.
+        """
+        if etag is None:
+            resp.add_etag()
+        else:
+            resp.set_etag(etag)
+        resp.cache_control.public = True
+        resp.cache_control.max_age = self.max_age if max_age is None else max_age
+        if vary_lang:
+            resp.vary.update(('Cookie', 'Accept-Language'))
+        return resp.make_conditional(request)
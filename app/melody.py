@@ -0,0 +1,107 @@
+"""Server-side rendering of Melody item configs.
+
+A Melody config maps block ids ("01", "02", ...) to a SPARQL query
+(with `<<<uri1>>>` and `$LANG$` placeholders) plus either an HTML
+`content` template with `<<<var>>>` slots (`text`) or chart encodings
+(`data_viz`). Only those two block types are rendered here; configs
+using anything else are left to the external Melody API.
+"""
+import json
+import os
+import re
+import threading
+
+from markupsafe import Markup, escape
+
+from .registry import _load_json, _mtime
+
+BLOCK_TYPES = ('text', 'data_viz')
+
+_SLOT = re.compile(r'<<<(\w+)>>>')
+
+_configs = {}
+_lock = threading.Lock()
+
+
+def load_config(path):
+    """Parsed Melody config at `path`, re-read only when the file changes."""
+    mtime = _mtime(path)
+    if mtime is None:
+        return None
+    cached = _configs.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    config = _load_json(path)
+    if not isinstance(config.get('content'), dict):
+        raise ValueError(f"{path}: Melody config without a 'content' object")
+    with _lock:
+        _configs[path] = (mtime, config)
+    return config
+
+
+def supported(config):
+    return all(b.get('type') in BLOCK_TYPES for b in config['content'].values())
+
+
+def block_queries(config, item_uri, lang, default_endpoint):
+    """Yield (block_id, block, endpoint, query) in config order."""
+    for block_id, block in sorted(config['content'].items()):
+        query = (block['query']
+                 .replace('<<<uri1>>>', f"<{item_uri}>")
+                 .replace('$LANG$', lang))
+        yield block_id, block, block.get('sparql_endpoint') or default_endpoint, query
+
+
+def _rows(raw):
+    for b in raw['results']['bindings']:
+        yield {k: v.get('value') for k, v in b.items() if isinstance(v, dict)}
+
+
+def render_text(block, raw):
+    """Fill `<<<var>>>` slots; several rows give comma-joined distinct values.
+
+    Blocks whose slots all come back unbound render to nothing.
+    """
+    template = block.get('content') or ''
+    slots = set(_SLOT.findall(template))
+    values = {name: [] for name in slots}
+    for row in _rows(raw):
+        for name in slots:
+            v = row.get(name)
+            if v and v not in values[name]:
+                values[name].append(v)
+    if slots and not any(values.values()):
+        return Markup('')
+    return Markup(_SLOT.sub(
+        lambda m: str(escape(', '.join(values.get(m.group(1), [])))), template))
+
+
+def render_data_viz(block, raw):
+    """Chart container read by `melody_item.js` (rows keyed by encodings)."""
+    enc = block.get('encodings') or {}
+    fields = {k: enc.get(k, k) for k in ('item', 'begin', 'end')}
+    rows = [{k: row.get(var) for k, var in fields.items()} for row in _rows(raw)]
+    data = json.dumps({'viz_type': block.get('viz_type'), 'encodings': enc,
+                       'rows': rows}, separators=(',', ':'))
+    return Markup('<div class="melody-data-viz" data-config="{}"><canvas></canvas></div>'
+                  ).format(data)
+
+
+RENDERERS = {
+    'text': render_text,
+    'data_viz': render_data_viz,
+}
+
+
+def render_block(block, raw):
+    return RENDERERS[block['type']](block, raw)
+
+
+def static_path(static_dir, url):
+    """Filesystem path for a `/static/...` URL, or None if it is elsewhere."""
+    if not isinstance(url, str) or not url.startswith('/static/'):
+        return None
+    path = os.path.normpath(os.path.join(static_dir, url[len('/static/'):]))
+    if not path.startswith(os.path.normpath(static_dir) + os.sep):
+        return None
+    return path
@@ -0,0 +1,189 @@
+"""Request and SPARQL instrumentation.
+
+Every SPARQL call reported by the client is attributed to the request
+that made it (through a context variable that `SparqlClient.submit`
+carries into its worker threads) and lands in three places:
+
+- a `Server-Timing` header on the response, one entry per query;
+- the slow-query log, with the final query text, past `SLOW_QUERY_SECONDS`;
+- Prometheus histograms/counters rendered by `Metrics.render()`.
+"""
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_trace = ContextVar('request_trace', default=None)
+
+_UNSAFE = re.compile(r'[^\w:.\-/]')
+
+
+class _Trace:
+    def __init__(self, collection):
+        self.collection = collection or ''
+        self.started = time.perf_counter()
+        self.queries = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+class _Histogram:
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0, 0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, count, total) in sorted(self._series.items()):
+            base = _labels(self.label_names, labels)
+            for bound, n in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{{{base},le="{bound}"}} {n}'
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {count}'
+            yield f'{self.name}_count{{{base}}} {count}'
+            yield f'{self.name}_sum{{{base}}} {total:.6f}'
+
+
+class _Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+
+    def inc(self, labels, amount=1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self._series.items()):
+            yield f'{self.name}{{{_labels(self.label_names, labels)}}} {value}'
+
+
+class Metrics:
+    """Collects per-request and per-query timings for a Flask app."""
+
+    def __init__(self, client, registry=None, slow_query_seconds=1.0, server_timing=True):
+        self.client = client
+        self.registry = registry
+        self.slow_query_seconds = slow_query_seconds
+        self.server_timing = server_timing
+        self._lock = threading.Lock()
+        self.request_duration = _Histogram(
+            'portal_request_duration_seconds', "Time spent in a view.",
+            ('collection', 'route'))
+        self.requests = _Counter(
+            'portal_requests_total', "Responses sent, by status code.",
+            ('collection', 'route', 'status'))
+        self.query_duration = _Histogram(
+            'portal_sparql_query_duration_seconds', "SPARQL round trip time.",
+            ('collection', 'query', 'endpoint'))
+        self.query_errors = _Counter(
+            'portal_sparql_errors_total', "SPARQL calls that raised.",
+            ('collection', 'query', 'endpoint'))
+        self.query_bytes = _Counter(
+            'portal_sparql_response_bytes_total', "SPARQL response body bytes.",
+            ('collection', 'query', 'endpoint'))
+        self.query_rows = _Counter(
+            'portal_sparql_rows_total', "SPARQL result rows.",
+            ('collection', 'query', 'endpoint'))
+
+    def init_app(self, app):
+        self.slow_query_seconds = float(app.config.get(
+            'SLOW_QUERY_SECONDS', self.slow_query_seconds))
+        self.server_timing = bool(app.config.get('SERVER_TIMING', self.server_timing))
+        if self.on_query not in self.client.listeners:
+            self.client.listeners.append(self.on_query)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.extensions['metrics'] = self
+
+    def on_query(self, event):
+        trace = _trace.get()
+        collection = trace.collection if trace else ''
+        # Parametrised labels ('block:05') are kept: they are config keys
+        labels = (collection, event.label or 'other', event.endpoint)
+        with self._lock:
+            self.query_duration.observe(labels, event.duration)
+            self.query_bytes.inc(labels, event.nbytes)
+            if event.rows is not None:
+                self.query_rows.inc(labels, event.rows)
+            if event.error is not None:
+                self.query_errors.inc(labels)
+        if trace is not None:
+            trace.queries.append(event)
+        if 0 < self.slow_query_seconds <= event.duration:
+            logger.warning(
+                "Slow SPARQL query %s for %s on %s: %.3fs, %s rows, %d bytes%s\n%s",
+                event.label or 'other', collection or '-', event.endpoint,
+                event.duration, event.rows, event.nbytes,
+                f" (failed: {event.error})" if event.error else '', event.query)
+
+    def _start(self):
+        view_args = request.view_args or {}
+        _trace.set(_Trace(self._collection_label(view_args.get('collection_id'))))
+
+    def _collection_label(self, collection_id):
+        """`collection_id` if the registry knows it: ids come from the URL,
+        and labelling by any of them would let clients add series at will."""
+        if not collection_id:
+            return ''
+        if self.registry is None or self.registry.get(collection_id) is None:
+            return 'unknown'
+        return collection_id
+
+    def _finish(self, response):
+        trace = _trace.get()
+        if trace is None:
+            return response
+        _trace.set(None)
+        elapsed = time.perf_counter() - trace.started
+        route = request.endpoint or 'none'
+        with self._lock:
+            self.request_duration.observe((trace.collection, route), elapsed)
+            self.requests.inc((trace.collection, route, str(response.status_code)))
+        if self.server_timing:
+            entries = [
+                f'sparql-{i};desc="{_UNSAFE.sub("_", q.label or "other")}";'
+                f'dur={q.duration * 1000:.1f}'
+                for i, q in enumerate(trace.queries, 1)
+            ]
+            entries.append(f'app;dur={elapsed * 1000:.1f}')
+            response.headers.add('Server-Timing', ', '.join(entries))
+        return response
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            for metric in (self.request_duration, self.requests, self.query_duration,
+                           self.query_errors, self.query_bytes, self.query_rows):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
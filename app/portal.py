@@ -0,0 +1,83 @@
+"""Portal-wide card listing: a k-way merge of per-collection pages.
+
+Every collection lists its cards ordered by (sort key, item). The portal
+listing fetches the next `limit` cards of each collection after its own
+position and merges them. A card can only be emitted once every
+collection that may still have cards has one at or after it, so each
+page is exact without fetching more than `limit` cards per collection.
+The cursor holds each collection's position and that of the listing.
+
+A collection left out of a page keeps its position, so none of its cards
+are skipped. It is then behind: once back, its cards sorting before the
+listing's position come first, out of order, and are flagged as late.
+"""
+import base64
+import heapq
+import json
+
+from .export import position
+
+
+def encode_cursor(positions, done, behind=(), last=None):
+    raw = json.dumps({'after': positions, 'done': sorted(done), 'behind': sorted(behind),
+                      'last': last}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return ({collection id: (sort key, item)}, {finished collection ids},
+    {collection ids behind the listing}, (sort key, item) of the listing
+    or None).
+
+    Raises ValueError on a malformed cursor.
+    """
+    if not cursor:
+        return {}, set(), set(), None
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        positions = {cid: (str(sk), str(item)) for cid, (sk, item) in raw['after'].items()}
+        done = {str(cid) for cid in raw['done']}
+        behind = {str(cid) for cid in raw.get('behind') or ()}
+        last = raw.get('last')
+        if last is not None:
+            sort_key, item = last
+            last = (str(sort_key), str(item))
+    except (ValueError, TypeError, KeyError, AttributeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    return positions, done, behind, last
+
+
+def merge(pages, limit):
+    """Merge `pages`, collection id -> (bindings in (sort key, item) order,
+    whether more may follow), into one page of at most `limit` cards.
+
+    Returns ([(collection id, binding)], {collection id: (sort key, item)
+    of its last card on the page}, {collection ids with nothing left}).
+    Items spanning several bindings keep their first one.
+    """
+    streams, bound = [], None
+    for collection_id, (rows, more) in pages.items():
+        entries, last = [], None
+        for row in rows:
+            key = position(row)
+            if key != last:
+                entries.append((key, collection_id, row))
+                last = key
+        if more and entries:
+            # Its unseen cards all sort after its last fetched one
+            bound = last if bound is None else min(bound, last)
+        streams.append(entries)
+    merged, positions = [], {}
+    for key, collection_id, row in heapq.merge(*streams, key=lambda e: (e[0], e[1])):
+        if len(merged) == limit or (bound is not None and key > bound):
+            break
+        merged.append((collection_id, row))
+        positions[collection_id] = key
+    emitted = {}
+    for collection_id, _ in merged:
+        emitted[collection_id] = emitted.get(collection_id, 0) + 1
+    done = set()
+    for (collection_id, (_, more)), entries in zip(pages.items(), streams):
+        if not more and emitted.get(collection_id, 0) == len(entries):
+            done.add(collection_id)
+    return merged, positions, done
@@ -0,0 +1,396 @@
+import base64
+import json
+import math
+import re
+
+LANGS = ('it', 'en')
+
+_PREFIXES = "\n".join([
+    "PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>",
+    "PREFIX lrmoo: <http://iflastandards.info/ns/lrm/lrmoo/>",
+    "PREFIX aat: <http://vocab.getty.edu/page/aat/>",
+    "PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>",
+])
+
+# lang(?title) = "it" (or EN)
+_LANG_EQ = re.compile(
+    r'(?i)(lang\s*\(\s*\?[A-Za-z0-9_]+\s*\)\s*=\s*")(?:(?:it)|(?:en))("\s*)')
+# LANGMATCHES(lang(?x), "it")
+_LANGMATCHES = re.compile(
+    r'(?i)(langmatches\s*\(\s*lang\s*\(\s*\?[A-Za-z0-9_]+\s*\)\s*,\s*")(?:(?:it)|(?:en))("\s*\))')
+# String literals are skipped when looking for a top-level OPTIONAL
+_WHERE_TOKENS = re.compile(
+    r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|[{}]|(?i:\bOPTIONAL\b)')
+# Variables, skipping string literals
+_VARIABLES = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|[?$](\w+)')
+# Characters not allowed inside an IRIREF
+_BAD_IRI = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+def sparql_prefixes():
+    return _PREFIXES
+
+
+def inject_lang(query: str, lang: str) -> str:
+    """Replace $LANG$ placeholders and simple lang(?var) = "it|en" patterns.
+
+    Keeps the rest of the query intact. Case-insensitive for the LANG function.
+    """
+    if not isinstance(query, str):
+        return query
+    out = query.replace("$LANG$", lang)
+    out = _LANG_EQ.sub(lambda m: m.group(1) + lang + m.group(2), out)
+    return _LANGMATCHES.sub(lambda m: m.group(1) + lang + m.group(2), out)
+
+
+def order_var(select_clause: str):
+    """Variable the cards are sorted by: ?title, else ?label, else None."""
+    return "?title" if "?title" in select_clause else (
+        "?label" if "?label" in select_clause else None)
+
+
+def sparql_string(value) -> str:
+    """Quote a Python value as a SPARQL string literal."""
+    text = str(value)
+    for raw, esc in (('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\r', '\\r')):
+        text = text.replace(raw, esc)
+    return f'"{text}"'
+
+
+def sparql_iri(value) -> str:
+    """Write `value` as an IRI term; raises ValueError if it can't be one."""
+    text = str(value)
+    if not text or _BAD_IRI.search(text):
+        raise ValueError(f"Not a valid IRI: {text!r}")
+    return f"<{text}>"
+
+
+def range_year(value) -> int:
+    """Year of a range filter bound; raises ValueError unless it is a
+    finite number that fits an SQLite integer."""
+    year = float(value)
+    if not math.isfinite(year) or abs(year) >= 2 ** 63:
+        raise ValueError(f"Not a year: {value!r}")
+    return int(year)
+
+
+def _variables(text: str):
+    return {m.group(1) for m in _VARIABLES.finditer(text) if m.group(1)}
+
+
+def _split_optional(where: str):
+    """Split a WHERE body before its first top-level OPTIONAL.
+
+    Selection fragments go between the two halves: engines then narrow
+    the required patterns before evaluating the OPTIONAL blocks instead
+    of joining the filters against every optional solution. Only
+    fragments not using variables of the second half alone move: for
+    those the result is the same either way.
+    """
+    depth = 0
+    for m in _WHERE_TOKENS.finditer(where):
+        tok = m.group(0)
+        if tok == '{':
+            depth += 1
+        elif tok == '}':
+            depth -= 1
+        elif depth == 0 and tok.upper() == 'OPTIONAL':
+            return where[:m.start()].strip(), where[m.start():].strip()
+    return where.strip(), ''
+
+
+class _Facet:
+    """One `filters` entry with its language-specific option query."""
+
+    def __init__(self, group, lang):
+        self.key = group.get('key')
+        self.type = (group.get('type') or 'checkbox').lower()
+        self.var = group.get('var') or ''
+        self.triples = (group.get('triples') or '').strip()
+        self.value_type = (group.get('value_type') or 'uri').lower()
+        self.begin_var = group.get('begin_var', '?begin')
+        self.end_var = group.get('end_var', '?end')
+        query = group.get('range_query') if self.type == 'range' else group.get('query')
+        self.options_query = query.replace('$LANG$', lang) if query else None
+
+    def fragments(self, sel_val):
+        """Triples plus the VALUES/FILTER lines restricting items to `sel_val`."""
+        parts = []
+        if self.type == 'range':
+            if not isinstance(sel_val, dict):
+                return parts
+            # Expect begin/end year overlap against provided min/max
+            min_y, max_y = sel_val.get('min'), sel_val.get('max')
+            if min_y is None and max_y is None:
+                return parts
+            if self.triples:
+                parts.append(self.triples)
+            conds = []
+            if isinstance(min_y, (int, float, str)) and str(min_y).strip():
+                conds.append(f"YEAR({self.end_var}) >= {range_year(min_y)}")
+            if isinstance(max_y, (int, float, str)) and str(max_y).strip():
+                conds.append(f"YEAR({self.begin_var}) <= {range_year(max_y)}")
+            if conds:
+                parts.append(f"FILTER( {' && '.join(conds)} )")
+            return parts
+
+        # Default: checkbox/URIs or literal VALUES
+        if self.triples:
+            parts.append(self.triples)
+        if self.var and isinstance(sel_val, list) and sel_val:
+            term = sparql_string if self.value_type == 'literal' else sparql_iri
+            parts.append(f"VALUES {self.var} {{ {' '.join(term(v) for v in sel_val)} }}")
+        return parts
+
+
+class CardQueries:
+    """Card, count, item and facet queries of one collection in one language.
+
+    Built once per config load: the request path only slots in the
+    selection fragments and LIMIT/OFFSET.
+    """
+
+    def __init__(self, config, lang):
+        cards = config['cards']
+        self.lang = lang
+        self.select = inject_lang(cards['select'], lang)
+        self.limit = int(cards.get('limit', 24))
+        self._head, self._tail = _split_optional(inject_lang(cards['where'], lang))
+        # Variables only the OPTIONAL half can bind
+        self._optional_vars = _variables(self._tail) - _variables(self._head)
+        self.sort_var = order_var(self.select)
+        self.sort_expr = f"LCASE(STR({self.sort_var}))" if self.sort_var else None
+        self.facets = [_Facet(g, lang) for g in config.get('filters') or []]
+        self._facets = {f.key: f for f in self.facets}
+
+    def facet(self, key):
+        return self._facets.get(key)
+
+    def where(self, selected=None, extra=()):
+        """WHERE body for `selected` (filter key -> URIs or {min, max})."""
+        fragments = []
+        if isinstance(selected, dict):
+            for facet in self.facets:
+                sel_val = selected.get(facet.key)
+                if sel_val:
+                    fragments.extend(facet.fragments(sel_val))
+        fragments.extend(extra)
+        parts, after = [self._head], []
+        for fragment in fragments:
+            # Joined ahead of the OPTIONALs only when that can't change the result
+            (after if _variables(fragment) & self._optional_vars else parts).append(fragment)
+        if self._tail:
+            parts.append(self._tail)
+        return "\n".join(parts + after)
+
+    def count(self, selected):
+        return f"""
+{_PREFIXES}
+SELECT (COUNT(DISTINCT ?item) AS ?total)
+WHERE {{
+  {self.where(selected)}
+}}
+"""
+
+    def page(self, selected, limit, offset):
+        # Same order as `cursor_page`, so both page through one sequence
+        order = f"{self.sort_expr} STR(?item)" if self.sort_expr else "STR(?item)"
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT {self.select}
+WHERE {{
+  {self.where(selected)}
+}}
+ORDER BY {order}
+LIMIT {int(limit)}
+OFFSET {int(offset)}
+"""
+
+    def cursor_page(self, selected, limit, offset, after=None):
+        """Keyset page after the (sort key, item) pair `after`, if any."""
+        # Without a title/label to sort by, items are ordered by IRI alone
+        sort_expr = self.sort_expr or '""'
+        extra = ()
+        if after:
+            key, last_item = (sparql_string(v) for v in after)
+            extra = (f"FILTER( {sort_expr} > {key} || "
+                     f"({sort_expr} = {key} && STR(?item) > {last_item}) )",)
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT {self.select} ({sort_expr} AS ?sort_key)
+WHERE {{
+  {self.where(selected, extra)}
+}}
+ORDER BY ?sort_key STR(?item)
+LIMIT {int(limit)}
+{'' if after else f'OFFSET {int(offset)}'}
+"""
+
+    def item(self, item_uri):
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT {self.select}
+WHERE {{
+  {self.where(extra=(f"VALUES ?item {{ {sparql_iri(item_uri)} }}",))}
+}}
+LIMIT 1
+"""
+
+    def items_page(self, items):
+        """Cards of the given items, in catalogue order (search pages)."""
+        values = " ".join(sparql_iri(i) for i in items)
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT {self.select} ({self.sort_expr or '""'} AS ?sort_key)
+WHERE {{
+  {self.where(extra=(f"VALUES ?item {{ {values} }}",))}
+}}
+ORDER BY ?sort_key STR(?item)
+"""
+
+    def item_ids(self, selected):
+        """Every item matching a facet selection, without card fields."""
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT ?item
+WHERE {{
+  {self.where(selected)}
+}}
+"""
+
+    def facet_counts(self, selected, key):
+        """GROUP BY query counting items per value of one checkbox facet.
+
+        The facet's own selection is left out (disjunctive faceting) so its
+        options keep showing what picking them in addition would match.
+        """
+        facet = self._facets[key]
+        others = {k: v for k, v in (selected or {}).items() if k != key}
+        extra = (facet.triples,) if facet.triples else ()
+        return f"""
+{_PREFIXES}
+SELECT ({facet.var} AS ?value) (COUNT(DISTINCT ?item) AS ?count)
+WHERE {{
+  {self.where(others, extra)}
+}}
+GROUP BY {facet.var}
+"""
+
+    def all_cards(self):
+        """Every card with its sort key, in cursor order (index builds)."""
+        sort_expr = self.sort_expr or '""'
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT {self.select} ({sort_expr} AS ?sort_key)
+WHERE {{
+  {self.where()}
+}}
+ORDER BY ?sort_key STR(?item)"""
+
+    def titles(self, items=None):
+        """item -> title/label texts and sort key (search index builds),
+        of every item or of `items`."""
+        text_vars = " ".join(v for v in ("?title", "?label") if v in self.select)
+        extra = ()
+        if items is not None:
+            extra = (f"VALUES ?item {{ {' '.join(sparql_iri(i) for i in items)} }}",)
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT ?item {text_vars} ({self.sort_expr or '""'} AS ?sort_key)
+WHERE {{
+  {self.where(extra=extra)}
+}}
+ORDER BY ?item"""
+
+    def memberships(self, key, items=None):
+        """item -> value pairs of a checkbox facet, or item -> years of a
+        range facet (index builds, exports of `items`)."""
+        facet = self._facets[key]
+        extra = (facet.triples,) if facet.triples else ()
+        if items is not None:
+            values = " ".join(sparql_iri(i) for i in items)
+            extra += (f"VALUES ?item {{ {values} }}",)
+        if facet.type == 'range':
+            projection = f"?item (YEAR({facet.begin_var}) AS ?b) (YEAR({facet.end_var}) AS ?e)"
+            order = "?item ?b ?e"
+        else:
+            projection = f"?item ({facet.var} AS ?v)"
+            order = "?item ?v"
+        return f"""
+{_PREFIXES}
+SELECT DISTINCT {projection}
+WHERE {{
+  {self.where(extra=extra)}
+}}
+ORDER BY {order}"""
+
+
+def compile_config(config):
+    """Per-language CardQueries of a validated collection config.
+
+    Raises ValueError for configs the templates can't be built from.
+    """
+    keys = set()
+    for group in config.get('filters') or []:
+        key = group.get('key')
+        if key in keys:
+            raise ValueError(f"Duplicate filter key: {key}")
+        keys.add(key)
+    if '?item' not in config['cards']['select']:
+        raise ValueError("cards.select must project ?item")
+    return {lang: CardQueries(config, lang) for lang in LANGS}
+
+
+def paged(run, query, chunk_size):
+    """Yield bindings of `query` (which must be ORDER'ed) chunk by chunk."""
+    offset = 0
+    while True:
+        raw = run(f"{query}\nLIMIT {chunk_size}\nOFFSET {offset}")
+        rows = raw['results']['bindings']
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        offset += chunk_size
+
+
+def selection_key(config_filters: list, selected: dict) -> str:
+    """Canonical, order-insensitive encoding of a filter selection.
+
+    Only keys known to the config and carrying a value are kept, so
+    `{}` and `{"subject": []}` map to the same key.
+    """
+    if not isinstance(selected, dict):
+        return '{}'
+    known = {g.get('key') for g in config_filters or []}
+    norm = {}
+    for key, val in selected.items():
+        if key not in known or not val:
+            continue
+        if isinstance(val, dict):
+            norm[key] = {k: val.get(k) for k in ('min', 'max')}
+        elif isinstance(val, list):
+            norm[key] = sorted({str(v) for v in val})
+        else:
+            norm[key] = val
+    return json.dumps(norm, sort_keys=True, separators=(',', ':'))
+
+
+def encode_cursor(sort_key, item) -> str:
+    raw = json.dumps([sort_key or '', item or ''], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return (sort_key, item) from an opaque cursor, None to start over.
+
+    Raises ValueError on a malformed cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        sort_key, item = json.loads(base64.urlsafe_b64decode(str(cursor)))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    if not isinstance(sort_key, str) or not isinstance(item, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return sort_key, item
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import jsonschema
+
+from .queries import compile_config
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+
+
+def _load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _schema_errors(instance, schema, name):
+    """Raise ValueError listing where `instance` breaks `schema`."""
+    errors = sorted(jsonschema.Draft7Validator(schema).iter_errors(instance),
+                    key=lambda e: list(e.absolute_path))
+    if errors:
+        details = "; ".join(
+            f"{'/'.join(str(p) for p in e.absolute_path) or '<root>'}: {e.message}"
+            for e in errors)
+        raise ValueError(f"{name} does not match its schema: {details}")
+
+
+def _config_fs_path(data_dir, collection):
+    return os.path.join(data_dir, collection["config_path"]).replace("\\", "/")
+
+
+def _validate_collections(collections, data_dir=DATA_DIR):
+    if not isinstance(collections, list):
+        raise ValueError("collections.json must be a list")
+    seen = set()
+    for idx, c in enumerate(collections):
+        if not isinstance(c, dict):
+            raise ValueError(f"Collection at index {idx} is not an object")
+        for key in ["id", "title_it", "title_en", "config_path"]:
+            if key not in c:
+                raise ValueError(
+                    f"Collection '{c.get('id', f'#${idx}')}' missing key: {key}")
+        if c["id"] in seen:
+            raise ValueError(f"Duplicate collection id: {c['id']}")
+        seen.add(c["id"])
+        # header/description optional but if present should be dict
+        for block in ["header", "description"]:
+            if block in c and not isinstance(c[block], dict):
+                raise ValueError(
+                    f"Collection '{c['id']}' field '{block}' must be an object")
+        # Ensure config file exists (relative to data/). Collections flagged
+        # as coming soon are listed on the homepage only and may not ship a
+        # config yet.
+        if c.get('coming_soon'):
+            continue
+        cfg_path = _config_fs_path(data_dir, c)
+        if not os.path.exists(cfg_path):
+            raise ValueError(
+                f"Missing config file for collection '{c['id']}': {cfg_path}")
+
+
+def _validate_config(config, collection_id):
+    if not isinstance(config, dict):
+        raise ValueError(f"Config for '{collection_id}' must be an object")
+    if 'sparql_endpoint' not in config or not isinstance(config['sparql_endpoint'], str):
+        raise ValueError(
+            f"Config for '{collection_id}' missing 'sparql_endpoint'")
+    if 'cards' not in config or not isinstance(config['cards'], dict):
+        raise ValueError(f"Config for '{collection_id}' missing 'cards' block")
+    cards = config['cards']
+    for key in ['select', 'where']:
+        if key not in cards or not isinstance(cards[key], str):
+            raise ValueError(
+                f"Config for '{collection_id}' cards missing '{key}'")
+
+
+class _Snapshot:
+    """Immutable view of the registry and configs as read from disk."""
+
+    def __init__(self, collections, configs, queries, mtimes):
+        self.collections = collections
+        self.index = {c['id']: c for c in collections}
+        self.configs = configs
+        self.queries = queries
+        self.mtimes = mtimes
+        # Content hash, identical across workers and hosts for the same files
+        raw = json.dumps([collections, configs], sort_keys=True).encode('utf-8')
+        self.version = hashlib.sha1(raw).hexdigest()
+
+
+class CollectionRegistry:
+    """In-process store for `collections.json` and per-collection configs.
+
+    Everything is parsed, checked against the JSON schemas in
+    `data/schemas` and compiled into per-language query templates
+    (`queries.CardQueries`) once, so a broken config fails at startup
+    instead of on the first request using it. Afterwards the files are
+    only stat'ed (at most every `REGISTRY_CHECK_INTERVAL` seconds) and
+    reloaded when one of their mtimes changes. Returned dicts are shared between
+    requests and must be treated as read-only.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=1.0):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.data_dir = app.config.get('DATA_DIR', self.data_dir)
+        self.check_interval = float(app.config.get(
+            'REGISTRY_CHECK_INTERVAL', self.check_interval))
+        with self._lock:
+            self._snapshot = self._read()
+            self._checked_at = time.monotonic()
+        app.extensions['collection_registry'] = self
+
+    def _registry_path(self):
+        return os.path.join(self.data_dir, 'collections.json')
+
+    def _schema(self, name, mtimes):
+        """Schema `name` from data/schemas, or None if the file is absent."""
+        path = os.path.join(self.data_dir, 'schemas', name)
+        mtimes[path] = _mtime(path)
+        return _load_json(path) if mtimes[path] is not None else None
+
+    def _read(self):
+        registry_path = self._registry_path()
+        mtimes = {registry_path: _mtime(registry_path)}
+        registry_schema = self._schema('collection_registry.schema.json', mtimes)
+        config_schema = self._schema('collection_config.schema.json', mtimes)
+        collections = _load_json(registry_path)
+        if registry_schema is not None:
+            _schema_errors(collections, registry_schema, 'collections.json')
+        _validate_collections(collections, self.data_dir)
+        configs = {}
+        queries = {}
+        for c in collections:
+            cfg_path = _config_fs_path(self.data_dir, c)
+            mtimes[cfg_path] = _mtime(cfg_path)
+            if mtimes[cfg_path] is None:
+                # Coming-soon collection without a config yet
+                continue
+            config = _load_json(cfg_path)
+            _validate_config(config, c['id'])
+            if config_schema is not None:
+                _schema_errors(config, config_schema, f"Config for '{c['id']}'")
+            try:
+                queries[c['id']] = compile_config(config)
+            except ValueError as exc:
+                raise ValueError(f"Config for '{c['id']}': {exc}") from exc
+            configs[c['id']] = config
+        return _Snapshot(collections, configs, queries, mtimes)
+
+    def _is_stale(self, snapshot):
+        return any(_mtime(path) != mtime for path, mtime in snapshot.mtimes.items())
+
+    def _current(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now - self._checked_at < self.check_interval:
+                return snapshot
+            self._checked_at = now
+            if snapshot is None:
+                self._snapshot = self._read()
+            elif self._is_stale(snapshot):
+                try:
+                    self._snapshot = self._read()
+                except (OSError, ValueError) as exc:
+                    # Keep serving the last valid state while a file is
+                    # being edited; the next check will retry.
+                    logger.warning("Registry reload failed: %s", exc)
+            return self._snapshot
+
+    def collections(self):
+        return self._current().collections
+
+    def version(self):
+        """Token that changes whenever the registry or any config does."""
+        return self._current().version
+
+    def get(self, collection_id):
+        return self._current().index.get(collection_id)
+
+    def config(self, collection_id):
+        """Return the validated config for `collection_id` or None."""
+        return self._current().configs.get(collection_id)
+
+    def queries(self, collection_id, lang):
+        """Compiled `CardQueries` of `collection_id` in `lang`, or None."""
+        compiled = self._current().queries.get(collection_id)
+        if compiled is None:
+            return None
+        return compiled.get(lang) or compiled['it']
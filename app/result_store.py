@@ -0,0 +1,157 @@
+"""SPARQL results shared by every worker process of the portal.
+
+`ResultCache` is per process: with N workers each query would be sent N
+times, and again after every restart. `SharedResultStore` is a second
+tier behind it, an SQLite file (WAL mode, memory-mapped reads) that all
+workers on the host open. A result fetched by one worker is found by the
+others and outlives restarts. Entries expire like the in-process ones and
+the least recently used go first once the file exceeds
+`RESULT_STORE_MAX_BYTES`.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, tag TEXT, expires REAL,
+                                    accessed REAL, size INTEGER, value BLOB);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE INDEX IF NOT EXISTS results_tag ON results (tag);
+"""
+# Reads refresh an entry's LRU position at most this often (seconds)
+_TOUCH_INTERVAL = 60
+# Writes between two checks of the total size
+_EVICT_EVERY = 64
+
+
+def _digest(key):
+    raw = json.dumps(key, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class SharedResultStore:
+    """Disk-backed key -> JSON value store with TTLs, safe across processes."""
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.path = app.config.get(
+            'RESULT_STORE_PATH', os.path.join(app.instance_path, 'results.sqlite')) or None
+        self.max_bytes = int(app.config.get('RESULT_STORE_MAX_BYTES', self.max_bytes))
+        with self._lock:
+            self._close()
+        app.extensions['result_store'] = self
+
+    def _close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def _connect(self):
+        """The process' connection; reopened after a fork. Call with the lock held."""
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.max_bytes)}")
+            conn.executescript(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key, stale_ttl=0):
+        """(value, seconds until expiry) of `key`, or None.
+
+        Entries expired less than `stale_ttl` seconds ago are returned
+        too, with a negative expiry.
+        """
+        if not self.path:
+            return None
+        digest, now = _digest(key), time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT expires, accessed, value FROM results WHERE key = ?",
+                    (digest,)).fetchone()
+                if row is None or row[0] + stale_ttl <= now:
+                    return None
+                if now - row[1] > _TOUCH_INTERVAL:
+                    conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, digest))
+            return json.loads(zlib.decompress(row[2])), row[0] - now
+        except (sqlite3.Error, zlib.error, ValueError) as exc:
+            logger.warning("Shared result store read failed: %s", exc)
+            return None
+
+    def set(self, key, value, ttl, tag=None):
+        if not self.path or ttl <= 0:
+            return
+        blob = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), 1)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (_digest(key), tag, now + ttl, now, len(blob), blob))
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 0:
+                    self._evict(conn, now)
+        except sqlite3.Error as exc:
+            logger.warning("Shared result store write failed: %s", exc)
+
+    def _evict(self, conn, now):
+        """Drop long-expired entries, then the least recently used ones
+        until the store is back under 90% of `max_bytes`."""
+        conn.execute("DELETE FROM results WHERE expires < ?", (now - 24 * 3600,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        victims, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM results WHERE key = ?", victims)
+
+    def flush(self, tag=None):
+        """Drop every entry (or only those tagged `tag`); return the count."""
+        if not self.path:
+            return 0
+        try:
+            with self._lock:
+                conn = self._connect()
+                if tag is None:
+                    return conn.execute("DELETE FROM results").rowcount
+                return conn.execute("DELETE FROM results WHERE tag = ?", (tag,)).rowcount
+        except sqlite3.Error as exc:
+            logger.warning("Shared result store flush failed: %s", exc)
+            return 0
+
+    def stats(self):
+        if not self.path:
+            return {'enabled': False}
+        try:
+            with self._lock:
+                entries, size = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        return {'enabled': True, 'path': self.path, 'entries': entries,
+                'bytes': size, 'max_bytes': self.max_bytes}
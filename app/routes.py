@@ -1,55 +1,33 @@
-from flask import Blueprint, render_template, abort, jsonify, request, url_for, redirect, make_response
+from flask import (Blueprint, render_template, abort, jsonify, request, url_for, redirect, make_response,
+                   current_app, stream_with_context, g)
+from markupsafe import Markup
+from concurrent.futures import wait, TimeoutError as FutureTimeout
+from werkzeug.exceptions import BadGateway, ServiceUnavailable
+import functools
+import hmac
+import itertools
 import json
 import os
-from .extensions import get_locale
-from SPARQLWrapper import SPARQLWrapper, JSON
+from . import export, melody, portal, static_site
+from .extensions import (get_locale, registry, sparql, result_cache, catalogue_index, viz_store,
+                         metrics, http_cache, search_index, snapshots)
+from .snapshots import Stale
+from .sparql import (SparqlError, CircuitOpen, DeadlineExceeded, set_deadline, reset_deadline,
+                     remaining as sparql_remaining)
+from .cache import query_key, resolved
+from .queries import selection_key, encode_cursor, decode_cursor, sparql_iri
+from .search import tokenize
 import math
-import re
 from urllib.parse import unquote
 
-# Helpers to load and validate registry/configs
+# Helpers to access the registry/configs
 
 BASE_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
 
 
-def _load_json(path):
-    with open(path, encoding='utf-8') as f:
-        return json.load(f)
-
-
-def _validate_collections(collections):
-    if not isinstance(collections, list):
-        raise ValueError("collections.json must be a list")
-    seen = set()
-    for idx, c in enumerate(collections):
-        if not isinstance(c, dict):
-            raise ValueError(f"Collection at index {idx} is not an object")
-        for key in ["id", "title_it", "title_en", "config_path"]:
-            if key not in c:
-                raise ValueError(
-                    f"Collection '{c.get('id', f'#${idx}')}' missing key: {key}")
-        if c["id"] in seen:
-            raise ValueError(f"Duplicate collection id: {c['id']}")
-        seen.add(c["id"])
-        # header/description optional but if present should be dict
-        for block in ["header", "description"]:
-            if block in c and not isinstance(c[block], dict):
-                raise ValueError(
-                    f"Collection '{c['id']}' field '{block}' must be an object")
-        # Ensure config file exists (relative to data/)
-        cfg_path = os.path.join(DATA_DIR, c["config_path"]).replace("\\", "/")
-        if not os.path.exists(cfg_path):
-            raise ValueError(
-                f"Missing config file for collection '{c['id']}': {cfg_path}")
-
-
 def load_collections():
-    path = os.path.join(DATA_DIR, 'collections.json')
-    collections = _load_json(path)
-    _validate_collections(collections)
-    return collections
+    return registry.collections()
 
 
 def _list_static_images(rel_dir):
@@ -72,56 +50,255 @@ def _list_static_images(rel_dir):
 
 
 def get_collection(collection_id):
-    collections = load_collections()
-    return next((c for c in collections if c['id'] == collection_id), None)
+    return registry.get(collection_id)
 
 
-def _validate_config(config, collection_id):
-    if not isinstance(config, dict):
-        raise ValueError(f"Config for '{collection_id}' must be an object")
-    if 'sparql_endpoint' not in config or not isinstance(config['sparql_endpoint'], str):
-        raise ValueError(
-            f"Config for '{collection_id}' missing 'sparql_endpoint'")
-    if 'cards' not in config or not isinstance(config['cards'], dict):
-        raise ValueError(f"Config for '{collection_id}' missing 'cards' block")
-    cards = config['cards']
-    for key in ['select', 'where']:
-        if key not in cards or not isinstance(cards[key], str):
-            raise ValueError(
-                f"Config for '{collection_id}' cards missing '{key}'")
+def get_config(collection_id):
+    """Return the validated config for a collection, or abort with 404."""
+    config = registry.config(collection_id)
+    if config is None:
+        abort(404)
+    return config
+
+
+def get_queries(collection_id, lang):
+    """Compiled query templates of a collection in `lang`, or abort with 404."""
+    queries = registry.queries(collection_id, lang)
+    if queries is None:
+        abort(404)
+    return queries
+
+
+def _cache_ttl(config):
+    """Result cache TTL in seconds; per-collection `cache.ttl` wins."""
+    ttl = (config.get('cache') or {}).get('ttl')
+    if ttl is None:
+        return result_cache.default_ttl
+    return float(ttl)
+
+
+def _result(future):
+    """`future.result()` within the request's SPARQL budget.
+
+    A query that is late or fails and has a snapshot gives the snapshot,
+    and the response is flagged as stale.
+    """
+    try:
+        raw = future.result(timeout=sparql_remaining())
+    except FutureTimeout:
+        ref = getattr(future, 'snapshot', None)
+        raw = snapshots.load(*ref) if ref else None
+        if raw is None:
+            raise DeadlineExceeded("Request budget spent waiting for SPARQL") from None
+    if isinstance(raw, Stale):
+        g.stale = True
+    return raw
+
+
+def _query_future(collection_id, config, query, endpoint, label, snapshot, in_thread):
+    endpoint = endpoint or config['sparql_endpoint']
+
+    def _save(f):
+        if f.exception() is None:
+            snapshots.save(collection_id, snapshot, f.result())
+
+    def submit(background=False):
+        future = sparql.submit(endpoint, query, label=label, background=background)
+        if snapshot:
+            future.add_done_callback(_save)
+        return future
+
+    def run():
+        future = resolved(sparql.query(endpoint, query, label=label))
+        if snapshot:
+            _save(future)
+        return future
+
+    future = result_cache.fetch(
+        query_key(endpoint, query), run if in_thread else submit,
+        ttl=_cache_ttl(config), tag=collection_id,
+        refresh=lambda: submit(background=True))
+    if snapshot:
+        future = snapshots.fallback(collection_id, snapshot, future)
+    return future
+
+
+def run_query(collection_id, config, query, label=None, snapshot=None):
+    """Run a SPARQL query against the collection endpoint, via the cache.
+
+    Concurrent identical queries share one request to the endpoint; with
+    CACHE_STALE_TTL, expired results are served while a refresh runs.
+
+    `label` identifies the query in timings and metrics. With a
+    `snapshot` name, results are kept as the collection's last-known-good
+    copy and served from it when the endpoint fails.
+    """
+    # A miss runs in this thread; only refreshes go to the worker pool
+    return _result(_query_future(collection_id, config, query, None, label, snapshot,
+                                 in_thread=True))
+
+
+def submit_query(collection_id, config, query, endpoint=None, label=None, snapshot=None):
+    """Like run_query, but returns a Future; cache hits resolve immediately.
+
+    Identical queries already in flight are shared rather than sent again.
+    Wait for it with `_result`, which keeps to the request's budget.
+    """
+    return _query_future(collection_id, config, query, endpoint, label, snapshot,
+                         in_thread=False)
+
+
+def _item_api(config, lang):
+    """The config's item_api block, with config_url localized when possible."""
+    item_api_cfg = config.get('item_api') or {}
+    cfg_url = item_api_cfg.get('config_url', '')
+    if isinstance(cfg_url, str) and cfg_url.endswith('.json'):
+        base = cfg_url[:-5]
+        lang_suffix = 'it' if lang == 'it' else 'en'
+        # Try underscore and dotted variants
+        for candidate_url in (f"{base}_{lang_suffix}.json", f"{base}.{lang_suffix}.json"):
+            candidate_fs = melody.static_path(STATIC_DIR, candidate_url)
+            if candidate_fs and os.path.exists(candidate_fs):
+                return {**item_api_cfg, 'config_url': candidate_url}
+    return item_api_cfg
+
+
+def render_item_sidebar(collection_id, config, item_uri, lang):
+    """Melody sidebar HTML for one item, or None if the config can't be
+    rendered here. All block queries are in flight at once and the
+    fragment is cached per (item, lang).
+    """
+    key = ('item-sidebar', collection_id, item_uri, lang)
+    html = result_cache.get(key)
+    if html is not None:
+        return html
+    path = melody.static_path(STATIC_DIR, _item_api(config, lang).get('config_url'))
+    melody_cfg = melody.load_config(path) if path else None
+    if melody_cfg is None or not melody.supported(melody_cfg):
+        return None
+    blocks = [
+        (block, submit_query(collection_id, config, query, endpoint=endpoint,
+                             label=f"block:{block_id}"))
+        for block_id, block, endpoint, query in melody.block_queries(
+            melody_cfg, item_uri, lang, config['sparql_endpoint'])
+    ]
+    html = Markup('').join(melody.render_block(block, _result(future))
+                           for block, future in blocks)
+    result_cache.set(key, html, ttl=_cache_ttl(config), tag=collection_id)
+    return html
+
+
+def _require_admin():
+    """Abort unless the request carries the configured ADMIN_TOKEN."""
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        # Admin endpoints are disabled unless a token is configured
+        abort(404)
+    auth = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(auth, f"Bearer {token}"):
+        abort(403)
 
 
 main = Blueprint('main', __name__)
 
+# SPARQL time budget of views (seconds), overridable with SPARQL_DEADLINES
+_DEADLINES = {
+    'get_filters': 10.0,
+    'api_cards': 10.0,
+    'item_detail': 10.0,
+    'item_sidebar': 10.0,
+    'api_items': 10.0,
+    'portal_cards': 10.0,
+    'viz_data': 15.0,
+}
+
+
+@main.before_request
+def _start_deadline():
+    deadlines = dict(_DEADLINES, get_filters=current_app.config.get('FILTERS_DEADLINE', 10.0))
+    deadlines.update(current_app.config.get('SPARQL_DEADLINES') or {})
+    seconds = deadlines.get((request.endpoint or '').rpartition('.')[2])
+    if seconds:
+        g.deadline_token = set_deadline(float(seconds))
+
+
+@main.teardown_request
+def _end_deadline(exc):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        reset_deadline(token)
+
+
+@main.after_request
+def _flag_stale(resp):
+    """Mark responses built from snapshots, and keep caches from storing them."""
+    if g.get('stale'):
+        resp.headers['Warning'] = '110 - "Response is Stale"'
+        resp.cache_control.public = False
+        resp.cache_control.max_age = None
+        resp.cache_control.no_store = True
+    return resp
+
+
+@main.errorhandler(SparqlError)
+def _sparql_unavailable(exc):
+    """Endpoint failures the views don't handle themselves."""
+    current_app.logger.warning("SPARQL failure on %s: %s", request.path, exc)
+    if isinstance(exc, (CircuitOpen, DeadlineExceeded)):
+        error = ServiceUnavailable()
+        resp = error.get_response()
+        if isinstance(exc, CircuitOpen):
+            resp.headers['Retry-After'] = str(int(sparql.breaker_cooldown))
+    else:
+        error = BadGateway()
+        resp = error.get_response()
+    if request.path.startswith('/api/'):
+        resp.set_data(json.dumps({'error': error.name}))
+        resp.mimetype = 'application/json'
+    return resp
+
 
 @main.route('/')
 def homepage():
     collections = load_collections()
 
     lang = get_locale()
+    etag = http_cache.etag(lang, 'homepage')
+    resp = http_cache.not_modified(etag)
+    if resp is not None:
+        return resp
     title_key = f'title_{lang}'
     keywords_key = f'keywords_{lang}'
+    # Registry dicts are shared across requests: decorate copies only
+    display = []
     for c in collections:
-        c['display_title'] = c.get(title_key, c.get('title_it'))
         # Prepare localized keywords list if available
         if isinstance(c.get(keywords_key), list):
-            c['display_keywords'] = c.get(keywords_key)
+            keywords = c.get(keywords_key)
         elif isinstance(c.get('keywords_it'), list):
-            c['display_keywords'] = c.get('keywords_it')
+            keywords = c.get('keywords_it')
         else:
-            c['display_keywords'] = []
-    return render_template('homepage.html', collections=collections)
+            keywords = []
+        display.append({
+            **c,
+            'display_title': c.get(title_key, c.get('title_it')),
+            'display_keywords': keywords,
+        })
+    return http_cache.finish(
+        make_response(render_template('homepage.html', collections=display)), etag)
 
 
 @main.route('/collection/<collection_id>')
 def collection_home(collection_id):
-    collections = load_collections()
-    collection = next(
-        (c for c in collections if c['id'] == collection_id), None)
+    collection = get_collection(collection_id)
     if not collection:
         abort(404)
 
     lang = get_locale()
+    etag = http_cache.etag(lang, 'collection', collection_id)
+    resp = http_cache.not_modified(etag)
+    if resp is not None:
+        return resp
     # Optional short nav title; fallback to localized title
     nav_title = collection.get(f'nav_title_{lang}', collection.get(
         f'title_{lang}', collection['title_it']))
@@ -144,7 +321,8 @@ def collection_home(collection_id):
     if slides:
         collection_data['carousel_images'] = slides
 
-    return render_template('collection_home.html', collection=collection_data)
+    return http_cache.finish(make_response(
+        render_template('collection_home.html', collection=collection_data)), etag)
 
 
 @main.route('/collection/<collection_id>/overview')
@@ -155,19 +333,21 @@ def collection_overview(collection_id):
         abort(404)
 
     # Load config to fetch visualizations and overview copy
-    config_path = os.path.join(
-        DATA_DIR, collection["config_path"])  # absolute within repo
-    with open(config_path, encoding='utf-8') as f:
-        config = json.load(f)
+    config = get_config(collection_id)
 
     visualizations = config.get('visualizations', [])
     overview = config.get('overview', {})
     lang = get_locale()
+    etag = http_cache.etag(lang, 'overview', collection_id)
+    resp = http_cache.not_modified(etag)
+    if resp is not None:
+        return resp
     nav_title = collection.get(f'nav_title_{lang}', collection.get(
         f'title_{lang}', collection['title_it']))
-    return render_template(
+    return http_cache.finish(make_response(render_template(
         'collection_overview.html',
         visualizations=visualizations,
+        viz_api_url=_viz_api_url,
         overview=overview,
         lang=lang,
         collection_meta={
@@ -175,20 +355,60 @@ def collection_overview(collection_id):
             'image': collection.get('image'),
             'nav_title': nav_title
         }
-    )
+    )), etag)
+
+
+def _viz_api_url(collection_id, viz_id, lang):
+    """Data URL of an overview chart: a JSON file in static exports."""
+    if current_app.config.get('STATIC_EXPORT'):
+        return request.script_root + static_site.viz_path(collection_id, viz_id)
+    return url_for('main.viz_data', collection_id=collection_id, viz_id=viz_id, lang=lang)
+
+
+@main.route('/api/<collection_id>/viz/<viz_id>')
+def viz_data(collection_id, viz_id):
+    """Pre-aggregated dataset of one overview visualization.
+
+    Served from the server-side viz store with an ETag, so browsers never
+    query the triplestore themselves.
+    """
+    if not get_collection(collection_id):
+        abort(404)
+    config = get_config(collection_id)
+    viz = next((v for v in config.get('visualizations', [])
+                if v.get('id') == viz_id), None)
+    if viz is None:
+        abort(404)
+    lang = request.args.get('lang') or get_locale()
+    if lang not in {"it", "en"}:
+        abort(400)
+    try:
+        entry = viz_store.get(collection_id, config, viz, lang)
+    except KeyError:
+        abort(404)
+    if entry.stale:
+        g.stale = True
+    return http_cache.finish(jsonify(entry.payload), entry.etag,
+                             vary_lang='lang' not in request.args)
 
 
 @main.route('/catalogue/<collection_id>')
 def catalogue(collection_id):
-    all_collections = load_collections()
-    collection = next(
-        (c for c in all_collections if c['id'] == collection_id), None)
+    collection = get_collection(collection_id)
     if not collection:
         abort(404)
     lang = get_locale()
+    # Have the title search index ready by the time the visitor types
+    # (static exports have no search box)
+    if not current_app.config.get('STATIC_EXPORT'):
+        search_index.get(collection_id, lang, wait=False)
+    etag = http_cache.etag(lang, 'catalogue', collection_id)
+    resp = http_cache.not_modified(etag)
+    if resp is not None:
+        return resp
     nav_title = collection.get(f'nav_title_{lang}', collection.get(
         f'title_{lang}', collection['title_it']))
-    return render_template(
+    return http_cache.finish(make_response(render_template(
         'collection_catalogue.html',
         collection_id=collection_id,
         collection_meta={
@@ -196,253 +416,393 @@ def catalogue(collection_id):
             'image': collection.get('image'),
             'nav_title': nav_title
         }
-    )
+    )), etag)
 
 
 @main.route("/api/<collection_id>/filters")
 def get_filters(collection_id):
-    print(collection_id)
-    lang = get_locale()
+    lang = request.args.get("lang") or get_locale()
+    if lang not in {"it", "en"}:
+        abort(400)
     structure_only = request.args.get("structureOnly") == "true"
 
-    all_collections = load_collections()
-    collection = next(
-        (c for c in all_collections if c["id"] == collection_id), None)
+    collection = get_collection(collection_id)
     if not collection:
         abort(404)
 
-    config_path = os.path.join(
-        DATA_DIR, collection["config_path"])  # absolute within repo
-    with open(config_path, encoding='utf-8') as f:
-        config = json.load(f)
-    _validate_config(config, collection_id)
+    config = get_config(collection_id)
+
+    # Optional current selection (same shape as the cards `filters` body):
+    # when given, checkbox options also carry how many items they would
+    # match combined with the other groups' selections.
+    selected = None
+    if request.args.get("selection") is not None and not structure_only:
+        try:
+            selected = json.loads(request.args["selection"])
+        except ValueError:
+            abort(400)
+        if not isinstance(selected, dict):
+            abort(400)
+
+    # Option lists come from the knowledge graph, the structure only
+    # from the config
+    etag = http_cache.etag(
+        lang, 'filters', collection_id, structure_only,
+        None if selected is None else selection_key(config["filters"], selected),
+        config=None if structure_only else config)
+    vary_lang = "lang" not in request.args
+    resp = http_cache.not_modified(etag, vary_lang)
+    if resp is not None:
+        return resp
 
-    sparql = SPARQLWrapper(config['sparql_endpoint'])
     results = []
+    pending = {}
+    counting = {}
+    counted = {}
+    index = None if structure_only else catalogue_index.reader(collection_id, config)
+    queries = get_queries(collection_id, lang)
 
-    for group in config["filters"]:
+    for idx, group in enumerate(config["filters"]):
         entry = {
             "label": group.get(f"label_{lang}", group.get("label_it")),
             "key": group["key"],
             "type": group.get("type", "checkbox"),
         }
+        results.append(entry)
 
         if not structure_only:
-            sparql = SPARQLWrapper(config["sparql_endpoint"])
-            # Inject dynamic language when placeholder is present
-            q = group.get("query", "")
-            gtype = entry["type"]
-            if gtype == "range":
-                range_q = group.get("range_query")
-                if range_q:
-                    if "$LANG$" in range_q:
-                        range_q = range_q.replace("$LANG$", lang)
-                    sparql.setQuery(range_q)
-                    sparql.setReturnFormat(JSON)
-                    raw = sparql.query().convert()
-                    b = raw["results"]["bindings"]
-                    if b:
-                        try:
-                            mn = int(float(b[0]["min"]["value"]))
-                            mx = int(float(b[0]["max"]["value"]))
-                            entry["range"] = {"min": mn, "max": mx}
-                        except Exception:
-                            pass
-            else:
-                if "$LANG$" in q:
-                    q = q.replace("$LANG$", lang)
-                sparql.setQuery(q)
-                sparql.setReturnFormat(JSON)
-                raw = sparql.query().convert()
-                entry["options"] = [
-                    {"label": r.get("label", {}).get("value"),
-                     "uri": r.get("uri", {}).get("value")}
-                    for r in raw["results"]["bindings"]
-                    if r.get("label") and r.get("uri")
-                ]
-        results.append(entry)
+            q = queries.facets[idx].options_query
+            stored = index.facet_result(lang, entry["key"]) if index else None
+            if stored is not None:
+                pending[idx] = resolved(stored)
+            elif q:
+                pending[idx] = submit_query(collection_id, config, q,
+                                            label=f"facet:{entry['key']}",
+                                            snapshot=f"facet-{entry['key']}-{lang}")
+
+            # One GROUP BY per facet (never one query per option)
+            if selected is not None and entry["type"] != "range" and group.get("var"):
+                try:
+                    if index:
+                        counted[idx] = index.facet_counts(
+                            lang, config["filters"], selected, entry["key"])
+                    else:
+                        counting[idx] = submit_query(
+                            collection_id, config,
+                            queries.facet_counts(selected, entry["key"]),
+                            label=f"counts:{entry['key']}")
+                except ValueError:
+                    abort(400)
+
+    # Facet queries run concurrently; anything not back by the deadline
+    # (and without a snapshot) is reported as unavailable instead of
+    # holding up the whole sidebar.
+    wait([*pending.values(), *counting.values()], timeout=sparql_remaining())
+    for idx, future in pending.items():
+        entry = results[idx]
+        try:
+            raw = _result(future)
+        except SparqlError:
+            future.cancel()
+            entry["unavailable"] = True
+            if entry["type"] != "range":
+                entry["options"] = []
+            continue
+        if entry["type"] == "range":
+            b = raw["results"]["bindings"]
+            if b:
+                try:
+                    mn = int(float(b[0]["min"]["value"]))
+                    mx = int(float(b[0]["max"]["value"]))
+                    entry["range"] = {"min": mn, "max": mx}
+                except Exception:
+                    pass
+        else:
+            entry["options"] = [
+                {"label": r.get("label", {}).get("value"),
+                 "uri": r.get("uri", {}).get("value")}
+                for r in raw["results"]["bindings"]
+                if r.get("label") and r.get("uri")
+            ]
+
+    for idx, future in counting.items():
+        try:
+            raw = _result(future)
+        except SparqlError:
+            future.cancel()
+            continue
+        counted[idx] = {
+            r["value"]["value"]: int(r["count"]["value"])
+            for r in raw["results"]["bindings"]
+            if r.get("value") and r.get("count")
+        }
+    for idx, counts in counted.items():
+        for opt in results[idx].get("options", []):
+            opt["count"] = counts.get(opt["uri"], 0)
+
+    if (any(entry.get("unavailable") for entry in results)
+            or any(idx not in counted for idx in counting)):
+        # Partial answer: let the next request try again
+        return jsonify(results)
+    return http_cache.finish(jsonify(results), etag, vary_lang)
 
-    return jsonify(results)
 
+def _decode_cursor(cursor):
+    """Return (sort_key, item) from an opaque cursor, None to start over.
 
-def _sparql_prefixes():
-    return "\n".join([
-        "PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>",
-        "PREFIX lrmoo: <http://iflastandards.info/ns/lrm/lrmoo/>",
-        "PREFIX aat: <http://vocab.getty.edu/page/aat/>",
-        "PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>",
-    ])
+    Aborts with 400 on a malformed cursor.
+    """
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        abort(400)
 
 
-def _build_cards_where(base_where: str, config_filters: list, selected: dict):
-    """Combine base WHERE with filter triples and VALUES clauses.
+def _sparql_cards_page(collection_id, config, queries, selected, limit, offset,
+                       after, use_cursor, with_total):
+    """Fetch one page of card bindings (and optionally the total) via SPARQL.
 
-    - base_where: string with core triple patterns (from config['cards']['where'])
-    - config_filters: list of filter config objects
-    - selected: dict mapping filter key -> list of selected URIs
+    The unfiltered first page and total are kept as snapshots.
     """
-    parts = [base_where.strip()]
-    if not isinstance(selected, dict):
-        selected = {}
-    # Attach triples/VALUES for each selected group
-    for group in config_filters or []:
-        key = group.get('key')
-        sel_val = selected.get(key)
-        if not sel_val:
-            continue
-        triples = (group.get('triples') or '').strip()
-        gtype = (group.get('type') or 'checkbox').lower()
-        if gtype == 'range' and isinstance(sel_val, dict):
-            # Expect begin/end year overlap against provided min/max
-            min_y = sel_val.get('min')
-            max_y = sel_val.get('max')
-            # No filter if both missing or invalid
-            if min_y is None and max_y is None:
-                continue
-            if triples:
-                parts.append(triples)
-            begin_var = group.get('begin_var', '?begin')
-            end_var = group.get('end_var', '?end')
-            conds = []
-            if isinstance(min_y, (int, float, str)) and str(min_y).strip():
-                conds.append(f"YEAR({end_var}) >= {int(float(min_y))}")
-            if isinstance(max_y, (int, float, str)) and str(max_y).strip():
-                conds.append(f"YEAR({begin_var}) <= {int(float(max_y))}")
-            if conds:
-                parts.append(f"FILTER( {' && '.join(conds)} )")
-            continue
+    first = offset == 0 and not after and selection_key(
+        config.get('filters', []), selected) == '{}'
+    count_future = None
+    if with_total:
+        # Count total distinct items, concurrently with the page query
+        count_future = submit_query(collection_id, config, queries.count(selected),
+                                    label='count',
+                                    snapshot=f"count-{queries.lang}" if first else None)
+
+    if use_cursor:
+        data_query = queries.cursor_page(selected, limit, offset, after)
+    else:
+        data_query = queries.page(selected, limit, offset)
+    snapshot = f"{'cursor-page' if use_cursor else 'page'}-{queries.lang}" if first else None
+    data_raw = run_query(collection_id, config, data_query, label='page', snapshot=snapshot)
+    rows = data_raw['results']['bindings']
 
-        # Default: checkbox/URIs or literal VALUES
-        values = sel_val
-        var = group.get('var') or ''
-        value_type = (group.get('value_type') or 'uri').lower()
-        if triples:
-            parts.append(triples)
-        if var and isinstance(values, list) and values:
-            if value_type == 'literal':
-                def _q(s):
-                    return '"' + str(s).replace('"', '\\"') + '"'
-                encoded = " ".join(_q(v) for v in values)
-            else:
-                encoded = " ".join(f"<" + v + ">" for v in values)
-            parts.append(f"VALUES {var} {{ {encoded} }}")
-    return "\n".join(parts)
-
-
-def _inject_lang(query: str, lang: str) -> str:
-    """Replace $LANG$ placeholders and simple lang(?var) = "it|en" patterns.
-
-    Keeps the rest of the query intact. Case-insensitive for the LANG function.
+    total = None
+    if count_future is not None:
+        count_raw = _result(count_future)
+        try:
+            total = int(count_raw['results']['bindings'][0]['total']['value'])
+        except Exception:
+            total = 0
+    return rows, total
+
+
+def _search_cards_page(collection_id, config, queries, titles, matches, selected,
+                       limit, offset, after):
+    """Fetch one page of search matches: the page is cut from the title
+    index and only its items are queried via SPARQL.
+
+    Returns (bindings, total, (sort key, item) of the page's last item if
+    more may follow, else None).
     """
-    if not isinstance(query, str):
-        return query
-    out = query.replace("$LANG$", lang)
-    # Replace patterns like: lang(?title) = "it" (or EN)
-    out = re.sub(r'(?i)(lang\s*\(\s*\?[A-Za-z0-9_]+\s*\)\s*=\s*")(?:(?:it)|(?:en))("\s*)',
-                 r"\1" + lang + r"\2", out)
-    # Replace LANGMATCHES(lang(?x), "it") if present
-    out = re.sub(r'(?i)(langmatches\s*\(\s*lang\s*\(\s*\?[A-Za-z0-9_]+\s*\)\s*,\s*")(?:(?:it)|(?:en))("\s*\))',
-                 r"\1" + lang + r"\2", out)
-    return out
-
-
-@main.route("/api/<collection_id>/cards", methods=["POST"])
+    if isinstance(selected, dict) and any(selected.get(f.key) for f in queries.facets):
+        raw = run_query(collection_id, config, queries.item_ids(selected),
+                        label='search:facets')
+        allowed = {b['item']['value'] for b in raw['results']['bindings'] if b.get('item')}
+        matches = [d for d in matches if titles.items[d] in allowed]
+    start = titles.after(matches, after) if after else offset
+    page = matches[start:start + limit]
+    rows = []
+    if page:
+        raw = run_query(collection_id, config,
+                        queries.items_page([titles.items[d] for d in page]), label='page')
+        rows = raw['results']['bindings']
+    last = None
+    if len(page) == limit:
+        last = (titles.sort_keys[page[-1]], titles.items[page[-1]])
+    return rows, len(matches), last
+
+
+def _cards_args():
+    """The cards request body encoded in GET query parameters."""
+    body = {'page': request.args.get('page', 1, type=int)}
+    if request.args.get('filters'):
+        try:
+            body['filters'] = json.loads(request.args['filters'])
+        except ValueError:
+            abort(400)
+        if not isinstance(body['filters'], dict):
+            abort(400)
+    if 'cursor' in request.args:
+        body['cursor'] = request.args['cursor'] or None
+    if request.args.get('q'):
+        body['q'] = request.args['q']
+    return body
+
+
+@main.route("/api/<collection_id>/cards", methods=["GET", "POST"])
 def api_cards(collection_id):
     """Return paginated cards for a collection, applying selected filters.
 
-    Expects JSON body: { filters: {key: [uris]}, page: n }
+    Expects JSON body: { filters: {key: [uris]}, page: n }. Including a
+    `cursor` key (null for the first page, then the previous response's
+    `nextCursor`) switches to keyset pagination. An optional `q` keeps
+    only cards whose title or label has words starting with each of its
+    terms.
+
+    GET takes the same fields as query parameters (`filters` as JSON, an
+    empty `cursor` for the first page) plus an optional `lang`, and is
+    cacheable: with `lang` given the response doesn't vary on cookies, so
+    shared caches can keep it.
     """
     collection = get_collection(collection_id)
     if not collection:
         abort(404)
 
-    config_path = os.path.join(
-        DATA_DIR, collection["config_path"])  # absolute within repo
-    with open(config_path, encoding='utf-8') as f:
-        config = json.load(f)
-    _validate_config(config, collection_id)
+    config = get_config(collection_id)
+
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        return jsonify(_cards_payload(collection_id, config, get_locale(), body))
 
-    body = request.get_json(silent=True) or {}
+    body = _cards_args()
+    lang = request.args.get('lang') or get_locale()
+    if lang not in {"it", "en"}:
+        abort(400)
+    etag = http_cache.etag(
+        lang, 'cards', collection_id,
+        selection_key(config.get('filters', []), body.get('filters') or {}),
+        ' '.join(tokenize(body.get('q') or '')), max(1, body['page']),
+        'cursor' in body, body.get('cursor'), config=config)
+    vary_lang = 'lang' not in request.args
+    resp = http_cache.not_modified(etag, vary_lang)
+    if resp is not None:
+        return resp
+    payload = _cards_payload(collection_id, config, lang, body)
+    return http_cache.finish(jsonify(payload), etag, vary_lang)
+
+
+def _cards_payload(collection_id, config, lang, body):
     selected = body.get('filters') or {}
     page = max(1, int(body.get('page') or 1))
-    limit = int(config.get('cards', {}).get('limit', 24))
+    queries = get_queries(collection_id, lang)
+    limit = queries.limit
     offset = (page - 1) * limit
-    lang = get_locale()
 
-    # Build WHERE with filters
-    base_where = _inject_lang(config['cards']['where'], lang)
-    where = _build_cards_where(base_where, config.get('filters', []), selected)
-
-    prefixes = _sparql_prefixes()
-
-    # Count total distinct items
-    count_query = f"""
-{prefixes}
-SELECT (COUNT(DISTINCT ?item) AS ?total)
-WHERE {{
-  {where}
-}}
-"""
-
-    sparql = SPARQLWrapper(config['sparql_endpoint'])
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(count_query)
-    count_raw = sparql.query().convert()
-    total = 0
+    # Opt-in keyset pagination: a client sending `cursor` gets `nextCursor`
+    # back and can resume after the last (sort key, item) seen instead of
+    # making the endpoint sort and skip `offset` rows.
+    use_cursor = 'cursor' in body and queries.sort_var is not None
+    after = _decode_cursor(body.get('cursor')) if use_cursor else None
+
+    # Free-text title search, combined with the facet selection
+    terms = ' '.join(tokenize(body.get('q') or ''))
+    titles = matches = None
+    if len(terms.replace(' ', '')) >= int(current_app.config.get('SEARCH_MIN_CHARS', 2)):
+        titles = search_index.get(collection_id, lang)
+        matches = titles.search(terms)
+    else:
+        terms = ''
+
+    # The total only depends on the selection, not on the page: reuse it
+    # across page navigation so pages 2..N cost a single query.
+    total_key = ('cards-total', collection_id, lang,
+                 selection_key(config.get('filters', []), selected), terms)
+    total = result_cache.get(total_key)
+
+    next_after = None
+    index = catalogue_index.reader(collection_id, config)
     try:
-        total = int(count_raw['results']['bindings'][0]['total']['value'])
-    except Exception:
-        total = 0
+        if index is not None:
+            items = None if matches is None else [titles.items[d] for d in matches]
+            rows, counted = index.cards(lang, config.get('filters', []), selected,
+                                       limit, offset, after, with_total=total is None,
+                                       items=items)
+        elif matches is not None:
+            rows, counted, next_after = _search_cards_page(
+                collection_id, config, queries, titles, matches, selected,
+                limit, offset, after)
+        else:
+            rows, counted = _sparql_cards_page(
+                collection_id, config, queries, selected, limit, offset,
+                after, use_cursor, with_total=total is None)
+    except ValueError:
+        # A selected value that can't be written into the query
+        abort(400)
+    if total is None:
+        total = counted
+        if not g.get('stale'):
+            result_cache.set(total_key, total, ttl=_cache_ttl(config),
+                             tag=collection_id)
     total_pages = max(1, math.ceil(total / limit))
+    cards = [dict(export.card(b), summary='') for b in rows]
+
+    payload = {'cards': cards, 'totalPages': total_pages, 'total': total}
+    if g.get('stale'):
+        # Served from the last-known-good snapshot while the endpoint is down
+        payload['stale'] = True
+    if use_cursor:
+        payload['nextCursor'] = None
+        if next_after is not None:
+            payload['nextCursor'] = encode_cursor(*next_after)
+        elif (matches is None or index is not None) and len(rows) == limit:
+            payload['nextCursor'] = encode_cursor(*export.position(rows[-1]))
+    return payload
+
+
+@main.route("/api/<collection_id>/export", methods=["GET", "POST"])
+def api_export(collection_id):
+    """Stream every card matching a filter selection as NDJSON or CSV.
+
+    Takes the `filters` of api_cards (in the JSON body, or as a JSON query
+    parameter with GET) plus `format` ('ndjson' or 'csv'), `lang` and
+    `include_filters` (adds each item's checkbox filter values). Cards
+    are fetched EXPORT_CHUNK_SIZE at a time and written out as they come.
+    """
+    collection = get_collection(collection_id)
+    if not collection:
+        abort(404)
+    config = get_config(collection_id)
+
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+    else:
+        body = request.args.to_dict()
+        try:
+            body['filters'] = json.loads(body.get('filters') or '{}')
+        except ValueError:
+            abort(400)
+    selected = body.get('filters') or {}
+    fmt = str(body.get('format') or 'ndjson').lower()
+    lang = body.get('lang') or get_locale()
+    if not isinstance(selected, dict) or fmt not in export.FORMATS or lang not in {"it", "en"}:
+        abort(400)
+    include_filters = str(body.get('include_filters', '')).lower() in {'1', 'true', 'yes'}
 
-    # Fetch page of cards
-    select_clause = _inject_lang(config['cards']['select'], lang)
-    # Order results alphabetically by title (case-insensitive). If the
-    # configured SELECT doesn't expose ?title, fall back to ?label.
-    order_var = "?title" if "?title" in select_clause else (
-        "?label" if "?label" in select_clause else None)
-
-    data_query = f"""
-{prefixes}
-SELECT DISTINCT {select_clause}
-WHERE {{
-  {where}
-}}
-{f'ORDER BY LCASE({order_var})' if order_var else ''}
-LIMIT {limit}
-OFFSET {offset}
-"""
-    sparql.setQuery(data_query)
-    data_raw = sparql.query().convert()
-    rows = data_raw['results']['bindings']
-
-    def get_val(b, key):
-        x = b.get(key)
-        return x.get('value') if isinstance(x, dict) else None
-
-    cards = []
-    for b in rows:
-        item = get_val(b, 'item') or get_val(b, 'id') or get_val(b, 'uri')
-        title = get_val(b, 'title') or get_val(
-            b, 'label') or (item or 'Untitled')
-        # Pass through optional metadata when present in the SELECT
-        begin = get_val(b, 'begin')
-        end = get_val(b, 'end')
-        type_label = get_val(b, 'type_label')
-        technique_label = get_val(b, 'technique_label')
-        conservation_org_label = get_val(b, 'conservation_org_label')
-        cards.append({
-            'id': item,
-            'title': title,
-            'begin': begin,
-            'end': end,
-            'type_label': type_label,
-            'technique_label': technique_label,
-            'conservation_org_label': conservation_org_label,
-            'summary': ''
-        })
-
-    return jsonify({'cards': cards, 'totalPages': total_pages})
+    queries = get_queries(collection_id, lang)
+    chunk_size = int(current_app.config.get('EXPORT_CHUNK_SIZE', 1000))
+    try:
+        # A selected value that can't be written into the query
+        queries.where(selected)
+    except ValueError:
+        abort(400)
+    index = catalogue_index.reader(collection_id, config)
+    if index is not None:
+        chunks = index.iter_cards(lang, config.get('filters', []), selected, chunk_size)
+        item_values = functools.partial(index.item_values, lang)
+    else:
+        run = functools.partial(sparql.query, config['sparql_endpoint'], label='export')
+        chunks = export.sparql_chunks(queries, selected, run, chunk_size)
+        item_values = functools.partial(export.sparql_item_values, queries, run=run)
+
+    rows = export.cards(chunks, item_values if include_filters else None)
+    # Fetch the first chunk before answering, so that an unreachable
+    # endpoint still gets an error status; later failures cut the stream.
+    first = next(rows, [])
+    rows = itertools.chain([first], rows)
+    if fmt == 'csv':
+        body_iter = export.csv_text(rows, export.value_facets(queries) if include_filters else ())
+    else:
+        body_iter = export.ndjson(rows)
+
+    mimetype, ext = export.FORMATS[fmt]
+    resp = current_app.response_class(stream_with_context(body_iter), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename="{collection_id}-{lang}.{ext}"'
+    return resp
 
 
 @main.route('/set-language/<lang>')
@@ -465,6 +825,42 @@ def set_language(lang: str):
     return resp
 
 
+@main.route('/admin/cache')
+def cache_stats():
+    """Expose result cache hit/miss counters for this worker process."""
+    _require_admin()
+    return jsonify(result_cache.stats())
+
+
+@main.route('/admin/cache/<collection_id>', methods=['DELETE'])
+def cache_flush(collection_id):
+    """Drop cached SPARQL results of one collection (in this worker and the
+    shared result store)."""
+    _require_admin()
+    if not get_collection(collection_id):
+        abort(404)
+    flushed = result_cache.flush(collection_id)
+    viz_store.clear(collection_id)
+    return jsonify({'collection': collection_id, 'flushed': flushed})
+
+
+@main.route('/metrics')
+def metrics_view():
+    """Prometheus metrics of this worker process.
+
+    Open unless METRICS_TOKEN is set, in which case scrapers must send
+    it as a bearer token.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(
+            request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(403)
+    resp = make_response(metrics.render())
+    resp.mimetype = 'text/plain'
+    resp.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return resp
+
+
 @main.route('/collection/<collection_id>/item')
 def item_detail(collection_id):
     """Simple item detail page using the same SELECT as cards.
@@ -481,31 +877,26 @@ def item_detail(collection_id):
     # Decode potential encodings from the client
     item_uri = unquote(item_uri)
 
-    config_path = os.path.join(
-        DATA_DIR, collection["config_path"])  # absolute within repo
-    with open(config_path, encoding='utf-8') as f:
-        config = json.load(f)
-    _validate_config(config, collection_id)
+    config = get_config(collection_id)
 
     lang = get_locale()
-    prefixes = _sparql_prefixes()
-    select_clause = _inject_lang(config['cards']['select'], lang)
-    base_where = _inject_lang(config['cards']['where'], lang)
-    # Constrain to single item
-    where = base_where + f"\nVALUES ?item {{ <{item_uri}> }}\n"
-
-    query = f"""
-{prefixes}
-SELECT DISTINCT {select_clause}
-WHERE {{
-  {where}
-}}
-LIMIT 1
-"""
-    sparql = SPARQLWrapper(config['sparql_endpoint'])
-    sparql.setReturnFormat(JSON)
-    sparql.setQuery(query)
-    data_raw = sparql.query().convert()
+    try:
+        query = get_queries(collection_id, lang).item(item_uri)
+    except ValueError:
+        abort(400)
+    etag = http_cache.etag(lang, 'item', collection_id, item_uri, config=config)
+    resp = http_cache.not_modified(etag)
+    if resp is not None:
+        return resp
+    # The sidebar block queries run while the item query is in flight
+    item_future = submit_query(collection_id, config, query, label='item')
+    try:
+        sidebar_html = render_item_sidebar(collection_id, config, item_uri, lang)
+    except SparqlError as exc:
+        # The browser falls back to the external Melody API
+        current_app.logger.warning("Item sidebar for %s failed: %s", item_uri, exc)
+        sidebar_html = None
+    data_raw = _result(item_future)
     rows = data_raw['results']['bindings']
 
     def get_val(b, key):
@@ -530,25 +921,10 @@ LIMIT 1
             'conservation_org_label': get_val(b, 'conservation_org_label'),
         })
 
-    lang = get_locale()
     nav_title = collection.get(f'nav_title_{lang}', collection.get(
         f'title_{lang}', collection['title_it']))
-    # Localize Melody config file by language when available
-    item_api_cfg = config.get('item_api') or {}
-    cfg_url = item_api_cfg.get('config_url', '')
-    if isinstance(cfg_url, str) and cfg_url.endswith('.json'):
-        base = cfg_url[:-5]
-        lang_suffix = 'it' if lang == 'it' else 'en'
-        # Try underscore and dotted variants
-        for candidate_url in (f"{base}_{lang_suffix}.json", f"{base}.{lang_suffix}.json"):
-            rel = candidate_url[len(
-                '/static/'):] if candidate_url.startswith('/static/') else None
-            candidate_fs = os.path.join(STATIC_DIR, rel) if rel else None
-            if candidate_fs and os.path.exists(candidate_fs):
-                item_api_cfg = {**item_api_cfg, 'config_url': candidate_url}
-                break
 
-    return render_template(
+    resp = make_response(render_template(
         'item_detail.html',
         item=item,
         collection_meta={
@@ -556,5 +932,303 @@ LIMIT 1
             'image': collection.get('image'),
             'nav_title': nav_title
         },
-        item_api=item_api_cfg
-    )
+        item_api=_item_api(config, lang),
+        sidebar_html=sidebar_html
+    ))
+    if sidebar_html is None:
+        # Degraded page (client-side sidebar): don't let caches keep it
+        return resp
+    return http_cache.finish(resp, etag)
+
+
+@main.route('/api/<collection_id>/item')
+def item_sidebar(collection_id):
+    """Rendered Melody sidebar fragment of one item (`uri` query param)."""
+    if not get_collection(collection_id):
+        abort(404)
+    config = get_config(collection_id)
+    item_uri = request.args.get('uri')
+    if not item_uri:
+        abort(400)
+    lang = request.args.get('lang') or get_locale()
+    if lang not in {"it", "en"}:
+        abort(400)
+    item_uri = unquote(item_uri)
+    try:
+        sparql_iri(item_uri)
+    except ValueError:
+        abort(400)
+    etag = http_cache.etag(lang, 'item-sidebar', collection_id, item_uri, config=config)
+    vary_lang = 'lang' not in request.args
+    resp = http_cache.not_modified(etag, vary_lang)
+    if resp is not None:
+        return resp
+    html = render_item_sidebar(collection_id, config, item_uri, lang)
+    if html is None:
+        abort(404)
+    return http_cache.finish(make_response(str(html)), etag, vary_lang)
+
+
+def _item_rows(collection_id, config, queries, uris):
+    """Map URI -> first card binding of each found item in `uris`.
+
+    Items already cached by an item query (item pages, earlier lookups)
+    are taken from there; the others are fetched ITEMS_CHUNK_SIZE at a
+    time with one VALUES query per chunk, all chunks in flight at once.
+    Every fetched item, found or not, is cached as its item query result.
+    """
+    endpoint = config['sparql_endpoint']
+    keys = {uri: query_key(endpoint, queries.item(uri)) for uri in uris}
+    found, wanted = {}, []
+    for uri in uris:
+        raw = result_cache.get(keys[uri])
+        if raw is None:
+            wanted.append(uri)
+        elif raw['results']['bindings']:
+            found[uri] = raw['results']['bindings'][0]
+    chunk_size = max(1, int(current_app.config.get('ITEMS_CHUNK_SIZE', 100)))
+    chunks = [wanted[i:i + chunk_size] for i in range(0, len(wanted), chunk_size)]
+    futures = [submit_query(collection_id, config, queries.items_page(chunk), label='items')
+               for chunk in chunks]
+    for chunk, future in zip(chunks, futures):
+        fetched = {}
+        for b in _result(future)['results']['bindings']:
+            uri = (b.get('item') or {}).get('value')
+            if uri is not None:
+                fetched.setdefault(uri, b)
+        for uri in chunk:
+            if uri in fetched:
+                found[uri] = fetched[uri]
+            if not g.get('stale'):
+                result_cache.set(keys[uri], {'head': {'vars': []}, 'results': {
+                    'bindings': [fetched[uri]] if uri in fetched else []}},
+                    ttl=_cache_ttl(config), tag=collection_id)
+    return found
+
+
+@main.route('/api/<collection_id>/items', methods=['GET', 'POST'])
+def api_items(collection_id):
+    """Card fields of many items at once.
+
+    POST takes a JSON body { uris: [...], lang }, GET repeated `uri`
+    parameters and an optional `lang`. Returns { items: {uri: card or
+    null}, missing: [uris not found] }, in request order. At most
+    ITEMS_MAX_URIS (default 1000) URIs per request.
+    """
+    if not get_collection(collection_id):
+        abort(404)
+    config = get_config(collection_id)
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        uris, lang = body.get('uris'), body.get('lang') or get_locale()
+    else:
+        uris, lang = request.args.getlist('uri'), request.args.get('lang') or get_locale()
+    if lang not in {"it", "en"}:
+        abort(400)
+    if not isinstance(uris, list) or not all(isinstance(u, str) and u for u in uris):
+        abort(400)
+    uris = list(dict.fromkeys(uris))
+    if len(uris) > int(current_app.config.get('ITEMS_MAX_URIS', 1000)):
+        abort(400)
+    try:
+        for uri in uris:
+            sparql_iri(uri)
+    except ValueError:
+        abort(400)
+    queries = get_queries(collection_id, lang)
+
+    etag = vary_lang = None
+    if request.method == 'GET':
+        etag = http_cache.etag(lang, 'items', collection_id, uris, config=config)
+        vary_lang = 'lang' not in request.args
+        resp = http_cache.not_modified(etag, vary_lang)
+        if resp is not None:
+            return resp
+
+    index = catalogue_index.reader(collection_id, config)
+    if index is not None:
+        found = index.item_rows(lang, uris)
+    else:
+        found = _item_rows(collection_id, config, queries, uris)
+
+    payload = {
+        'items': {uri: export.card(found[uri]) if uri in found else None for uri in uris},
+        'missing': [uri for uri in uris if uri not in found],
+    }
+    if g.get('stale'):
+        payload['stale'] = True
+    if request.method == 'POST':
+        return jsonify(payload)
+    return http_cache.finish(jsonify(payload), etag, vary_lang)
+
+
+def _portal_wait(futures):
+    """Wait for `futures` up to PORTAL_SOURCE_TIMEOUT (within the budget)."""
+    timeout = float(current_app.config.get('PORTAL_SOURCE_TIMEOUT', 5.0))
+    remaining = sparql_remaining()
+    wait(futures, timeout=timeout if remaining is None else min(timeout, remaining))
+
+
+def _portal_result(future):
+    """Result of a source's future, or None if it failed or is late."""
+    if not future.done():
+        return None
+    try:
+        return _result(future)
+    except SparqlError:
+        return None
+
+
+@main.route('/api/cards')
+def portal_cards():
+    """Cards of every collection, merged into one listing by title.
+
+    Takes the `filters`, `q` and `lang` parameters of the collection
+    cards API, an optional `limit` (default 24, at most 100) and the
+    previous response's `nextCursor` as `cursor`. Every collection is
+    queried at once; one that fails or answers after
+    PORTAL_SOURCE_TIMEOUT seconds is left out of the page, listed under
+    `unavailable`, and `partial` is set. It keeps its position and is
+    listed under `behind` until its cards sorting before the listing's
+    position, flagged `late`, have been sent. Collections without one of
+    the selected filters have no matching cards.
+    """
+    lang = request.args.get('lang') or get_locale()
+    if lang not in {"it", "en"}:
+        abort(400)
+    body = _cards_args()
+    selected = body.get('filters') or {}
+    limit = min(max(request.args.get('limit', 24, type=int), 1), 100)
+    try:
+        positions, done, behind, last = portal.decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        abort(400)
+    terms = ' '.join(tokenize(body.get('q') or ''))
+    if len(terms.replace(' ', '')) < int(current_app.config.get('SEARCH_MIN_CHARS', 2)):
+        terms = ''
+
+    sources = {}
+    for c in load_collections():
+        collection_id = c['id']
+        config = registry.config(collection_id)
+        queries = registry.queries(collection_id, lang)
+        if config is None or queries is None or collection_id in done:
+            continue
+        if any(v and queries.facet(k) is None for k, v in selected.items()):
+            continue
+        sources[collection_id] = (config, queries)
+
+    # Title indexes build in the background concurrently; then wait for each
+    titles = {}
+    if terms:
+        for collection_id in sources:
+            search_index.get(collection_id, lang, wait=False)
+    pages, totals, unavailable = {}, {}, []
+    first_round, second_round = {}, {}
+    for collection_id, (config, queries) in sources.items():
+        after = positions.get(collection_id)
+        try:
+            index = catalogue_index.reader(collection_id, config)
+            if terms:
+                titles[collection_id] = search_index.get(collection_id, lang)
+            if index is not None:
+                items = None
+                if terms:
+                    index_titles = titles[collection_id]
+                    items = [index_titles.items[d] for d in index_titles.search(terms)]
+                rows, totals[collection_id] = index.cards(
+                    lang, config.get('filters', []), selected, limit, 0, after, items=items)
+                pages[collection_id] = (rows, len(rows) == limit)
+            elif terms and any(selected.get(f.key) for f in queries.facets):
+                first_round[collection_id] = submit_query(
+                    collection_id, config, queries.item_ids(selected), label='search:facets')
+            elif not terms:
+                second_round[collection_id] = (
+                    submit_query(collection_id, config,
+                                 queries.cursor_page(selected, limit, 0, after), label='page'),
+                    submit_query(collection_id, config, queries.count(selected), label='count'),
+                    None)
+        except ValueError:
+            abort(400)
+        except SparqlError:
+            unavailable.append(collection_id)
+
+    # Search: the page is cut from the title index, restricted to the
+    # facet selection's items first when there is one
+    _portal_wait(first_round.values())
+    for collection_id, (config, queries) in sources.items():
+        if not terms or collection_id in pages or collection_id in unavailable:
+            continue
+        matches = titles[collection_id].search(terms)
+        if collection_id in first_round:
+            raw = _portal_result(first_round[collection_id])
+            if raw is None:
+                unavailable.append(collection_id)
+                continue
+            allowed = {b['item']['value'] for b in raw['results']['bindings'] if b.get('item')}
+            matches = [d for d in matches if titles[collection_id].items[d] in allowed]
+        after = positions.get(collection_id)
+        start = titles[collection_id].after(matches, after) if after else 0
+        page = matches[start:start + limit]
+        totals[collection_id] = len(matches)
+        if not page:
+            pages[collection_id] = ([], False)
+            continue
+        items = [titles[collection_id].items[d] for d in page]
+        second_round[collection_id] = (
+            submit_query(collection_id, config, queries.items_page(items), label='page'),
+            None, len(page) == limit)
+
+    # Pages (and counts) of every collection are in flight at once
+    _portal_wait([f for page_future, count_future, _ in second_round.values()
+                  for f in (page_future, count_future) if f is not None])
+    for collection_id, (page_future, count_future, more) in second_round.items():
+        raw = _portal_result(page_future)
+        if raw is None:
+            unavailable.append(collection_id)
+            continue
+        rows = raw['results']['bindings']
+        pages[collection_id] = (rows, len(rows) == limit if more is None else more)
+        if collection_id not in totals:
+            count_raw = _portal_result(count_future)
+            try:
+                totals[collection_id] = int(count_raw['results']['bindings'][0]['total']['value'])
+            except (TypeError, LookupError, ValueError):
+                totals[collection_id] = None
+
+    merged, emitted, finished = portal.merge(pages, limit)
+    positions.update(emitted)
+    done |= finished
+    # Unavailable collections keep their position. Cards of one coming
+    # back that sort before the listing's position are sent, flagged as
+    # late, until it catches up.
+    cards = []
+    for collection_id, row in merged:
+        card = dict(export.card(row), summary='', collection=collection_id)
+        if last is not None and portal.position(row) <= last:
+            card['late'] = True
+        cards.append(card)
+    if merged:
+        end = portal.position(merged[-1][1])
+        if last is None or end > last:
+            # Past the listing's position: every late card has been sent
+            behind, last = set(), end
+        behind |= set(unavailable)
+    behind -= done
+    pending = [cid for cid in sources if cid not in done]
+    known = [t for t in totals.values() if t is not None]
+    payload = {
+        'cards': cards,
+        'total': sum(known),
+        'nextCursor': portal.encode_cursor(positions, done, behind, last) if pending else None,
+        'partial': bool(unavailable) or len(known) < len(totals),
+        'unavailable': sorted(unavailable),
+        'behind': sorted(behind),
+    }
+    if g.get('stale'):
+        payload['stale'] = True
+    resp = jsonify(payload)
+    if payload['partial'] or g.get('stale'):
+        resp.cache_control.no_store = True
+        return resp
+    return http_cache.finish(resp, vary_lang='lang' not in request.args)
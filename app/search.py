@@ -0,0 +1,262 @@
+"""In-process free-text search over card titles and labels.
+
+`TitleIndex` is an inverted index from normalized tokens (case and
+accents folded) to the items carrying them. Doc ids follow catalogue
+order (sort key, then item), so a query's matches come out already
+sorted and a page is a slice. Every query term matches as a prefix,
+which is what as-you-type search needs.
+
+`SearchIndex` keeps one `TitleIndex` per (collection, language), built
+from the SQLite catalogue index when a fresh one exists and from the
+SPARQL endpoint otherwise. Indexes older than `SEARCH_MAX_AGE` seconds,
+or built from a different config, keep answering while they are
+refreshed in the background. A refresh only reads what may have changed:
+nothing while the catalogue index it came from is current, otherwise
+the item ids, then the titles of new items alone. Titles of known items
+are read again by a full rebuild every `SEARCH_REBUILD_AGE` seconds.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from .queries import paged
+from .sparql import DeadlineExceeded, remaining
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+')
+# Sorts after every token sharing a given prefix
+_PREFIX_END = '\U0010ffff'
+# Prefixes up to this length get precomputed postings: they are what
+# as-you-type search sends first, and they match the most tokens
+SHORT_PREFIX = 2
+# Short prefixes matching more than this share of the items also get a
+# membership vector, so intersecting with them is a single pass
+DENSE_SHARE = 1 / 8
+# Items per titles query when reading new items only
+_NEW_ITEMS_CHUNK = 500
+
+
+def tokenize(text):
+    """Lowercased, accent-free word tokens of `text`."""
+    folded = unicodedata.normalize('NFKD', str(text).casefold())
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    return _WORD.findall(folded)
+
+
+class TitleIndex:
+    """Token -> items postings over (item, sort key, texts) entries."""
+
+    def __init__(self, entries, version=None, source=None):
+        docs = {}
+        for item, sort_key, texts in entries:
+            doc = docs.get(item)
+            if doc is None:
+                docs[item] = doc = [sort_key or '', set()]
+            elif sort_key and sort_key < doc[0]:
+                doc[0] = sort_key
+            doc[1].update(t for t in texts if t)
+        ordered = sorted(docs.items(), key=lambda kv: (kv[1][0], kv[0]))
+        self.items = [item for item, _ in ordered]
+        self.sort_keys = [doc[0] for _, doc in ordered]
+
+        postings = {}
+        for doc_id, (_, (_, texts)) in enumerate(ordered):
+            for token in {t for text in texts for t in tokenize(text)}:
+                postings.setdefault(token, []).append(doc_id)
+        self.tokens = sorted(postings)
+        self._postings = [array('I', postings[t]) for t in self.tokens]
+        short = {}
+        for token, doc_ids in postings.items():
+            for n in range(1, min(len(token), SHORT_PREFIX) + 1):
+                short.setdefault(token[:n], set()).update(doc_ids)
+        self._short = {p: array('I', sorted(ids)) for p, ids in short.items()}
+        self._dense = {}
+        for p, doc_ids in self._short.items():
+            if len(doc_ids) > len(self.items) * DENSE_SHARE:
+                vector = bytearray(len(self.items))
+                for doc_id in doc_ids:
+                    vector[doc_id] = 1
+                self._dense[p] = bytes(vector)
+        # item -> (sort key, texts), for refreshes to build on
+        self.docs = {item: (doc[0], tuple(doc[1])) for item, doc in ordered}
+        self.version = version
+        # What it was read from: ('index', built_at) or ('sparql', full read time)
+        self.source = source
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.items)
+
+    def _prefix(self, prefix):
+        """Sorted doc ids of items with a token starting with `prefix`."""
+        if len(prefix) <= SHORT_PREFIX:
+            return self._short.get(prefix, ())
+        lo = bisect_left(self.tokens, prefix)
+        hi = bisect_left(self.tokens, prefix + _PREFIX_END, lo)
+        if hi - lo == 1:
+            return self._postings[lo]
+        found = set()
+        for doc_ids in self._postings[lo:hi]:
+            found.update(doc_ids)
+        return sorted(found)
+
+    def search(self, query):
+        """Sorted doc ids of items matching every term of `query`."""
+        terms = sorted(((self._prefix(t), t) for t in set(tokenize(query))),
+                       key=lambda pt: len(pt[0]))
+        if not terms:
+            return []
+        # Filter the rarest term's matches, which keeps them sorted
+        matches = terms[0][0]
+        for doc_ids, term in terms[1:]:
+            if not matches:
+                break
+            vector = self._dense.get(term)
+            if vector is not None:
+                matches = [d for d in matches if vector[d]]
+            else:
+                keep = set(matches).intersection(doc_ids)
+                matches = [d for d in matches if d in keep]
+        return list(matches)
+
+    def after(self, doc_ids, cursor):
+        """Position in sorted `doc_ids` of the first doc past the
+        (sort key, item) `cursor`."""
+        lo, hi = 0, len(doc_ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            doc = doc_ids[mid]
+            if (self.sort_keys[doc], self.items[doc]) <= tuple(cursor):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class SearchIndex:
+    """Per-process title indexes of every collection and language."""
+
+    def __init__(self, registry, client, catalogue_index, max_age=600, rebuild_age=3600,
+                 chunk_size=5000):
+        self.registry = registry
+        self.client = client
+        self.catalogue_index = catalogue_index
+        self.max_age = max_age
+        self.rebuild_age = rebuild_age
+        self.chunk_size = chunk_size
+        self._indexes = {}
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_age = float(app.config.get('SEARCH_MAX_AGE', self.max_age))
+        self.rebuild_age = float(app.config.get('SEARCH_REBUILD_AGE', self.rebuild_age))
+        self.chunk_size = int(app.config.get('SEARCH_CHUNK_SIZE', self.chunk_size))
+        app.extensions['search_index'] = self
+
+    def _fresh(self, index):
+        if index.version != self.registry.version():
+            return False
+        return self.max_age <= 0 or time.time() - index.built_at < self.max_age
+
+    def get(self, collection_id, lang, wait=True):
+        """TitleIndex of a collection, building it if needed.
+
+        A stale index is returned as is while its replacement builds. With
+        no index yet, waits for the first build unless `wait` is false, in
+        which case None is returned. Build errors (e.g. SparqlError) are
+        raised to waiting callers, DeadlineExceeded if the caller's SPARQL
+        budget runs out first.
+        """
+        key = (collection_id, lang)
+        index = self._indexes.get(key)
+        if index is not None:
+            if not self._fresh(index):
+                self._build(key)
+            return index
+        future = self._build(key)
+        if not wait:
+            return None
+        try:
+            return future.result(timeout=remaining())
+        except FutureTimeout:
+            raise DeadlineExceeded(f"Search index {collection_id}/{lang} not ready") from None
+
+    def _build(self, key):
+        """Start building `key` unless a build is already running."""
+        with self._lock:
+            future = self._building.get(key)
+            if future is not None:
+                return future
+            future = self._building[key] = Future()
+        threading.Thread(target=self._run_build, args=(key, future),
+                         name=f'search-index-{key[0]}-{key[1]}', daemon=True).start()
+        return future
+
+    def _run_build(self, key, future):
+        collection_id, lang = key
+        try:
+            started = time.monotonic()
+            index = self._refresh(collection_id, lang, self._indexes.get(key))
+            self._indexes[key] = index
+            logger.info("Search index %s/%s: %d items in %.1fs", collection_id, lang,
+                        len(index), time.monotonic() - started)
+            future.set_result(index)
+        except Exception as exc:
+            logger.warning("Search index %s/%s failed: %s", collection_id, lang, exc)
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    def _refresh(self, collection_id, lang, old):
+        """Up to date TitleIndex of a collection, reusing what `old` read
+        where nothing can have changed."""
+        config = self.registry.config(collection_id)
+        queries = self.registry.queries(collection_id, lang)
+        if config is None or queries is None:
+            raise KeyError(collection_id)
+        version = self.registry.version()
+        if old is not None and old.version != version:
+            old = None
+        reader = self.catalogue_index.reader(collection_id, config)
+        if reader is not None:
+            source = ('index', reader.built_at)
+            if old is not None and old.source == source:
+                old.built_at = time.time()
+                return old
+            return TitleIndex(reader.titles(lang), version, source)
+
+        endpoint = config['sparql_endpoint']
+
+        def run(query):
+            return self.client.query(endpoint, query, label='search')
+
+        if (old is None or old.source is None or old.source[0] != 'sparql'
+                or time.time() - old.source[1] >= self.rebuild_age):
+            source = ('sparql', time.time())
+            return TitleIndex(_title_entries(paged(run, queries.titles(), self.chunk_size)),
+                              version, source)
+        # Items are rarely edited, mostly added or removed: diff the ids
+        # and read the titles of new items only
+        raw = run(queries.item_ids(None))
+        ids = {b['item']['value'] for b in raw['results']['bindings'] if b.get('item')}
+        entries = [(item, sort_key, texts) for item, (sort_key, texts) in old.docs.items()
+                   if item in ids]
+        added = sorted(ids.difference(old.docs))
+        for start in range(0, len(added), _NEW_ITEMS_CHUNK):
+            raw = run(queries.titles(added[start:start + _NEW_ITEMS_CHUNK]))
+            entries.extend(_title_entries(raw['results']['bindings']))
+        return TitleIndex(entries, version, old.source)
+
+
+def _title_entries(bindings):
+    for b in bindings:
+        yield (b['item']['value'], (b.get('sort_key') or {}).get('value', ''),
+               [(b.get(k) or {}).get('value', '') for k in ('title', 'label')])
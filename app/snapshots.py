@@ -0,0 +1,109 @@
+"""Last-known-good SPARQL results, persisted per collection.
+
+Results the catalogue can't do without (filter options, the unfiltered
+first page and its count, visualization data) are saved as
+`SNAPSHOT_DIR/<collection>/<name>.json` in the SPARQL JSON results format
+of the `data/*_it.json` exports. When the endpoint fails or runs out of
+time, they are served in place of the live result, marked as `Stale`.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from .sparql import SparqlError
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class Stale(dict):
+    """A snapshot served in place of a live SPARQL result."""
+
+    def __init__(self, raw, saved_at):
+        super().__init__(raw)
+        self.saved_at = saved_at
+
+
+class SnapshotStore:
+    """Reads and writes the snapshot files of every collection."""
+
+    def __init__(self, snapshot_dir=None, min_interval=60):
+        self.snapshot_dir = snapshot_dir
+        self.min_interval = min_interval
+        self._saved = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.snapshot_dir = app.config.get(
+            'SNAPSHOT_DIR', os.path.join(app.instance_path, 'snapshots'))
+        self.min_interval = float(app.config.get('SNAPSHOT_MIN_INTERVAL', self.min_interval))
+        app.extensions['snapshots'] = self
+
+    def path(self, collection_id, name):
+        return os.path.join(self.snapshot_dir, _UNSAFE.sub('_', collection_id),
+                            _UNSAFE.sub('_', name) + '.json')
+
+    def save(self, collection_id, name, raw):
+        """Persist `raw` as snapshot `name`, at most every `min_interval` s."""
+        if not self.snapshot_dir or isinstance(raw, Stale):
+            return
+        key = (collection_id, name)
+        now = time.monotonic()
+        with self._lock:
+            last = self._saved.get(key)
+            if last is not None and now - last < self.min_interval:
+                return
+            self._saved[key] = now
+        path = self.path(collection_id, name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(raw, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.warning("Could not save snapshot %s: %s", path, exc)
+
+    def load(self, collection_id, name):
+        """Snapshot `name` as a Stale result, or None."""
+        if not self.snapshot_dir:
+            return None
+        path = self.path(collection_id, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                raw = json.load(f)
+            saved_at = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+        return Stale(raw, saved_at)
+
+    def fallback(self, collection_id, name, future):
+        """A Future of `future`'s result, or of snapshot `name` if it fails
+        with SparqlError. The returned Future carries `snapshot`, so
+        callers giving up on it early can load the snapshot themselves.
+        """
+        out = Future()
+        out.set_running_or_notify_cancel()
+        out.snapshot = (collection_id, name)
+
+        def _done(f):
+            try:
+                out.set_result(f.result())
+            except SparqlError as exc:
+                snapshot = self.load(collection_id, name)
+                if snapshot is None:
+                    out.set_exception(exc)
+                else:
+                    logger.info("Serving snapshot %s/%s: %s", collection_id, name, exc)
+                    out.set_result(snapshot)
+            except BaseException as exc:
+                out.set_exception(exc)
+
+        future.add_done_callback(_done)
+        return out
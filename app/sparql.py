@@ -0,0 +1,349 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+from urllib.parse import urlencode
+
+import urllib3
+from urllib3.util import Retry, Timeout
+
+logger = logging.getLogger(__name__)
+
+# Absolute time.monotonic() by which the current request's queries must end
+_deadline = contextvars.ContextVar('sparql_deadline', default=None)
+
+
+# Answers worth retrying: the endpoint or a proxy in front of it is overloaded
+_RETRY_STATUSES = (502, 503, 504)
+
+
+class SparqlError(Exception):
+    """Raised when a SPARQL endpoint cannot be queried."""
+
+
+class DeadlineExceeded(SparqlError):
+    """Raised when the current request's SPARQL time budget runs out."""
+
+
+class CircuitOpen(SparqlError):
+    """Raised without contacting an endpoint whose circuit breaker is open."""
+
+
+def set_deadline(seconds):
+    """Give the SPARQL calls of the current context `seconds` in total
+    (None for no limit). Returns a token for `reset_deadline`.
+
+    Queries sent through `SparqlClient.submit` inherit the budget.
+    """
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class _Breaker:
+    """Consecutive-failure circuit breaker of one endpoint.
+
+    After `threshold` failures in a row the circuit opens and calls fail
+    fast for `cooldown` seconds; then a single trial call is let through,
+    closing the circuit on success and reopening it on failure.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def cancel(self):
+        """Forget an allowed call that never reached the endpoint."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok):
+        """Count one call outcome; True when it (re)opened the circuit."""
+        with self._lock:
+            trial, self._trial = self._trial, False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return False
+            self.failures += 1
+            if self.opened_at is not None and not trial:
+                # A call sent before the circuit opened
+                return False
+            if self.opened_at is None and not 0 < self.threshold <= self.failures:
+                return False
+            self.opened_at = time.monotonic()
+            return True
+
+
+class QueryEvent(NamedTuple):
+    """One finished SPARQL call, as passed to `SparqlClient.listeners`."""
+    endpoint: str
+    query: str
+    label: Optional[str]
+    duration: float
+    nbytes: int
+    rows: Optional[int]
+    error: Optional[Exception]
+
+
+class SparqlClient:
+    """Shared SPARQL-over-HTTP client.
+
+    One urllib3 pool per endpoint host keeps connections alive between
+    queries. Concurrency per endpoint is capped by a semaphore so a slow
+    triplestore cannot tie up every worker thread; transient failures
+    (connection errors, 502/503/504) are retried with exponential backoff.
+
+    Every call is reported to the callables in `listeners` as a
+    `QueryEvent`; `submit` runs queries in a copy of the caller's context
+    so listeners can attribute them to the request that made them.
+
+    Timeouts are capped by the caller's budget (`set_deadline`), and an
+    endpoint failing `breaker_threshold` times in a row (timeouts,
+    connection errors, 5xx) is not contacted for `breaker_cooldown`
+    seconds: calls raise CircuitOpen at once.
+    """
+
+    def __init__(self, connect_timeout=3.0, read_timeout=30.0, max_concurrency=8,
+                 retries=2, backoff_factor=0.2, acquire_timeout=10.0, workers=16,
+                 breaker_threshold=5, breaker_cooldown=30.0):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.acquire_timeout = acquire_timeout
+        self.workers = workers
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._pool = None
+        self._executor = None
+        self._slots = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.listeners = []
+
+    def init_app(self, app):
+        cfg = app.config
+        self.connect_timeout = float(cfg.get(
+            'SPARQL_CONNECT_TIMEOUT', self.connect_timeout))
+        self.read_timeout = float(cfg.get('SPARQL_READ_TIMEOUT', self.read_timeout))
+        self.max_concurrency = int(cfg.get(
+            'SPARQL_MAX_CONCURRENCY', self.max_concurrency))
+        self.retries = int(cfg.get('SPARQL_RETRIES', self.retries))
+        self.backoff_factor = float(cfg.get(
+            'SPARQL_BACKOFF_FACTOR', self.backoff_factor))
+        self.acquire_timeout = float(cfg.get(
+            'SPARQL_ACQUIRE_TIMEOUT', self.acquire_timeout))
+        self.workers = int(cfg.get('SPARQL_WORKERS', self.workers))
+        self.breaker_threshold = int(cfg.get(
+            'SPARQL_BREAKER_THRESHOLD', self.breaker_threshold))
+        self.breaker_cooldown = float(cfg.get(
+            'SPARQL_BREAKER_COOLDOWN', self.breaker_cooldown))
+        with self._lock:
+            if self._pool is not None:
+                self._pool.clear()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._pool = None
+            self._executor = None
+            self._slots = {}
+            self._breakers = {}
+        app.extensions['sparql_client'] = self
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = urllib3.PoolManager(
+                        num_pools=16,
+                        maxsize=self.max_concurrency,
+                        block=True,
+                        timeout=Timeout(connect=self.connect_timeout,
+                                        read=self.read_timeout),
+                        retries=Retry(
+                            total=self.retries,
+                            backoff_factor=self.backoff_factor,
+                            status_forcelist=_RETRY_STATUSES,
+                            # Queries are read-only, so retrying a POST is safe
+                            allowed_methods=None,
+                            raise_on_status=False,
+                        ),
+                        headers={'Accept': 'application/sparql-results+json'},
+                    )
+        return self._pool
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='sparql')
+        return self._executor
+
+    def _slot(self, endpoint):
+        slot = self._slots.get(endpoint)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.setdefault(
+                    endpoint, threading.BoundedSemaphore(self.max_concurrency))
+        return slot
+
+    def _breaker(self, endpoint):
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    endpoint, _Breaker(self.breaker_threshold, self.breaker_cooldown))
+        return breaker
+
+    def breakers(self):
+        """Map endpoint -> 'open' or 'closed'."""
+        return {endpoint: 'open' if b.is_open else 'closed'
+                for endpoint, b in list(self._breakers.items())}
+
+    def query(self, endpoint, query, label=None):
+        """Run a SELECT/ASK query and return the decoded SPARQL JSON result.
+
+        `label` names the query for listeners ('count', 'facet:subject', ...).
+        """
+        started = time.perf_counter()
+        result, nbytes, error = None, 0, None
+        try:
+            result, nbytes = self._query(endpoint, query)
+            return result
+        except SparqlError as exc:
+            error = exc
+            raise
+        finally:
+            rows = None
+            if isinstance(result, dict) and isinstance(result.get('results'), dict):
+                rows = len(result['results'].get('bindings') or ())
+            event = QueryEvent(endpoint, query, label, time.perf_counter() - started,
+                               nbytes, rows, error)
+            for listener in self.listeners:
+                listener(event)
+
+    def _query(self, endpoint, query):
+        budget = remaining()
+        if budget is not None and budget <= 0:
+            raise DeadlineExceeded(f"No time left to query {endpoint}")
+        breaker = self._breaker(endpoint)
+        if not breaker.allow():
+            raise CircuitOpen(f"Circuit open for {endpoint}")
+        slot = self._slot(endpoint)
+        acquire_timeout = self.acquire_timeout if budget is None else min(
+            self.acquire_timeout, budget)
+        if not slot.acquire(timeout=acquire_timeout):
+            # Not the endpoint's answer: leave the breaker as it was
+            breaker.cancel()
+            if budget is not None and remaining() <= 0:
+                raise DeadlineExceeded(f"No time left to query {endpoint}")
+            raise SparqlError(f"Too many concurrent queries to {endpoint}")
+        budget = remaining()
+        try:
+            if budget is None:
+                resp = self._post(endpoint, query)
+            else:
+                resp = self._post_within_budget(endpoint, query)
+        except urllib3.exceptions.HTTPError as exc:
+            self._failed(endpoint, breaker)
+            if budget is not None and remaining() <= 0:
+                raise DeadlineExceeded(
+                    f"SPARQL request to {endpoint} ran out of time: {exc}") from exc
+            raise SparqlError(f"SPARQL request to {endpoint} failed: {exc}") from exc
+        finally:
+            slot.release()
+        if resp.status >= 500:
+            self._failed(endpoint, breaker)
+        else:
+            breaker.record(True)
+        if resp.status >= 400:
+            raise SparqlError(
+                f"SPARQL endpoint {endpoint} returned HTTP {resp.status}")
+        try:
+            return json.loads(resp.data), len(resp.data)
+        except ValueError as exc:
+            raise SparqlError(
+                f"Invalid SPARQL JSON from {endpoint}: {exc}") from exc
+
+    def _post(self, endpoint, query, **kwargs):
+        return self._get_pool().request(
+            'POST', endpoint,
+            body=urlencode({'query': query}),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            **kwargs,
+        )
+
+    def _post_within_budget(self, endpoint, query):
+        """`_post` retrying transient failures like the pool does, with
+        every attempt's timeouts and backoff sleeps capped by the budget.
+
+        Returns the last response or raises the last error once retries or
+        the budget run out.
+        """
+        attempt = 0
+        while True:
+            budget = max(remaining(), 0.001)
+            timeout = Timeout(connect=min(self.connect_timeout, budget),
+                              read=min(self.read_timeout, budget), total=budget)
+            try:
+                resp = self._post(endpoint, query, retries=0, timeout=timeout)
+            except urllib3.exceptions.HTTPError:
+                if attempt >= self.retries or remaining() <= 0:
+                    raise
+                resp = None
+            else:
+                if (resp.status not in _RETRY_STATUSES or attempt >= self.retries
+                        or remaining() <= 0):
+                    return resp
+            time.sleep(max(min(self.backoff_factor * (2 ** attempt), remaining()), 0))
+            attempt += 1
+            if remaining() <= 0:
+                if resp is not None:
+                    return resp
+                raise urllib3.exceptions.TimeoutError(f"No time left to retry {endpoint}")
+
+    def _failed(self, endpoint, breaker):
+        if breaker.record(False):
+            logger.warning("Circuit opened for %s after %d failures; retrying in %.0fs",
+                           endpoint, breaker.failures, self.breaker_cooldown)
+
+    def submit(self, endpoint, query, label=None, background=False):
+        """Schedule `query` on the shared worker pool and return a Future.
+
+        `background` queries (refreshes outliving the request) drop the
+        caller's deadline.
+        """
+        ctx = contextvars.copy_context()
+        if background:
+            ctx.run(set_deadline, None)
+        return self._get_executor().submit(ctx.run, self.query, endpoint, query, label)
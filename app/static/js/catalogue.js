@@ -2,8 +2,25 @@
 
 let currentPage = 1;
 let TOTAL_PAGES = 1;
+// page number -> keyset cursor returned by the cards API; reset whenever
+// the filter selection changes
+let PAGE_CURSORS = { 1: null };
+let CURSOR_SELECTION = null;
+// Title search typed in the search box, and the number of the latest cards
+// request (older responses arriving late are dropped)
+let SEARCH_QUERY = '';
+let CARDS_REQUEST = 0;
+const SEARCH_DELAY_MS = 200;
 const cardsPerPage = 24;
 const UI_LOCALE = document.documentElement?.lang || 'it';
+// Set on pages of a static export: filters and card pages are then read
+// from precomputed JSON files under this URL, and can't be filtered
+const STATIC_API = window.STATIC_API || null;
+
+function filtersUrl(params) {
+    if (STATIC_API) return `${STATIC_API}filters.json`;
+    return `/api/${COLLECTION_ID}/filters?${params}`;
+}
 
 function capitalizeFirst(str, locale = UI_LOCALE) {
     if (typeof str !== 'string') return str;
@@ -31,10 +48,13 @@ function getRangeI18n() {
 document.addEventListener("DOMContentLoaded", async () => {
     await loadFilters();
     await loadCards();
-    document.getElementById("apply-filters").addEventListener("click", async () => {
-        currentPage = 1;
-        await loadCards();
-    });
+    const applyBtn = document.getElementById("apply-filters");
+    if (applyBtn) {
+        applyBtn.addEventListener("click", async () => {
+            currentPage = 1;
+            await loadCards();
+        });
+    }
     const clearBtn = document.getElementById("clear-filters");
     if (clearBtn) {
         clearBtn.addEventListener("click", async (e) => {
@@ -42,10 +62,25 @@ document.addEventListener("DOMContentLoaded", async () => {
             document.querySelectorAll('#filter-groups input[type="checkbox"]').forEach(cb => { cb.checked = false; });
             // Clear range inputs
             document.querySelectorAll('#filter-groups input[type="number"]').forEach(inp => { inp.value = ''; });
+            scheduleFacetCounts();
             currentPage = 1;
             await loadCards();
         });
     }
+    const searchInput = document.getElementById("catalogue-search");
+    if (searchInput) {
+        let searchTimer = null;
+        searchInput.addEventListener("input", () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(async () => {
+                const q = searchInput.value.trim();
+                if (q === SEARCH_QUERY) return;
+                SEARCH_QUERY = q;
+                currentPage = 1;
+                await loadCards();
+            }, SEARCH_DELAY_MS);
+        });
+    }
     document.getElementById("prev-page").addEventListener("click", async () => {
         if (currentPage > 1) {
             currentPage--;
@@ -65,7 +100,7 @@ async function loadFilters() {
     container.innerHTML = "";
 
     // Phase 1: Render empty filter groups
-    const structureRes = await fetch(`/api/${COLLECTION_ID}/filters?structureOnly=true`);
+    const structureRes = await fetch(filtersUrl(`structureOnly=true&lang=${UI_LOCALE}`));
     const groups = await structureRes.json();
     FILTER_GROUPS = groups;
 
@@ -115,7 +150,7 @@ async function loadFilters() {
     }
 
     // Phase 2: Fetch actual filter values
-    const fullRes = await fetch(`/api/${COLLECTION_ID}/filters`);
+    const fullRes = await fetch(filtersUrl(`lang=${UI_LOCALE}`));
     const fullGroups = await fullRes.json();
     FILTER_GROUPS = fullGroups;
 
@@ -156,14 +191,17 @@ async function loadFilters() {
             return;
         }
 
-        if (!group.options || group.options.length === 0) {
+        if (group.unavailable) {
+            // Facet query timed out or failed server-side
+            wrapper.innerHTML = `<div class="small fst-italic py-2">Opzioni non disponibili</div>`;
+        } else if (!group.options || group.options.length === 0) {
             wrapper.innerHTML = `<div class="small fst-italic py-2">Nessun filtro disponibile</div>`;
         } else {
             group.options.forEach(opt => {
                 const id = `filter-${btoa(opt.uri)}`;
                 wrapper.innerHTML += `
                 <div class="form-check checkbox-right pe-2">
-                    <label class="form-check-label" for="${id}">${capitalizeFirst(opt.label)}</label>
+                    <label class="form-check-label" for="${id}">${capitalizeFirst(opt.label)} <span class="small text-body-secondary" data-count></span></label>
                     <input class="form-check-input" type="checkbox" value="${opt.uri}" id="${id}" name="${group.key}">
                 </div>`;
 
@@ -173,6 +211,9 @@ async function loadFilters() {
 
     // Attach arrow listeners after all groups are populated
     attachArrowListeners();
+
+    container.addEventListener('change', scheduleFacetCounts);
+    updateFacetCounts();
 }
 
 function attachArrowListeners() {
@@ -231,7 +272,7 @@ function formatDateRange(begin, end) {
     return y1 || y2 || null;
 }
 
-async function loadCards() {
+function collectSelectedFilters() {
     const selectedFilters = {};
     document.querySelectorAll("#filter-groups input:checked").forEach(input => {
         const key = input.name;
@@ -251,19 +292,74 @@ async function loadCards() {
             selectedFilters[g.key] = { min: minV, max: maxV };
         }
     });
+    return selectedFilters;
+}
+
+let countsTimer = null;
 
-    const res = await fetch(`/api/${COLLECTION_ID}/cards`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ filters: selectedFilters, page: currentPage })
+function scheduleFacetCounts() {
+    clearTimeout(countsTimer);
+    countsTimer = setTimeout(updateFacetCounts, 200);
+}
+
+async function updateFacetCounts() {
+    // Per-option counts for the current selection, so options leading to an
+    // empty result can be disabled before the user applies them
+    const selection = encodeURIComponent(JSON.stringify(collectSelectedFilters()));
+    let groups;
+    try {
+        const res = await fetch(filtersUrl(`selection=${selection}&lang=${UI_LOCALE}`));
+        if (!res.ok) return;
+        groups = await res.json();
+    } catch (err) {
+        return;
+    }
+    groups.forEach(group => {
+        (group.options || []).forEach(opt => {
+            if (typeof opt.count !== 'number') return;
+            const input = document.getElementById(`filter-${btoa(opt.uri)}`);
+            if (!input) return;
+            const countEl = input.parentElement.querySelector('[data-count]');
+            if (countEl) countEl.textContent = `(${opt.count})`;
+            input.disabled = Boolean(STATIC_API) || (opt.count === 0 && !input.checked);
+        });
+    });
+}
+
+async function loadCards() {
+    const selectedFilters = collectSelectedFilters();
+
+    const selectionKey = JSON.stringify(selectedFilters);
+    const cursorSelection = JSON.stringify([selectedFilters, SEARCH_QUERY]);
+    if (cursorSelection !== CURSOR_SELECTION) {
+        PAGE_CURSORS = { 1: null };
+        CURSOR_SELECTION = cursorSelection;
+    }
+    // GET with an explicit lang, so the browser and shared caches can keep
+    // pages (the response then doesn't vary on the lang cookie)
+    const params = new URLSearchParams({
+        filters: selectionKey,
+        page: String(currentPage),
+        lang: UI_LOCALE
     });
+    // Resume from a known cursor; unknown pages fall back to page offsets
+    if (currentPage in PAGE_CURSORS) params.set('cursor', PAGE_CURSORS[currentPage] || '');
+    if (SEARCH_QUERY) params.set('q', SEARCH_QUERY);
+
+    const requestId = ++CARDS_REQUEST;
+    const res = await fetch(STATIC_API
+        ? `${STATIC_API}cards/${currentPage}.json`
+        : `/api/${COLLECTION_ID}/cards?${params}`);
+    if (requestId !== CARDS_REQUEST) return;
 
     if (!res.ok) {
         console.error("Error loading cards:", await res.text());
         return;
     }
 
-    const { cards, totalPages } = await res.json();
+    const { cards, totalPages, nextCursor } = await res.json();
+    if (requestId !== CARDS_REQUEST) return;
+    if (nextCursor) PAGE_CURSORS[currentPage + 1] = nextCursor;
     TOTAL_PAGES = Math.max(1, Number(totalPages) || 1);
     document.getElementById("page-number").textContent = `${currentPage} / ${TOTAL_PAGES}`;
 
@@ -296,7 +392,7 @@ async function loadCards() {
             .filter(Boolean)
             .map(escapeHtml);
         const metaText = metaTextParts.join(' \u2022 ');
-        const href = `/collection/${COLLECTION_ID}/item?uri=${encodeURIComponent(card.id)}`;
+        const href = card.href || `/collection/${COLLECTION_ID}/item?uri=${encodeURIComponent(card.id)}`;
         col.innerHTML = `
       <a href="${href}" class="text-decoration-none text-reset">
         <div class="card h-100 hover-shadow">
@@ -237,17 +237,22 @@
       if (!beginRaw || !endRaw) continue;
       const by = getYearUTC(beginRaw), ey = getYearUTC(endRaw);
       if (!Number.isFinite(by) || !Number.isFinite(ey)) continue;
-      years.push(representativeYear(by, ey));
+      years.push([representativeYear(by, ey), 1]);
     }
+    return binYearCounts(years, opts);
+  }
+
+  // Bucket [year, count] pairs (as served pre-aggregated by the viz API)
+  function binYearCounts(years, opts = {}) {
     if (!years.length) {
       return { starts: [], labels: [], counts: [], maxCount: 0, minYear: null, maxYear: null, binSize: 0 };
     }
-    const minYear = Math.min(...years), maxYear = Math.max(...years);
+    const minYear = Math.min(...years.map(p => p[0])), maxYear = Math.max(...years.map(p => p[0]));
     const binSize = chooseBinSize(minYear, maxYear, opts);
     const countMap = {};
-    for (const y of years) {
+    for (const [y, n] of years) {
       const b = floorToBinStart(y, binSize);
-      countMap[b] = (countMap[b] || 0) + 1;
+      countMap[b] = (countMap[b] || 0) + n;
     }
     const starts = []; const labels = []; const counts = [];
     for (let b = floorToBinStart(minYear, binSize); b <= maxYear; b += binSize) {
@@ -397,6 +402,7 @@
     document.querySelectorAll('canvas.timeline-chart').forEach(async (canvas) => {
       const sparql = canvas.dataset.sparql || ''; const endpoint = canvas.dataset.endpoint || '';
       const dataJson = canvas.dataset.json || '';
+      const dataApi = canvas.dataset.api || '';
       // Optional controls to influence binning behavior per chart
       const binSizeOpt = Number(canvas.dataset.binSize);
       const targetBinsOpt = Number(canvas.dataset.targetBins);
@@ -406,36 +412,47 @@
         .split(',')
         .map(s => Number(s.trim()))
         .filter(n => Number.isFinite(n) && n > 0);
+      const binOpts = {
+        binSize: binSizeOpt,
+        targetBins: targetBinsOpt,
+        minBins: minBinsOpt,
+        maxBins: maxBinsOpt,
+        allowed: allowedBinsOpt && allowedBinsOpt.length ? allowedBinsOpt : undefined
+      };
       try {
-        let raw;
-        if (dataJson) {
-          // Load precomputed rows from static JSON
-          const res = await fetch(dataJson, { headers: { 'Accept': 'application/json' } });
-          if (!res.ok) throw new Error(`Static JSON HTTP ${res.status}`);
+        let binned;
+        if (dataApi) {
+          // Server-side dataset: one [year, count] pair per representative year
+          const res = await fetch(dataApi, { headers: { 'Accept': 'application/json' } });
+          if (!res.ok) throw new Error(`Viz API HTTP ${res.status}`);
           const json = await res.json();
-          if (json && json.results && Array.isArray(json.results.bindings)) {
-            const rows = json.results.bindings.map(b => { const out = {}; for (const k in b) out[k] = b[k].value; return out; });
-            raw = rows;
-          } else if (Array.isArray(json)) {
-            raw = json;
-          } else if (Array.isArray(json.rows)) {
-            raw = json.rows;
+          binned = binYearCounts(Array.isArray(json.years) ? json.years : [], binOpts);
+        } else {
+          let raw;
+          if (dataJson) {
+            // Load precomputed rows from static JSON
+            const res = await fetch(dataJson, { headers: { 'Accept': 'application/json' } });
+            if (!res.ok) throw new Error(`Static JSON HTTP ${res.status}`);
+            const json = await res.json();
+            if (json && json.results && Array.isArray(json.results.bindings)) {
+              const rows = json.results.bindings.map(b => { const out = {}; for (const k in b) out[k] = b[k].value; return out; });
+              raw = rows;
+            } else if (Array.isArray(json)) {
+              raw = json;
+            } else if (Array.isArray(json.rows)) {
+              raw = json.rows;
+            } else {
+              throw new Error('Unsupported static JSON shape');
+            }
           } else {
-            throw new Error('Unsupported static JSON shape');
+            if (!sparql || !endpoint) return;
+            raw = await fetchTimelineSparql(sparql, endpoint);
           }
-        } else {
-          if (!sparql || !endpoint) return;
-          raw = await fetchTimelineSparql(sparql, endpoint);
+          const deduped = dedupeTimelineRows(raw);
+          const normalized = normalizeTimelineRows(deduped);
+          binned = processToBins(normalized, binOpts);
         }
-        const deduped = dedupeTimelineRows(raw);
-        const normalized = normalizeTimelineRows(deduped);
-        const { starts, labels, counts, binSize } = processToBins(normalized, {
-          binSize: binSizeOpt,
-          targetBins: targetBinsOpt,
-          minBins: minBinsOpt,
-          maxBins: maxBinsOpt,
-          allowed: allowedBinsOpt && allowedBinsOpt.length ? allowedBinsOpt : undefined
-        });
+        const { starts, labels, counts, binSize } = binned;
         if (!starts.length) { return; }
         const datasets = buildEqualWidthDatasets(starts, labels, counts, Math.max(...counts, 0));
         // Choose tick frequency to keep labels readable (~6–8 ticks)
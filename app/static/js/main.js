@@ -48,7 +48,10 @@ document.addEventListener("DOMContentLoaded", () => {
             // Clear container (SVG will be injected)
             container.innerHTML = '';
             const dataJsonUrl = card.dataset.json;
-            const dataPromise = dataJsonUrl ? fetchPreloadedData(dataJsonUrl) : fetchSparqlData(sparqlQuery, endpoint);
+            // Prefer the server-side pre-aggregated dataset
+            const dataPromise = card.dataset.api
+                ? fetchPreloadedData(card.dataset.api)
+                : (dataJsonUrl ? fetchPreloadedData(dataJsonUrl) : fetchSparqlData(sparqlQuery, endpoint));
             dataPromise
                 .then(data => renderPackedBubbleD3(container, data))
                 .catch(err => {
@@ -126,13 +129,14 @@ async function fetchPreloadedData(url) {
     const res = await fetch(url, { headers: { 'Accept': 'application/json' } });
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     const json = await res.json();
-    // Accept either SPARQL JSON or an array of rows
+    // Accept SPARQL JSON, an array of rows or a viz API payload ({items})
     if (json && json.results && Array.isArray(json.results.bindings)) {
         return transformSparqlResults(json);
     }
-    if (Array.isArray(json)) {
+    const rows = Array.isArray(json) ? json : (json && Array.isArray(json.items) ? json.items : null);
+    if (rows) {
         // Normalize: ensure label/count fields and clean label capitalization
-        return json.map(r => {
+        return rows.map(r => {
             const count = Number(r.count || r.value || r.total || 0);
             const raw = r.type_label || r.label || r.type || '';
             const label = (String(raw || '').trim());
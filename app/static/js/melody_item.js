@@ -11,12 +11,14 @@
     ? window.MELODY_CONFIG
     : datasetCfg;
   console.log('Melody item sidebar config:', cfg);
-  if (!cfg.API_URL) {
+  // Rendered server-side with the page: only the charts are left to draw
+  const preRendered = container.dataset.rendered === '1';
+  if (!cfg.API_URL && !preRendered) {
     container.innerHTML = '<div class="small opacity-75">Missing API_URL</div>';
     return;
   }
 
-  const CHART_JS_SRC = '/static/vendor/chart.js/chart.umd.js';
+  const CHART_JS_SRC = cfg.CHART_JS_SRC || '/static/vendor/chart.js/chart.umd.js';
   let chartLoaderPromise = null;
   let timelinePluginRegistered = false;
 
@@ -417,6 +419,10 @@
   }
 
   (async () => {
+    if (preRendered) {
+      await renderMelodyVisualizations(container, cfg);
+      return;
+    }
     let configObj = null;
     const lang = (window.MELODY_CONFIG && window.MELODY_CONFIG.LANG) || (container.dataset.lang || '');
     if (cfg.CONFIG_URL) {
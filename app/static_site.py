@@ -0,0 +1,329 @@
+"""Static export of the whole portal, for serving from a plain file server.
+
+Every page is rendered by the blueprint views themselves (through the
+test client), once per language, under `OUT_DIR/<lang>/` with the
+language as script root, so links stay inside one language's tree:
+
+    <lang>/index.html                          homepage
+    <lang>/collection/<id>/index.html          collection home
+    <lang>/collection/<id>/overview/index.html overview
+    <lang>/catalogue/<id>/index.html           catalogue
+    <lang>/collection/<id>/item/<key>.html     item detail pages
+    <lang>/api/<id>/filters.json               filter options and counts
+    <lang>/api/<id>/cards/<page>.json          unfiltered card pages
+    <lang>/api/<id>/viz/<viz id>.json          overview chart data
+    <lang>/static/...                          (built) static assets
+    static/...                                 the same, for `/static/...`
+                                               paths written in configs
+
+Item rows are read in large keyset chunks (or from the catalogue index)
+and seeded into the result cache, so rendering an item page sends no item
+query. Item pages are rendered by a process pool. `.export.json` records a
+fingerprint of each item's rows: later runs only re-render items whose
+rows changed, unless the release or configs changed.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import groupby
+from multiprocessing import get_context
+from urllib.parse import urlencode
+
+from flask import url_for
+
+from . import export
+from .cache import query_key, resolved
+from .extensions import (assets, catalogue_index, http_cache, registry, result_cache,
+                         sparql)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = '.export.json'
+# Item rows seeded into the result cache outlive the render of their page
+_SEED_TTL = 3600
+
+# The app of a pool worker process
+_worker = {}
+
+
+def item_key(item_uri):
+    """File name (without extension) of an item's page."""
+    return hashlib.sha1(item_uri.encode('utf-8')).hexdigest()[:16]
+
+
+def viz_path(collection_id, viz_id):
+    """URL path, below the language root, of an overview chart's data."""
+    return f"/api/{collection_id}/viz/{viz_id}.json"
+
+
+def _write(path, data):
+    """Write `path` atomically, so a file server never sees half a file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def _link(src, dst):
+    """Hard link `src` as `dst`, copying across filesystems."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _fingerprint(rows):
+    raw = json.dumps(rows, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _get(client, base_path, lang, url):
+    """GET `url` as a visitor of `lang`, with links rooted at /<lang>."""
+    # The test client sends the cookies of its jar, never a Cookie header
+    return client.get(url, base_url=f"http://localhost{base_path}/{lang}",
+                      headers={'Accept-Language': lang})
+
+
+def _complete(resp):
+    """Whether a response is the full, live one (not degraded or stale)."""
+    return resp.status_code == 200 and resp.headers.get('ETag') and 'Warning' not in resp.headers
+
+
+def render_items(app, out_dir, base_path, collection_id, lang, items):
+    """Render the pages of `items`, (item URI, rows) pairs.
+
+    Returns (relative path, fingerprint) per page written; the fingerprint
+    is None when the page is degraded (e.g. its sidebar failed) so that
+    the next export renders it again.
+    """
+    config = registry.config(collection_id)
+    queries = registry.queries(collection_id, lang)
+    endpoint = config['sparql_endpoint']
+    with app.test_request_context():
+        url = url_for('main.item_detail', collection_id=collection_id)
+    written = []
+    with app.test_client() as client:
+        for item_uri, rows in items:
+            try:
+                query = queries.item(item_uri)
+            except ValueError:
+                logger.warning("Skipping item with an unusable IRI: %r", item_uri)
+                continue
+            result_cache.set(query_key(endpoint, query),
+                             {'head': {'vars': []}, 'results': {'bindings': rows[:1]}},
+                             ttl=_SEED_TTL, tag=collection_id)
+            resp = _get(client, base_path, lang, f"{url}?{urlencode({'uri': item_uri})}")
+            if resp.status_code != 200:
+                logger.warning("Item page %s: HTTP %d", item_uri, resp.status_code)
+                continue
+            rel_path = f"{lang}/collection/{collection_id}/item/{item_key(item_uri)}.html"
+            _write(os.path.join(out_dir, rel_path), resp.get_data())
+            written.append((rel_path, _fingerprint(rows) if _complete(resp) else None))
+    return written
+
+
+def _init_worker(config):
+    from . import create_app
+    app = create_app()
+    app.config.update(config)
+    _worker['app'] = app
+
+
+def _render_items_task(*args):
+    return render_items(_worker['app'], *args)
+
+
+class SiteExport:
+    """One run of the static export of an app into `out_dir`."""
+
+    def __init__(self, app, out_dir, base_path='', workers=None, chunk_size=500,
+                 batch_size=50, full=False, echo=logger.info):
+        self.app = app
+        self.out_dir = out_dir
+        self.base_path = base_path.rstrip('/')
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.echo = echo
+        self.signature = hashlib.sha1(json.dumps(
+            [http_cache.release, registry.version(), self.base_path]).encode('utf-8')).hexdigest()
+        self.items = {}
+        self.seen = set()
+        if not full:
+            try:
+                with open(os.path.join(out_dir, MANIFEST), encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('signature') == self.signature:
+                    self.items = manifest.get('items') or {}
+            except (OSError, ValueError):
+                pass
+        self.stats = {'pages': 0, 'items': 0, 'unchanged': 0, 'degraded': 0, 'removed': 0}
+
+    def run(self, collection_ids, langs):
+        self.app.config['STATIC_EXPORT'] = True
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(
+                self.workers, mp_context=get_context('spawn'),
+                initializer=_init_worker, initargs=({'STATIC_EXPORT': True},))
+        try:
+            with self.app.test_request_context():
+                self._copy_static('')
+                for lang in langs:
+                    self._copy_static(lang)
+                    self._redirects(lang, langs)
+                    self._page(self.app.test_client(), lang, url_for('main.homepage'))
+                    for collection_id in collection_ids:
+                        self._collection(collection_id, lang, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self._prune(collection_ids, langs)
+        root = f"{self.base_path}/{langs[0]}/"
+        _write(os.path.join(self.out_dir, 'index.html'), _redirect_page(root).encode('utf-8'))
+        _write(os.path.join(self.out_dir, MANIFEST), json.dumps(
+            {'signature': self.signature, 'items': self.items}, sort_keys=True).encode('utf-8'))
+        return self.stats
+
+    def _page(self, client, lang, url, rel_path=None):
+        """Render `url` into `rel_path` (default: `<url>/index.html`)."""
+        resp = _get(client, self.base_path, lang, url)
+        if resp.status_code != 200:
+            self.echo(f"{lang}{url}: HTTP {resp.status_code}, skipped")
+            return None
+        if not _complete(resp):
+            self.stats['degraded'] += 1
+        rel_path = rel_path or (url.strip('/') + '/index.html').lstrip('/')
+        _write(os.path.join(self.out_dir, lang, rel_path), resp.get_data())
+        self.stats['pages'] += 1
+        return resp
+
+    def _collection(self, collection_id, lang, pool):
+        config = registry.config(collection_id)
+        # Not used as a context manager: url_for must not pick up the
+        # script root of the client's last request
+        client = self.app.test_client()
+        for endpoint in ('main.collection_home', 'main.collection_overview', 'main.catalogue'):
+            self._page(client, lang, url_for(endpoint, collection_id=collection_id))
+        for viz in config.get('visualizations') or ():
+            if viz.get('id'):
+                self._page(client, lang, url_for(
+                    'main.viz_data', collection_id=collection_id, viz_id=viz['id'], lang=lang),
+                    viz_path(collection_id, viz['id']).lstrip('/'))
+        self._page(client, lang, url_for(
+            'main.get_filters', collection_id=collection_id, lang=lang, selection='{}'),
+            f"api/{collection_id}/filters.json")
+        self._items(collection_id, config, lang, pool)
+
+    def _chunks(self, collection_id, config, lang):
+        reader = catalogue_index.reader(collection_id, config)
+        if reader is not None:
+            return reader.iter_cards(lang, config.get('filters', []), {}, self.chunk_size)
+        endpoint = config['sparql_endpoint']
+        return export.sparql_chunks(
+            registry.queries(collection_id, lang), {},
+            lambda q: sparql.query(endpoint, q, label='static'), self.chunk_size)
+
+    def _items(self, collection_id, config, lang, pool):
+        """Card pages of the collection, and the pages of changed items."""
+        queries = registry.queries(collection_id, lang)
+        cards, batch, pending = [], [], set()
+        item_dir = f"{self.base_path}/{lang}/collection/{collection_id}/item/"
+        rows = (b for chunk in self._chunks(collection_id, config, lang) for b in chunk)
+        for item_uri, item_rows in groupby(rows, key=lambda b: export.card(b)['id']):
+            item_rows = list(item_rows)
+            cards.append(dict(export.card(item_rows[0]), summary='',
+                              href=f"{item_dir}{item_key(item_uri)}.html"))
+            rel_path = f"{lang}/collection/{collection_id}/item/{item_key(item_uri)}.html"
+            self.seen.add(rel_path)
+            if (self.items.get(rel_path) == _fingerprint(item_rows)
+                    and os.path.exists(os.path.join(self.out_dir, rel_path))):
+                self.stats['unchanged'] += 1
+                continue
+            batch.append((item_uri, item_rows))
+            if len(batch) >= self.batch_size:
+                pending.add(self._submit(pool, collection_id, lang, batch))
+                batch = []
+                # Bounded: chunks keep streaming while workers render
+                while len(pending) > 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._record(done)
+        if batch:
+            pending.add(self._submit(pool, collection_id, lang, batch))
+        self._record(wait(pending).done)
+
+        total_pages = max(1, math.ceil(len(cards) / queries.limit))
+        for page in range(total_pages):
+            payload = {'cards': cards[page * queries.limit:(page + 1) * queries.limit],
+                       'totalPages': total_pages, 'total': len(cards)}
+            _write(os.path.join(self.out_dir, lang, 'api', collection_id, 'cards',
+                                f"{page + 1}.json"),
+                   json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        self.stats['pages'] += total_pages
+
+    def _submit(self, pool, collection_id, lang, batch):
+        args = (self.out_dir, self.base_path, collection_id, lang, batch)
+        if pool is None:
+            return resolved(render_items(self.app, *args))
+        return pool.submit(_render_items_task, *args)
+
+    def _record(self, futures):
+        for future in futures:
+            for rel_path, fingerprint in future.result():
+                self.stats['items'] += 1
+                if fingerprint is None:
+                    self.stats['degraded'] += 1
+                    self.items.pop(rel_path, None)
+                else:
+                    self.items[rel_path] = fingerprint
+
+    def _prune(self, collection_ids, langs):
+        """Remove the pages of items no longer in the exported collections."""
+        prefixes = tuple(f"{lang}/collection/{cid}/item/"
+                         for lang in langs for cid in collection_ids)
+        for rel_path in [p for p in self.items if p.startswith(prefixes) and p not in self.seen]:
+            del self.items[rel_path]
+            try:
+                os.remove(os.path.join(self.out_dir, rel_path))
+                self.stats['removed'] += 1
+            except OSError:
+                pass
+
+    def _copy_static(self, lang):
+        """Static files of the pages (built assets if there are any), hard
+        linked from the app's."""
+        src = assets.out_dir if assets.manifest else self.app.static_folder
+        dst = os.path.join(self.out_dir, lang, self.app.static_url_path.strip('/'))
+        shutil.copytree(src, dst, copy_function=_link, dirs_exist_ok=True)
+
+    def _redirects(self, lang, langs):
+        """The language switch links: pages sending to the other language."""
+        for other in langs:
+            url = url_for('main.set_language', lang=other)
+            page = _redirect_page(f"{self.base_path}/{other}/", switch=(
+                f"{self.base_path}/{lang}/", f"{self.base_path}/{other}/"))
+            _write(os.path.join(self.out_dir, lang, url.strip('/'), 'index.html'),
+                   page.encode('utf-8'))
+
+
+def _redirect_page(target, switch=None):
+    """HTML page redirecting to `target`; with `switch` (from, to), to the
+    referring page with its language root swapped instead."""
+    script = ''
+    if switch is not None:
+        script = ("<script>var r=document.referrer,p=r&&new URL(r).pathname;"
+                  f"if(p&&p.indexOf({json.dumps(switch[0])})===0)"
+                  f"location.replace({json.dumps(switch[1])}+p.slice({len(switch[0])})"
+                  "+new URL(r).search);</script>")
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8">{script}'
+            f'<meta http-equiv="refresh" content="0; url={target}">'
+            f'<link rel="canonical" href="{target}"></head></html>')
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+
+from .sparql import SparqlError
+
+_YEAR = re.compile(r'^\s*(-?\d{1,4})')
+
+
+def _year(value):
+    """Year from the lexical form of an xsd:date/dateTime (no tz shifting)."""
+    m = _YEAR.match(value or '')
+    return int(m.group(1)) if m else None
+
+
+def _values(raw):
+    for b in raw['results']['bindings']:
+        yield {k: v.get('value') for k, v in b.items() if isinstance(v, dict)}
+
+
+def _clean_label(s):
+    t = str(s or '').strip()
+    return t[:1].upper() + t[1:] if t else t
+
+
+def aggregate_bubble(raw):
+    """Sum counts per label: [{label, count}] sorted by count desc."""
+    totals = {}
+    for row in _values(raw):
+        label = _clean_label(row.get('type_label') or row.get('label') or row.get('type'))
+        if not label:
+            continue
+        try:
+            count = int(float(row.get('count') or 0))
+        except ValueError:
+            count = 0
+        totals[label] = totals.get(label, 0) + count
+    items = [{'label': k, 'count': v} for k, v in totals.items()]
+    items.sort(key=lambda x: (-x['count'], x['label']))
+    return {'type': 'bubble', 'items': items}
+
+
+def aggregate_timeline(raw):
+    """Collapse rows to one begin/end span per item, then count items per
+    representative (midpoint) year: {years: [[year, count], ...]}.
+
+    Mirrors the dedupe/normalize steps `charts.js` used to run client-side,
+    so the browser only has to choose a bin size.
+    """
+    spans = {}
+    for row in _values(raw):
+        begin = row.get('begin') or row.get('start')
+        end = row.get('end') or begin
+        by, ey = _year(begin), _year(end)
+        if by is None:
+            continue
+        if ey is None:
+            ey = by
+        key = row.get('item') or row.get('id') or row.get('uri') or f"range:{begin}|{end}"
+        lo, hi = spans.get(key, (by, ey))
+        spans[key] = (min(lo, by), max(hi, ey))
+    counts = {}
+    for lo, hi in spans.values():
+        # Same rounding as JS Math.round
+        year = lo if lo == hi else math.floor((lo + hi) / 2 + 0.5)
+        counts[year] = counts.get(year, 0) + 1
+    return {'type': 'timeline', 'years': sorted([y, n] for y, n in counts.items())}
+
+
+AGGREGATORS = {
+    'bubble': aggregate_bubble,
+    'timeline': aggregate_timeline,
+}
+
+
+class _Entry:
+    def __init__(self, payload, computed_at, stale=False):
+        self.payload = payload
+        self.computed_at = computed_at
+        self.stale = stale
+        body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        self.etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+class VizStore:
+    """Server-side, pre-aggregated overview visualization datasets.
+
+    Each (collection, viz, lang) payload is computed once from the viz's
+    `sparql_query`; after `VIZ_TTL` seconds it is still served while a
+    single background refresh runs on the SPARQL client's worker pool.
+    Every `VIZ_REFRESH_INTERVAL` seconds a timer also refreshes the
+    expired entries nobody asked for, so they are warm when next served.
+    Query results are also kept as snapshots, served (as stale entries)
+    when the first computation after a restart fails.
+    """
+
+    def __init__(self, client, snapshots=None, ttl=3600, refresh_interval=60):
+        self.client = client
+        self.snapshots = snapshots
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._sources = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._timer = None
+
+    def init_app(self, app):
+        self.ttl = float(app.config.get('VIZ_TTL', self.ttl))
+        self.refresh_interval = float(app.config.get(
+            'VIZ_REFRESH_INTERVAL', self.refresh_interval))
+        app.extensions['viz_store'] = self
+
+    def _start_timer(self):
+        """Start the refresh timer once there is something to refresh."""
+        with self._lock:
+            if self._timer is not None or self.refresh_interval <= 0:
+                return
+            self._timer = threading.Thread(target=self._run_timer,
+                                           name='viz-refresh', daemon=True)
+        self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh_expired()
+
+    def refresh_expired(self):
+        """Start a background refresh of every entry older than the TTL."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [(key, self._sources[key]) for key, entry in self._entries.items()
+                       if now - entry.computed_at > self.ttl and key in self._sources]
+        for key, (viz, config) in expired:
+            self._refresh_async(key, viz, config, key[2])
+
+    @staticmethod
+    def _query(viz, config, lang):
+        endpoint = viz.get('sparql_endpoint') or config['sparql_endpoint']
+        return endpoint, viz['sparql_query'].replace('$LANG$', lang)
+
+    @staticmethod
+    def _snapshot_name(key):
+        return f"viz-{key[1]}-{key[2]}"
+
+    def _store(self, key, viz, raw):
+        payload = AGGREGATORS[viz['type']](raw)
+        entry = _Entry(payload, time.monotonic())
+        with self._lock:
+            self._entries[key] = entry
+        if self.snapshots is not None:
+            self.snapshots.save(key[0], self._snapshot_name(key), raw)
+        return entry
+
+    def _from_snapshot(self, key, viz):
+        raw = self.snapshots.load(key[0], self._snapshot_name(key)) if self.snapshots else None
+        if raw is None:
+            return None
+        return _Entry(AGGREGATORS[viz['type']](raw), time.monotonic(), stale=True)
+
+    def _refresh_async(self, key, viz, config, lang):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        endpoint, query = self._query(viz, config, lang)
+
+        def _done(f):
+            try:
+                if not f.cancelled() and f.exception() is None:
+                    self._store(key, viz, f.result())
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self.client.submit(endpoint, query, label=f"viz:{viz['id']}",
+                           background=True).add_done_callback(_done)
+
+    def get(self, collection_id, config, viz, lang):
+        """Return the cached entry (payload + etag), computing it if needed.
+
+        Raises KeyError for chart types without a server-side aggregator,
+        SparqlError if the first computation fails and there's no snapshot.
+        """
+        if viz.get('type') not in AGGREGATORS:
+            raise KeyError(viz.get('type'))
+        key = (collection_id, viz['id'], lang)
+        self._sources[key] = (viz, config)
+        self._start_timer()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry.computed_at > self.ttl:
+                self._refresh_async(key, viz, config, lang)
+            return entry
+        # First request for this key: compute once, other callers wait
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                endpoint, query = self._query(viz, config, lang)
+                try:
+                    raw = self.client.query(endpoint, query, label=f"viz:{viz['id']}")
+                except SparqlError:
+                    entry = self._from_snapshot(key, viz)
+                    if entry is None:
+                        raise
+                    return entry
+                entry = self._store(key, viz, raw)
+        return entry
+
+    def clear(self, collection_id=None):
+        with self._lock:
+            for key in [k for k in self._entries
+                        if collection_id is None or k[0] == collection_id]:
+                del self._entries[key]
+                self._sources.pop(key, None)
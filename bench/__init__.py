@@ -0,0 +1 @@
+"""Benchmark harness for the catalogue APIs; run with `python -m bench`."""
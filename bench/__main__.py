@@ -0,0 +1,204 @@
+"""Catalogue benchmark.
+
+    python -m bench --items 1000 10000 100000 --sessions 200 --concurrency 16
+    python -m bench --items 10000 --json bench.json
+    python -m bench --items 10000 --baseline bench.json    # exit 1 on regression
+
+For each size a synthetic graph is generated (and kept under --work-dir),
+served by an in-process SPARQL stand-in bound to the collection's
+configured `sparql_endpoint` address, and the portal runs on a local
+threaded server. Sessions from `bench.sessions` are replayed and
+throughput plus p50/p95/p99 latency are reported per request kind.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import urllib3
+from werkzeug.serving import make_server
+
+from .endpoint import StandInEndpoint
+from .graph import write_graph
+from .sessions import LABELS, Recorder, Session
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, wall):
+    by_label = {}
+    for label, elapsed, ok in samples:
+        by_label.setdefault(label, []).append((elapsed, ok))
+    out = {}
+    for label in sorted(by_label, key=lambda x: LABELS.index(x) if x in LABELS else len(LABELS)):
+        rows = by_label[label]
+        times = sorted(e * 1000 for e, _ in rows)
+        out[label] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, ok in rows if not ok),
+            'rps': round(len(rows) / wall, 2) if wall else None,
+            'p50_ms': round(percentile(times, 50), 1),
+            'p95_ms': round(percentile(times, 95), 1),
+            'p99_ms': round(percentile(times, 99), 1),
+        }
+    return out
+
+
+def print_report(n_items, result):
+    print(f"\n== {n_items} items: {result['sessions']} sessions in {result['wall_s']}s, "
+          f"{result['requests_per_s']} req/s, {result['sparql_queries']} SPARQL queries")
+    print(f"{'request':<20}{'n':>7}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, s in result['endpoints'].items():
+        print(f"{label:<20}{s['requests']:>7}{s['errors']:>6}{s['rps']:>9}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def compare(results, baseline, tolerance):
+    """List of human-readable p95 regressions against a previous run."""
+    regressions = []
+    for size, result in results.items():
+        before = baseline.get('results', {}).get(size)
+        if not before:
+            continue
+        for label, s in result['endpoints'].items():
+            old = before['endpoints'].get(label)
+            if old and old['p95_ms'] and s['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{size} items, {label}: p95 {old['p95_ms']} -> {s['p95_ms']} ms")
+            if old is not None and s['errors'] > old['errors']:
+                regressions.append(f"{size} items, {label}: errors {old['errors']} -> {s['errors']}")
+    return regressions
+
+
+def _configure(args, index_dir):
+    """App settings for one run, through the same FLASK_* env vars as deployments."""
+    os.environ['FLASK_INDEX_DIR'] = index_dir
+    os.environ['FLASK_SPARQL_MAX_CONCURRENCY'] = str(args.sparql_concurrency)
+    os.environ['FLASK_SPARQL_READ_TIMEOUT'] = str(args.sparql_timeout)
+    if args.no_cache:
+        os.environ['FLASK_CACHE_MAX_ENTRIES'] = '0'
+
+
+def run_size(args, n_items):
+    graph_path = os.path.join(args.work_dir, f'graph-{n_items}-{args.seed}.nt')
+    started = time.monotonic()
+    vocab = write_graph(graph_path, n_items, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(prefix='bench-index-') as index_dir:
+        _configure(args, index_dir)
+        # Imported late so the env vars above are seen by create_app
+        from app import create_app
+        from app.extensions import catalogue_index, registry, result_cache, sparql, viz_store
+
+        app = create_app()
+        result_cache.flush()
+        viz_store.clear()
+        config = registry.config(args.collection)
+        if config is None:
+            raise SystemExit(f"Unknown collection or missing config: {args.collection}")
+        endpoint_url = urlparse(config['sparql_endpoint'])
+        endpoint = StandInEndpoint(graph_path, host=endpoint_url.hostname,
+                                   port=endpoint_url.port or 80, backend=args.backend,
+                                   latency=args.latency / 1000).start()
+        print(f"{n_items} items: graph + {endpoint.store.name} load "
+              f"{time.monotonic() - started:.1f}s", file=sys.stderr)
+        try:
+            if args.index:
+                started = time.monotonic()
+                catalogue_index.build(args.collection, config,
+                                      lambda q: sparql.query(config['sparql_endpoint'], q, label='index'))
+                print(f"{n_items} items: index built in {time.monotonic() - started:.1f}s",
+                      file=sys.stderr)
+
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+            http = urllib3.PoolManager(maxsize=args.concurrency, timeout=120, retries=False)
+
+            def session(i, recorder):
+                rng = random.Random(args.seed * 1_000_003 + i)
+                Session(http, base_url, args.collection, vocab, rng, recorder).run()
+
+            warmup = Recorder()
+            for i in range(args.warmup):
+                session(-1 - i, warmup)
+
+            recorder = Recorder()
+            queries_before = endpoint.queries
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda i: session(i, recorder), range(args.sessions)))
+            wall = time.monotonic() - started
+            server.shutdown()
+        finally:
+            endpoint.stop()
+
+    return {
+        'sessions': args.sessions,
+        'wall_s': round(wall, 2),
+        'requests_per_s': round(len(recorder.samples) / wall, 2),
+        'sparql_queries': endpoint.queries - queries_before,
+        'endpoints': summarize(recorder.samples, wall),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent sessions.")
+    parser.add_argument('--warmup', type=int, default=2, help="Unrecorded sessions first.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--collection', default='aldrovandi',
+                        help="Collection whose config (cards, filters, item sidebar) is used.")
+    parser.add_argument('--backend', choices=('auto', 'pyoxigraph', 'rdflib'), default='auto')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Extra ms per SPARQL response, to mimic a remote triplestore.")
+    parser.add_argument('--sparql-concurrency', type=int, default=8,
+                        help="FLASK_SPARQL_MAX_CONCURRENCY for the portal.")
+    parser.add_argument('--sparql-timeout', type=float, default=30.0,
+                        help="FLASK_SPARQL_READ_TIMEOUT for the portal, in seconds.")
+    parser.add_argument('--index', action='store_true',
+                        help="Build the SQLite catalogue index before replaying.")
+    parser.add_argument('--no-cache', action='store_true', help="Disable the result cache.")
+    parser.add_argument('--work-dir', default=os.path.join('instance', 'bench'),
+                        help="Where generated graphs are kept between runs.")
+    parser.add_argument('--json', dest='json_path', help="Write results to this file.")
+    parser.add_argument('--baseline', help="Results file of a previous run to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative p95 increase over the baseline.")
+    args = parser.parse_args(argv)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    results = {}
+    for n_items in args.items:
+        results[str(n_items)] = run_size(args, n_items)
+        print_report(n_items, results[str(n_items)])
+
+    if args.json_path:
+        meta = {k: v for k, v in vars(args).items() if k not in ('json_path', 'baseline')}
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
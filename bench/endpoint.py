@@ -0,0 +1,124 @@
+"""In-process SPARQL 1.1 protocol stand-in for benchmarks.
+
+Serves one in-memory graph over HTTP (GET `?query=` or form POST) and
+answers with SPARQL JSON results. pyoxigraph is used when installed;
+rdflib works too but is only practical for the smaller sizes.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import pyoxigraph
+except ImportError:  # pragma: no cover - optional
+    pyoxigraph = None
+
+
+class _OxigraphStore:
+    name = 'pyoxigraph'
+
+    def __init__(self, path):
+        self._store = pyoxigraph.Store()
+        self._store.bulk_load(path=path, format=pyoxigraph.RdfFormat.N_TRIPLES)
+
+    def query(self, query):
+        result = self._store.query(query)
+        return result.serialize(format=pyoxigraph.QueryResultsFormat.JSON)
+
+
+class _RdflibStore:
+    name = 'rdflib'
+
+    def __init__(self, path):
+        from rdflib import Graph
+        self._graph = Graph()
+        self._graph.parse(path, format='nt')
+        # rdflib's evaluator is not thread-safe
+        self._lock = threading.Lock()
+
+    def query(self, query):
+        with self._lock:
+            return self._graph.query(query).serialize(format='json')
+
+
+def _make_store(path, backend):
+    if backend == 'auto':
+        backend = 'pyoxigraph' if pyoxigraph is not None else 'rdflib'
+    if backend == 'pyoxigraph':
+        if pyoxigraph is None:
+            raise ValueError("pyoxigraph is not installed")
+        return _OxigraphStore(path)
+    if backend == 'rdflib':
+        return _RdflibStore(path)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+class StandInEndpoint:
+    """A SPARQL endpoint on `host:port` answering from the N-Triples
+    file at `path`, loaded into memory.
+
+    `latency` (seconds) is added to every response to mimic the network
+    round trip to a remote triplestore.
+    """
+
+    def __init__(self, path, host='127.0.0.1', port=0, backend='auto', latency=0.0):
+        self.store = _make_store(path, backend)
+        self.latency = latency
+        self.queries = 0
+        self._count_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return host, port
+
+    def _handler(self):
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _answer(self, params):
+                query = (params.get('query') or [''])[0]
+                with endpoint._count_lock:
+                    endpoint.queries += 1
+                try:
+                    body = endpoint.store.query(query)
+                    status = 200
+                except Exception as exc:  # report parse/eval errors to the client
+                    body = str(exc).encode('utf-8')
+                    status = 400
+                if endpoint.latency:
+                    time.sleep(endpoint.latency)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/sparql-results+json'
+                                 if status == 200 else 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._answer(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self._answer(parse_qs(self.rfile.read(length).decode('utf-8')))
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='sparql-stand-in', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
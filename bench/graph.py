@@ -0,0 +1,164 @@
+"""Synthetic CIDOC-CRM / LRMoo catalogues.
+
+Each item gets the chain the Aldrovandi `cards.where`, filters and item
+sidebar blocks walk: F5_Item <- manifestation <- expression <- work,
+an F28 creation with a time-span, technique and actors, a type, subjects
+and a conservation activity by an organisation. Output is N-Triples and
+fully determined by (n_items, seed).
+"""
+import os
+import random
+
+EX = 'https://example.org/bench/'
+RDF_TYPE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>'
+RDFS_LABEL = '<http://www.w3.org/2000/01/rdf-schema#label>'
+XSD_DATETIME = 'http://www.w3.org/2001/XMLSchema#dateTime'
+
+
+def _crm(name):
+    return f'<http://www.cidoc-crm.org/cidoc-crm/{name}>'
+
+
+def _lrm(name):
+    return f'<http://iflastandards.info/ns/lrm/lrmoo/{name}>'
+
+
+def _dig(name):
+    return f'<http://www.ics.forth.gr/isl/CRMdig/{name}>'
+
+
+def _aat(code, page=False):
+    return f"<http://vocab.getty.edu/{'page/' if page else ''}aat/{code}>"
+
+
+def _ex(path):
+    return f'<{EX}{path}>'
+
+
+def _lit(value, lang=None):
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"@{lang}' if lang else f'"{text}"'
+
+
+# Actor roles used by the item sidebar (creator, discoverer, ...)
+ACTOR_ROLES = ('300404387', '300404386', '300417639', '300053225', '300054686')
+
+
+class Vocabulary:
+    """Controlled values shared by the graph and the session generator."""
+
+    def __init__(self, n_items):
+        scale = max(1, n_items // 1000)
+        self.types = [f'type/{i}' for i in range(12 + 4 * scale)]
+        self.techniques = [f'technique/{i}' for i in range(10)]
+        self.subjects = [f'subject/{i}' for i in range(40 + 20 * scale)]
+        self.orgs = [f'org/{i}' for i in range(8)]
+        self.actors = [f'actor/{i}' for i in range(100 + 50 * scale)]
+        self.min_year, self.max_year = 1450, 1750
+
+    def uri(self, path):
+        return EX + path
+
+
+def _labelled(path, label_it, label_en):
+    yield f'{_ex(path)} {RDFS_LABEL} {_lit(label_it, "it")} .'
+    yield f'{_ex(path)} {RDFS_LABEL} {_lit(label_en, "en")} .'
+
+
+def _named(path, name):
+    app = f'{path}/appellation'
+    yield f'{_ex(path)} {_crm("P1_is_identified_by")} {_ex(app)} .'
+    yield f'{_ex(app)} {_crm("P190_has_symbolic_content")} {_lit(name)} .'
+
+
+def _vocabulary_triples(vocab):
+    for i, path in enumerate(vocab.types):
+        yield from _labelled(path, f'tipo {i}', f'type {i}')
+    for i, path in enumerate(vocab.techniques):
+        yield from _labelled(path, f'tecnica {i}', f'technique {i}')
+    for i, path in enumerate(vocab.subjects):
+        yield from _named(path, f'soggetto_{i:03d}')
+    for i, path in enumerate(vocab.orgs):
+        yield from _named(path, f'Istituzione {i}')
+        place = f'<https://example.org/place/City_{i}/building>'
+        yield f'{_ex(path)} {_crm("P74_has_current_or_former_residence")} {place} .'
+    for i, path in enumerate(vocab.actors):
+        yield from _named(path, f'Autore {i:04d} (fl. {1450 + i % 300})')
+
+
+TITLE_WORDS = ('Tavola', 'Disegno', 'Erbario', 'Ritratto', 'Mappa', 'Codice')
+
+
+def _item_triples(i, vocab, rng):
+    item, man, expr = f'item/{i}', f'manifestation/{i}', f'expression/{i}'
+    work, creation, span = f'work/{i}', f'creation/{i}', f'timespan/{i}'
+    title = f'work/{i}/title'
+    yield f'{_ex(item)} {RDF_TYPE} {_lrm("F5_Item")} .'
+    yield f'{_ex(man)} {_lrm("R7i_is_exemplified_by")} {_ex(item)} .'
+    yield f'{_ex(expr)} {_lrm("R4i_is_embodied_in")} {_ex(man)} .'
+    yield f'{_ex(work)} {_lrm("R3_is_realised_in")} {_ex(expr)} .'
+    yield f'{_ex(creation)} {RDF_TYPE} {_lrm("F28_Expression_Creation")} .'
+    yield f'{_ex(creation)} {_lrm("R17_created")} {_ex(expr)} .'
+    yield f'{_ex(work)} {_crm("P102_has_title")} {_ex(title)} .'
+    word = rng.choice(TITLE_WORDS)
+    yield f'{_ex(title)} {_crm("P190_has_symbolic_content")} {_lit(f"{word} {i:06d}", "it")} .'
+    yield f'{_ex(title)} {_crm("P190_has_symbolic_content")} {_lit(f"{word} {i:06d} (en)", "en")} .'
+
+    yield f'{_ex(man)} {_crm("P2_has_type")} {_ex(rng.choice(vocab.types))} .'
+    for subject in rng.sample(vocab.subjects, rng.randint(1, 3)):
+        yield f'{_ex(expr)} {_crm("P129_is_about")} {_ex(subject)} .'
+    if rng.random() < 0.9:
+        begin = rng.randint(vocab.min_year, vocab.max_year - 20)
+        end = begin + rng.choice((0, 0, 1, 5, 10, 20))
+        yield f'{_ex(creation)} {_crm("P4_has_time-span")} {_ex(span)} .'
+        yield (f'{_ex(span)} {_crm("P82a_begin_of_the_begin")} '
+               f'"{begin:04d}-01-01T00:00:00"^^<{XSD_DATETIME}> .')
+        yield (f'{_ex(span)} {_crm("P82b_end_of_the_end")} '
+               f'"{end:04d}-12-31T23:59:59"^^<{XSD_DATETIME}> .')
+    if rng.random() < 0.7:
+        yield f'{_ex(creation)} {_crm("P32_used_general_technique")} {_ex(rng.choice(vocab.techniques))} .'
+    for n, role in enumerate(rng.sample(ACTOR_ROLES, rng.randint(1, 2))):
+        activity = f'creation/{i}/activity/{n}'
+        yield f'{_ex(creation)} {_crm("P9_consists_of")} {_ex(activity)} .'
+        yield f'{_ex(activity)} {_crm("P2_has_type")} {_aat(role)} .'
+        yield f'{_ex(activity)} {_crm("P14_carried_out_by")} {_ex(rng.choice(vocab.actors))} .'
+
+    keeping = f'item/{i}/conservation'
+    yield f'{_ex(keeping)} {RDF_TYPE} {_crm("E7_Activity")} .'
+    yield f'{_ex(keeping)} {_crm("P2_has_type")} {_aat("300054277", page=True)} .'
+    yield f'{_ex(keeping)} {_crm("P16_used_specific_object")} {_ex(item)} .'
+    yield f'{_ex(keeping)} {_crm("P14_carried_out_by")} {_ex(rng.choice(vocab.orgs))} .'
+    if rng.random() < 0.3:
+        digitisation, model = f'item/{i}/digitisation', f'item/{i}/model'
+        yield f'{_ex(digitisation)} {_dig("L1_digitized")} {_ex(item)} .'
+        yield f'{_ex(digitisation)} {_dig("L11_had_output")} {_ex(model)} .'
+        yield f'{_ex(man)} {_crm("P130i_features_are_also_found_on")} <https://example.org/iiif/{i}> .'
+        yield f'{_ex("licence/cc-by")} {_crm("P67_refers_to")} {_ex(model)} .'
+
+
+def generate(n_items, seed=0):
+    """Return (vocabulary, iterator of N-Triples lines)."""
+    vocab = Vocabulary(n_items)
+    rng = random.Random(seed)
+
+    def lines():
+        yield from _vocabulary_triples(vocab)
+        yield from _named('licence/cc-by', 'CC BY 4.0')
+        for i in range(n_items):
+            yield from _item_triples(i, vocab, rng)
+
+    return vocab, lines()
+
+
+def write_graph(path, n_items, seed=0):
+    """Write the graph to `path` unless it is already there; return the vocabulary."""
+    vocab, lines = generate(n_items, seed)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line)
+                f.write('\n')
+        os.replace(tmp_path, path)
+    return vocab
@@ -0,0 +1,110 @@
+"""Catalogue sessions replayed against a running portal.
+
+A session is what one visitor's browser sends: the filter structure and
+options, the first page of cards, a few filter toggles (each one asks
+for facet counts and a new first page), sometimes a year range, a
+title search typed as you go, a deep page by offset, a couple of cursor pages and finally an item page.
+"""
+import json
+import time
+from urllib.parse import quote, urlencode
+
+from .graph import TITLE_WORDS
+
+# Request labels, in the order they are reported
+LABELS = ('filters:structure', 'filters', 'filters:counts', 'cards',
+          'cards:search', 'cards:cursor', 'cards:deep', 'item')
+
+
+class Recorder:
+    """Collects (label, seconds, ok) samples from many client threads."""
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, label, elapsed, ok):
+        # list.append is atomic, no lock needed
+        self.samples.append((label, elapsed, ok))
+
+
+class Session:
+    def __init__(self, http, base_url, collection_id, vocab, rng, recorder):
+        self.http = http
+        self.base_url = base_url
+        self.collection_id = collection_id
+        self.vocab = vocab
+        self.rng = rng
+        self.recorder = recorder
+        self.lang = rng.choice(('it', 'en'))
+        self.headers = {'Cookie': f'lang={self.lang}'}
+
+    def _request(self, label, path):
+        start = time.perf_counter()
+        try:
+            resp = self.http.request('GET', self.base_url + path, headers=self.headers)
+            ok = resp.status < 400
+        except Exception:
+            resp, ok = None, False
+        self.recorder.record(label, time.perf_counter() - start, ok)
+        if not ok or not resp.headers.get('Content-Type', '').startswith('application/json'):
+            return None
+        return json.loads(resp.data)
+
+    def _filters(self, selection=None):
+        path = f'/api/{self.collection_id}/filters?lang={self.lang}'
+        if selection:
+            return self._request('filters:counts',
+                                 f'{path}&selection={quote(json.dumps(selection))}')
+        return self._request('filters', path)
+
+    def _cards(self, selection, page=1, cursor=False, label='cards', q=None):
+        # Same GET requests as the catalogue script
+        params = {'filters': json.dumps(selection), 'page': page, 'lang': self.lang}
+        if cursor is not False:
+            params['cursor'] = cursor or ''
+        if q:
+            params['q'] = q
+        return self._request(label, f'/api/{self.collection_id}/cards?{urlencode(params)}')
+
+    def run(self):
+        rng, vocab = self.rng, self.vocab
+        self._request('filters:structure',
+                      f'/api/{self.collection_id}/filters?structureOnly=true&lang={self.lang}')
+        self._filters()
+        page = self._cards({}, cursor=None)
+
+        selection = {}
+        toggles = [('object_type', vocab.types)] * 2 + [('subject', vocab.subjects)]
+        for key, values in rng.sample(toggles, rng.randint(1, 3)):
+            selection.setdefault(key, []).append(vocab.uri(rng.choice(values)))
+            self._filters(selection)
+            page = self._cards(selection, cursor=None) or page
+        if rng.random() < 0.5:
+            begin = rng.randint(vocab.min_year, vocab.max_year - 50)
+            selection['year'] = {'min': begin, 'max': begin + rng.choice((10, 50, 100))}
+            self._filters(selection)
+            page = self._cards(selection, cursor=None) or page
+        if rng.random() < 0.5:
+            # The search box sends a request per pause while typing
+            word = rng.choice(TITLE_WORDS).lower()
+            for n in sorted(rng.sample(range(2, len(word) + 1), 2)):
+                self._cards(selection, cursor=None, label='cards:search', q=word[:n])
+
+        # Widen back to the whole catalogue and jump far into it
+        first = self._cards({}, cursor=None)
+        if first and first.get('totalPages', 1) > 1:
+            total_pages = first['totalPages']
+            self._cards({}, page=rng.randint(total_pages // 2, total_pages),
+                        label='cards:deep')
+            cursor = first.get('nextCursor')
+            for n in range(2, 4):
+                if not cursor:
+                    break
+                nxt = self._cards({}, page=n, cursor=cursor, label='cards:cursor')
+                cursor = nxt.get('nextCursor') if nxt else None
+            page = page if page and page.get('cards') else first
+
+        cards = (page or {}).get('cards') or []
+        for card in rng.sample(cards, min(len(cards), rng.randint(1, 2))):
+            self._request('item', f"/collection/{self.collection_id}/item"
+                                  f"?uri={quote(card['id'], safe='')}")
@@ -0,0 +1,36 @@
+"""Production entry point on gevent.
+
+With sockets patched, a request waiting on the triplestore parks a
+greenlet instead of holding an OS thread, so one process keeps hundreds
+of catalogue requests in flight. The views are unchanged; per-endpoint
+SPARQL concurrency is still capped by SPARQL_MAX_CONCURRENCY, which
+defaults to the pool size here. SQLite (the catalogue index and the
+shared result store) is not patched: its calls block the whole process
+while they run.
+
+    python serve.py                      # HOST/PORT from the environment
+    gunicorn -k gevent --worker-connections 1000 serve:app
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+# Greenlets are cheap: don't let the SPARQL pool queue in-flight requests,
+# nor the per-endpoint limit hold back what the pool lets through
+os.environ.setdefault('FLASK_SPARQL_WORKERS', '512')
+os.environ.setdefault('FLASK_SPARQL_MAX_CONCURRENCY', os.environ['FLASK_SPARQL_WORKERS'])
+
+from app import create_app  # noqa: E402
+
+app = create_app()
+
+if __name__ == '__main__':
+    host = os.environ.get('HOST', '0.0.0.0')
+    port = int(os.environ.get('PORT', 8000))
+    pool = Pool(int(app.config.get('MAX_CONNECTIONS', 1000)))
+    WSGIServer((host, port), app, spawn=pool).serve_forever()
@@ -0,0 +1,82 @@
+"""Shared fixtures: the app with its on-disk stores in a temporary
+directory, and a stand-in for the SPARQL endpoint."""
+import threading
+
+import pytest
+
+from app import create_app
+from app.extensions import result_cache, search_index, sparql, viz_store
+
+
+def bindings(*rows):
+    """SPARQL JSON result holding `rows`, dicts of variable -> value."""
+    return {
+        'head': {'vars': sorted({k for row in rows for k in row})},
+        'results': {'bindings': [
+            {k: {'type': 'uri' if str(v).startswith('http') else 'literal', 'value': str(v)}
+             for k, v in row.items()}
+            for row in rows]},
+    }
+
+
+class FakeEndpoint:
+    """Answers each query with the last registered answer whose marker
+    occurs in its text, and with no rows otherwise."""
+
+    def __init__(self):
+        self.answers = []
+        self.queries = []
+        self.released = threading.Event()
+
+    def answer(self, marker, result):
+        """`result` is a SPARQL JSON result, an exception to raise, or a
+        callable returning either."""
+        self.answers.insert(0, (marker, result))
+
+    def hang(self):
+        """An answer that only comes once the test is over."""
+        self.released.wait(10)
+        return bindings()
+
+    def __call__(self, endpoint, query):
+        self.queries.append(query)
+        for marker, result in self.answers:
+            if marker in query:
+                if callable(result):
+                    result = result()
+                if isinstance(result, Exception):
+                    raise result
+                return result, 0
+        return bindings(), 0
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    fake = FakeEndpoint()
+    monkeypatch.setattr(sparql, '_query', fake)
+    yield fake
+    fake.released.set()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, endpoint):
+    settings = {
+        'RESULT_STORE_PATH': '',
+        'INDEX_DIR': str(tmp_path / 'index'),
+        'SNAPSHOT_DIR': str(tmp_path / 'snapshots'),
+        'ASSETS_DIR': str(tmp_path / 'assets'),
+    }
+    for key, value in settings.items():
+        monkeypatch.setenv(f'FLASK_{key}', value)
+    app = create_app()
+    app.config['TESTING'] = True
+    # The extensions are module-level: drop what earlier tests left
+    result_cache.flush()
+    viz_store.clear()
+    search_index._indexes.clear()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
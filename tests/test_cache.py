@@ -0,0 +1,144 @@
+import time
+from concurrent.futures import Future
+
+from app.cache import ResultCache, normalize_query, query_key, resolved
+from app.result_store import SharedResultStore
+
+
+class Starts:
+    """`start` callable handing out Futures the test completes."""
+
+    def __init__(self):
+        self.futures = []
+
+    def __call__(self):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+def test_normalize_query_keeps_literals():
+    assert normalize_query('SELECT  ?x\n WHERE { ?x ?p "a  b" }') == \
+        'SELECT ?x WHERE { ?x ?p "a  b" }'
+    assert query_key('e', 'SELECT  ?x') == query_key('e', 'SELECT ?x\n')
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ResultCache()
+    cache.set('k', 'value', ttl=0.05)
+    assert cache.get('k') == 'value'
+    time.sleep(0.06)
+    assert cache.get('k') is None
+    cache.set('k', 'value', ttl=0)
+    assert cache.get('k') is None
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.evictions == 1
+
+
+def test_flush_by_tag():
+    cache = ResultCache()
+    cache.set('a1', 1, tag='a')
+    cache.set('b1', 2, tag='b')
+    assert cache.flush('a') == 1
+    assert cache.get('a1') is None
+    assert cache.get('b1') == 2
+    assert cache.flush() == 1
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache()
+    start = Starts()
+    first = cache.fetch('k', start)
+    second = cache.fetch('k', start)
+    assert first is second
+    assert len(start.futures) == 1
+    assert cache.coalesced == 1
+    start.futures[0].set_result('value')
+    assert first.result(timeout=1) == 'value'
+    # Stored before the flight ended: now a plain hit
+    assert cache.fetch('k', start).result(timeout=1) == 'value'
+    assert len(start.futures) == 1
+    assert cache.hits == 1
+
+
+def test_failed_computation_is_not_cached():
+    cache = ResultCache()
+    start = Starts()
+    future = cache.fetch('k', start)
+    start.futures[0].set_exception(RuntimeError('down'))
+    assert isinstance(future.exception(timeout=1), RuntimeError)
+    cache.fetch('k', start)
+    assert len(start.futures) == 2
+
+
+def test_start_raising_fails_the_flight():
+    cache = ResultCache()
+
+    def start():
+        raise RuntimeError('no pool')
+
+    assert isinstance(cache.fetch('k', start).exception(timeout=1), RuntimeError)
+    assert cache.stats()['in_flight'] == 0
+
+
+def test_stale_entry_is_served_during_one_refresh():
+    cache = ResultCache(stale_ttl=60)
+    cache.set('k', 'old', ttl=0.01)
+    time.sleep(0.02)
+    start, refresh = Starts(), Starts()
+    assert cache.fetch('k', start, refresh=refresh).result(timeout=1) == 'old'
+    assert cache.fetch('k', start, refresh=refresh).result(timeout=1) == 'old'
+    assert len(refresh.futures) == 1
+    assert not start.futures
+    assert cache.stale_hits == 2
+    refresh.futures[0].set_result('new')
+    assert cache.fetch('k', start).result(timeout=1) == 'new'
+
+
+def test_entry_past_stale_ttl_is_recomputed():
+    cache = ResultCache(stale_ttl=0.01)
+    cache.set('k', 'old', ttl=0.01)
+    time.sleep(0.03)
+    start = Starts()
+    future = cache.fetch('k', start)
+    assert not future.done()
+    start.futures[0].set_result('new')
+    assert future.result(timeout=1) == 'new'
+
+
+def test_flush_drops_results_of_queries_started_before():
+    cache = ResultCache()
+    start = Starts()
+    future = cache.fetch('k', start, tag='a')
+    assert cache.flush('a') == 0
+    start.futures[0].set_result('value')
+    assert future.result(timeout=1) == 'value'
+    assert cache.get('k') is None
+
+
+def test_shared_store_serves_other_caches(tmp_path):
+    store = SharedResultStore(str(tmp_path / 'results.sqlite'))
+    writer, reader = ResultCache(shared=store), ResultCache(shared=store)
+    writer.fetch(('e', 'q'), lambda: resolved({'rows': [1]}), ttl=60, tag='a')
+    start = Starts()
+    assert reader.fetch(('e', 'q'), start).result(timeout=1) == {'rows': [1]}
+    assert not start.futures
+    assert reader.shared_hits == 1
+    writer.flush('a')
+    assert store.get(('e', 'q')) is None
+
+
+def test_shared_store_disabled_without_path():
+    store = SharedResultStore(None)
+    store.set('k', 1, 60)
+    assert store.get('k') is None
+    assert store.stats() == {'enabled': False}
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from app.catalogue_index import IndexReader, build_index
+
+from .conftest import FakeEndpoint, bindings
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'data', 'configs', 'aldrovandi.json')
+
+BOTANY, ZOOLOGY = 'http://x/botany', 'http://x/zoology'
+
+
+@pytest.fixture(scope='module')
+def config():
+    with open(CONFIG, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def reader(config, tmp_path):
+    fake = FakeEndpoint()
+    fake.answer('ORDER BY ?sort_key STR(?item)', bindings(
+        {'item': 'http://x/1', 'title': 'Erbario', 'sort_key': 'erbario'},
+        {'item': 'http://x/2', 'title': 'Ornitologia', 'sort_key': 'ornitologia'},
+        {'item': 'http://x/3', 'title': 'Tavole', 'sort_key': 'tavole'}))
+    fake.answer('(?subject_uri AS ?v)', bindings(
+        {'item': 'http://x/1', 'v': BOTANY},
+        {'item': 'http://x/2', 'v': ZOOLOGY},
+        {'item': 'http://x/3', 'v': BOTANY},
+        {'item': 'http://x/3', 'v': ZOOLOGY}))
+    fake.answer('AS ?b)', bindings(
+        {'item': 'http://x/1', 'b': 1551, 'e': 1570},
+        {'item': 'http://x/2', 'b': 1599, 'e': 1603},
+        {'item': 'http://x/3', 'b': 1580, 'e': 1590}))
+    path = str(tmp_path / 'aldrovandi.sqlite')
+    build_index(config, path, lambda query: fake(None, query)[0])
+    return IndexReader(path, built_at=0)
+
+
+def _items(rows):
+    return [row['item']['value'] for row in rows]
+
+
+def test_cards_in_catalogue_order(config, reader):
+    rows, total = reader.cards('en', config['filters'], {}, 2)
+    assert total == 3
+    assert _items(rows) == ['http://x/1', 'http://x/2']
+    rows, _ = reader.cards('en', config['filters'], {}, 2, after=('erbario', 'http://x/1'))
+    assert _items(rows) == ['http://x/2', 'http://x/3']
+
+
+def test_cards_intersect_the_selection(config, reader):
+    selected = {'subject': [BOTANY], 'year': {'min': 1575}}
+    rows, total = reader.cards('en', config['filters'], selected, 10)
+    assert (_items(rows), total) == (['http://x/3'], 1)
+
+
+def test_facet_counts_ignore_their_own_selection(config, reader):
+    selected = {'subject': [BOTANY], 'year': {'max': 1595}}
+    assert reader.facet_counts('en', config['filters'], selected, 'subject') == {
+        BOTANY: 2, ZOOLOGY: 1}
@@ -0,0 +1,129 @@
+import json
+import os
+
+import pytest
+
+from app import portal
+from app.export import position, sparql_chunks
+from app.queries import compile_config, decode_cursor, encode_cursor
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'data', 'configs', 'aldrovandi.json')
+
+
+@pytest.fixture(scope='module')
+def queries():
+    with open(CONFIG, encoding='utf-8') as f:
+        return compile_config(json.load(f))['en']
+
+
+def row(sort_key, item, **extra):
+    binding = {'sort_key': {'type': 'literal', 'value': sort_key},
+               'item': {'type': 'uri', 'value': item}}
+    binding.update({k: {'type': 'literal', 'value': v} for k, v in extra.items()})
+    return binding
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor('erbario', 'http://x/1')) == ('erbario', 'http://x/1')
+    assert decode_cursor(encode_cursor(None, None)) == ('', '')
+    assert decode_cursor('') is None
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', encode_cursor('a', 'b')[:-4], 'WzFd'])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_page_seeks_past_the_last_card(queries):
+    query = queries.cursor_page({}, 10, 0, after=('erbario', 'http://x/1'))
+    assert 'FILTER( LCASE(STR(?title)) > "erbario" ||' in query
+    assert 'STR(?item) > "http://x/1"' in query
+    assert 'ORDER BY ?sort_key STR(?item)' in query
+    assert 'OFFSET' not in query
+
+
+def test_offset_and_cursor_pages_share_one_order(queries):
+    assert 'ORDER BY LCASE(STR(?title)) STR(?item)' in queries.page({}, 10, 20)
+
+
+def test_fragments_on_optional_variables_stay_after_the_optionals(queries):
+    where = queries.where({'year': {'min': 1500, 'max': 1600}})
+    assert where.index('YEAR(?end) >= 1500') > where.rindex('OPTIONAL')
+    where = queries.where({'object_type': ['http://x/t']})
+    assert where.index('VALUES ?object_type_uri') < where.index('OPTIONAL')
+
+
+@pytest.mark.parametrize('bound', ['inf', '-inf', '1e400', 'nan', 'abc'])
+def test_non_finite_range_bounds_are_rejected(queries, bound):
+    with pytest.raises(ValueError):
+        queries.where({'year': {'min': bound}})
+
+
+def test_sparql_chunks_keep_an_item_in_one_chunk(queries):
+    rows = [row('a', 'i1'), row('b', 'i2'), row('c', 'i3'), row('c', 'i3'), row('d', 'i4')]
+    sent = []
+
+    def run(query):
+        sent.append(query)
+        after = rows.index(row('c', 'i3')) if len(sent) == 2 else 0
+        return {'results': {'bindings': rows[after:after + 4] if len(sent) < 3 else []}}
+
+    chunks = list(sparql_chunks(queries, {}, run, 4))
+    assert [[position(b) for b in chunk] for chunk in chunks] == [
+        [('a', 'i1'), ('b', 'i2')], [('c', 'i3'), ('c', 'i3'), ('d', 'i4')]]
+    assert '"b" ||' in sent[1]
+
+
+def test_portal_cursor_round_trip():
+    cursor = portal.encode_cursor({'a': ('x', 'i1')}, {'b'}, {'c'}, ('y', 'i2'))
+    assert portal.decode_cursor(cursor) == ({'a': ('x', 'i1')}, {'b'}, {'c'}, ('y', 'i2'))
+    assert portal.decode_cursor(None) == ({}, set(), set(), None)
+    with pytest.raises(ValueError):
+        portal.decode_cursor('e30=')
+
+
+def test_merge_stops_at_the_first_unfinished_collection():
+    pages = {
+        'a': ([row('b', 'a1'), row('d', 'a2')], True),
+        'b': ([row('a', 'b1'), row('c', 'b2'), row('e', 'b3')], False),
+    }
+    merged, positions, done = portal.merge(pages, 10)
+    # Cards of 'a' after 'd' are unknown: 'e' of 'b' has to wait
+    assert [position(r) for _, r in merged] == [('a', 'b1'), ('b', 'a1'), ('c', 'b2'), ('d', 'a2')]
+    assert positions == {'a': ('d', 'a2'), 'b': ('c', 'b2')}
+    assert done == set()
+
+
+def test_merge_collapses_rows_of_one_item():
+    pages = {'a': ([row('x', 'a1', type_label='t1'), row('x', 'a1', type_label='t2')], False)}
+    merged, _, done = portal.merge(pages, 10)
+    assert len(merged) == 1
+    assert merged[0][1]['type_label']['value'] == 't1'
+    assert done == {'a'}
+
+
+def _page(keys, after, limit):
+    """Next `limit` (sort key, item) rows of a sorted source after `after`."""
+    rest = [k for k in keys if after is None or k > after]
+    return [row(*k) for k in rest[:limit]], len(rest) > limit
+
+
+def test_merge_pages_through_every_card_once_in_order():
+    sources = {
+        'a': sorted((f'{i:03d}', f'a{i}') for i in range(0, 90, 3)),
+        'b': sorted((f'{i:03d}', f'b{i}') for i in range(40)),
+        'c': sorted((f'{i:03d}', f'c{i}') for i in range(70, 75)),
+    }
+    positions, done, listing = {}, set(), []
+    for _ in range(100):
+        pages = {cid: _page(keys, positions.get(cid), 7)
+                 for cid, keys in sources.items() if cid not in done}
+        merged, emitted, finished = portal.merge(pages, 7)
+        positions.update(emitted)
+        done |= finished
+        listing += [(position(r), cid) for cid, r in merged]
+        if done == set(sources):
+            break
+    expected = sorted((k, cid) for cid, keys in sources.items() for k in keys)
+    assert listing == expected
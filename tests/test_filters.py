@@ -0,0 +1,67 @@
+import json
+import time
+
+from app.sparql import SparqlError
+
+from .conftest import bindings
+
+SUBJECTS = 'crm:P129_is_about ?uri'
+TYPES = 'crm:P2_has_type ?uri'
+YEARS = 'MIN(YEAR(?begin))'
+
+
+def _by_key(resp):
+    return {entry['key']: entry for entry in resp.get_json()}
+
+
+def test_facets_answer_together(client, endpoint):
+    endpoint.answer(SUBJECTS, bindings({'label': 'Botany', 'uri': 'http://x/botany'}))
+    endpoint.answer(YEARS, bindings({'min': 1550, 'max': 1600}))
+    resp = client.get('/api/aldrovandi/filters?lang=en')
+    assert resp.status_code == 200
+    facets = _by_key(resp)
+    assert facets['subject']['options'] == [{'label': 'Botany', 'uri': 'http://x/botany'}]
+    assert facets['year']['range'] == {'min': 1550, 'max': 1600}
+    assert not any(f.get('unavailable') for f in facets.values())
+
+
+def test_late_and_failing_facets_are_unavailable(app, client, endpoint):
+    app.config['FILTERS_DEADLINE'] = 0.5
+    endpoint.answer(SUBJECTS, bindings({'label': 'Botany', 'uri': 'http://x/botany'}))
+    endpoint.answer(TYPES, endpoint.hang)
+    endpoint.answer(YEARS, SparqlError('endpoint down'))
+    started = time.monotonic()
+    resp = client.get('/api/aldrovandi/filters?lang=en')
+    elapsed = time.monotonic() - started
+    assert resp.status_code == 200
+    assert elapsed < 2
+    facets = _by_key(resp)
+    assert facets['object_type']['unavailable'] is True
+    assert facets['object_type']['options'] == []
+    assert facets['year']['unavailable'] is True
+    assert 'unavailable' not in facets['subject']
+    assert facets['subject']['options'][0]['label'] == 'Botany'
+    # A partial answer must not be cached
+    assert 'ETag' not in resp.headers
+
+
+def test_selection_adds_per_option_counts(client, endpoint):
+    endpoint.answer(SUBJECTS, bindings({'label': 'Botany', 'uri': 'http://x/botany'},
+                                       {'label': 'Zoology', 'uri': 'http://x/zoology'}))
+    endpoint.answer('GROUP BY ?subject_uri', bindings({'value': 'http://x/botany', 'count': 7}))
+    selection = json.dumps({'subject': ['http://x/zoology'], 'object_type': ['http://x/t']})
+    resp = client.get('/api/aldrovandi/filters', query_string={'lang': 'en', 'selection': selection})
+    assert resp.status_code == 200
+    options = _by_key(resp)['subject']['options']
+    assert [(o['uri'], o['count']) for o in options] == [
+        ('http://x/botany', 7), ('http://x/zoology', 0)]
+    # One GROUP BY per checkbox facet, leaving out the facet's own selection
+    counts = [q for q in endpoint.queries if 'GROUP BY ?subject_uri' in q]
+    assert len(counts) == 1
+    assert 'http://x/t' in counts[0]
+    assert 'http://x/zoology' not in counts[0]
+
+
+def test_malformed_selection_is_rejected(client, endpoint):
+    resp = client.get('/api/aldrovandi/filters?lang=en&selection=[1]')
+    assert resp.status_code == 400
@@ -0,0 +1,51 @@
+from app.extensions import http_cache, registry
+
+from .conftest import bindings
+
+STRUCTURE = '/api/aldrovandi/filters?structureOnly=true'
+
+
+def test_repeated_get_is_answered_with_304(client, endpoint):
+    first = client.get(STRUCTURE + '&lang=en')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert 'max-age' in first.headers['Cache-Control']
+    again = client.get(STRUCTURE + '&lang=en', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert not again.get_data()
+
+
+def test_etag_changes_with_the_registry_version(client, endpoint, monkeypatch):
+    before = client.get(STRUCTURE + '&lang=en').headers['ETag']
+    monkeypatch.setattr(registry, 'version', lambda: 'reloaded')
+    after = client.get(STRUCTURE + '&lang=en', headers={'If-None-Match': before})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before
+
+
+def test_etag_changes_with_the_language(client, endpoint):
+    assert (client.get(STRUCTURE + '&lang=en').headers['ETag']
+            != client.get(STRUCTURE + '&lang=it').headers['ETag'])
+
+
+def test_data_etag_follows_kg_version(client, endpoint, monkeypatch):
+    endpoint.answer('crm:P129_is_about ?uri', bindings({'label': 'Botany', 'uri': 'http://x/b'}))
+    monkeypatch.setattr(http_cache, 'kg_version', '2024-01')
+    first = client.get('/api/aldrovandi/filters?lang=en')
+    queries = len(endpoint.queries)
+    # Answered before any SPARQL runs
+    assert client.get('/api/aldrovandi/filters?lang=en',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert len(endpoint.queries) == queries
+    monkeypatch.setattr(http_cache, 'kg_version', '2024-02')
+    reloaded = client.get('/api/aldrovandi/filters?lang=en',
+                          headers={'If-None-Match': first.headers['ETag']})
+    assert reloaded.status_code == 200
+    assert reloaded.headers['ETag'] != first.headers['ETag']
+
+
+def test_negotiated_language_varies_on_cookie_and_accept_language(client, endpoint):
+    resp = client.get(STRUCTURE, headers={'Accept-Language': 'en'})
+    assert {'Cookie', 'Accept-Language'} <= set(resp.vary)
+    assert 'Accept-Language' not in client.get(STRUCTURE + '&lang=en').vary
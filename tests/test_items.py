@@ -0,0 +1,29 @@
+from .conftest import bindings
+
+URIS = ['http://x/1', 'http://x/2', 'http://x/3']
+
+
+def test_missing_items_are_listed(app, client, endpoint):
+    app.config['ITEMS_CHUNK_SIZE'] = 2
+    endpoint.answer('VALUES ?item {', bindings(
+        {'item': 'http://x/1', 'title': 'Erbario'},
+        {'item': 'http://x/3', 'title': 'Tavole'}))
+    resp = client.post('/api/aldrovandi/items', json={'uris': URIS, 'lang': 'en'})
+    assert resp.status_code == 200
+    payload = resp.get_json()
+    assert list(payload['items']) == URIS
+    assert payload['items']['http://x/1']['title'] == 'Erbario'
+    assert payload['items']['http://x/2'] is None
+    assert payload['missing'] == ['http://x/2']
+    # One VALUES query per chunk
+    assert len(endpoint.queries) == 2
+
+    # Found and missing items alike are now cached
+    again = client.get('/api/aldrovandi/items', query_string={'uri': URIS, 'lang': 'en'})
+    assert again.get_json()['missing'] == ['http://x/2']
+    assert len(endpoint.queries) == 2
+
+
+def test_items_rejects_bad_uris(client, endpoint):
+    assert client.post('/api/aldrovandi/items', json={'uris': 'http://x/1'}).status_code == 400
+    assert client.post('/api/aldrovandi/items', json={'uris': ['x y']}).status_code == 400
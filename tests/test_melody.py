@@ -0,0 +1,21 @@
+import glob
+import os
+
+import pytest
+
+from app import melody
+
+CONFIGS = sorted(glob.glob(os.path.join(
+    os.path.dirname(__file__), '..', 'app', 'static', 'melody', '*.json')))
+
+
+@pytest.mark.parametrize('path', CONFIGS, ids=os.path.basename)
+def test_block_queries_parse(path):
+    prepare = pytest.importorskip('rdflib.plugins.sparql').prepareQuery
+    config = melody.load_config(path)
+    for block_id, _block, _endpoint, query in melody.block_queries(
+            config, 'https://example.org/item/1', 'en', 'https://example.org/sparql'):
+        try:
+            prepare(query)
+        except Exception as exc:
+            pytest.fail(f'block {block_id}: {exc}')
@@ -0,0 +1,39 @@
+import re
+
+_SAMPLE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*"(?:,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*")*\})?'
+    r' -?(?:\d+(?:\.\d+)?(?:e[+-]?\d+)?|\+Inf|-Inf|NaN)$')
+_COMMENT = re.compile(r'^# (?:HELP [a-zA-Z_:][a-zA-Z0-9_:]* .*|TYPE [a-zA-Z_:][a-zA-Z0-9_:]* '
+                      r'(?:counter|gauge|histogram|summary|untyped))$')
+
+
+def _collections(text):
+    return set(re.findall(r'^portal_requests_total\{collection="([^"]*)"', text, re.M))
+
+
+def test_metrics_render_prometheus_text(client, endpoint):
+    client.get('/api/aldrovandi/filters?lang=en')
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = resp.get_data(as_text=True)
+    assert text.endswith('\n')
+    for line in text.splitlines():
+        assert _COMMENT.match(line) or _SAMPLE.match(line), line
+    assert 'portal_sparql_query_duration_seconds_bucket{collection="aldrovandi"' in text
+
+
+def test_unknown_collection_ids_share_one_label(client, endpoint):
+    client.get('/api/no-such-collection/filters?lang=en')
+    client.get('/api/another-one/filters?lang=en')
+    labels = _collections(client.get('/metrics').get_data(as_text=True))
+    assert 'unknown' in labels
+    assert not labels & {'no-such-collection', 'another-one'}
+
+
+def test_metrics_token(app, client):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer nope'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
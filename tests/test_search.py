@@ -0,0 +1,69 @@
+import re
+
+import pytest
+
+from app.extensions import search_index
+from app.search import TitleIndex, tokenize
+
+from .conftest import bindings
+
+ENTRIES = [
+    ('http://x/1', 'erbario', ['Erbario di Ulisse Aldrovandi', '']),
+    ('http://x/2', 'ornitologia', ['Ornithologiae libri', 'Uccelli']),
+    ('http://x/3', 'tavole', ['Tavole acquerellate', 'Erbe e fiori']),
+    ('http://x/4', 'città', ['Città di Bologna', '']),
+]
+
+
+@pytest.fixture
+def index():
+    return TitleIndex(ENTRIES)
+
+
+def _items(index, doc_ids):
+    return [index.items[d] for d in doc_ids]
+
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize('Città  di BOLOGNA, più') == ['citta', 'di', 'bologna', 'piu']
+
+
+def test_every_term_matches_as_a_prefix(index):
+    assert _items(index, index.search('erb')) == ['http://x/1', 'http://x/3']
+    assert _items(index, index.search('e')) == ['http://x/1', 'http://x/3']
+    assert _items(index, index.search('erb aldro')) == ['http://x/1']
+    assert _items(index, index.search('e ald')) == ['http://x/1']
+    assert _items(index, index.search('CITTA')) == ['http://x/4']
+    assert index.search('erbx') == []
+    assert index.search('  ') == []
+
+
+def test_after_skips_past_the_cursor(index):
+    matches = index.search('erb')
+    assert index.after(matches, ('erbario', 'http://x/1')) == 1
+    assert index.after(matches, ('', '')) == 0
+    assert index.after(matches, ('zzz', '')) == 2
+
+
+def test_refresh_reads_only_the_titles_of_new_items(app, endpoint):
+    endpoint.answer('AS ?sort_key)', bindings(
+        {'item': 'http://x/1', 'title': 'Erbario', 'sort_key': 'erbario'},
+        {'item': 'http://x/2', 'title': 'Ornitologia', 'sort_key': 'ornitologia'}))
+    with app.app_context():
+        old = search_index._refresh('aldrovandi', 'en', None)
+        assert old.items == ['http://x/1', 'http://x/2']
+
+        endpoint.answer('SELECT DISTINCT ?item\nWHERE', bindings(
+            {'item': 'http://x/2'}, {'item': 'http://x/3'}))
+        endpoint.answer('VALUES ?item {', bindings(
+            {'item': 'http://x/3', 'title': 'Tavole', 'sort_key': 'tavole'}))
+        endpoint.queries.clear()
+        new = search_index._refresh('aldrovandi', 'en', old)
+
+    assert new.items == ['http://x/2', 'http://x/3']
+    assert new.source == old.source
+    titles = [q for q in endpoint.queries if 'AS ?sort_key)' in q]
+    assert len(titles) == 1
+    assert re.findall(r'<http://x/\d>', titles[0]) == ['<http://x/3>']
+    assert _items(new, new.search('tav')) == ['http://x/3']
+    assert new.search('erb') == []
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from app.sparql import (CircuitOpen, DeadlineExceeded, SparqlClient, SparqlError,
+                        _Breaker, remaining, reset_deadline, set_deadline)
+
+
+class Response:
+    def __init__(self, status, data=b'{"head": {"vars": []}, "results": {"bindings": []}}'):
+        self.status = status
+        self.data = data
+
+
+@pytest.fixture
+def budget():
+    tokens = []
+
+    def _set(seconds):
+        tokens.append(set_deadline(seconds))
+
+    yield _set
+    for token in reversed(tokens):
+        reset_deadline(token)
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = _Breaker(threshold=3, cooldown=60)
+    for _ in range(2):
+        assert breaker.allow()
+        assert not breaker.record(False)
+    assert breaker.allow()
+    assert breaker.record(False)
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    breaker = _Breaker(threshold=1, cooldown=0.01)
+    breaker.record(False)
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert not breaker.allow()
+    # A failed trial reopens the circuit for another cooldown
+    assert breaker.record(False)
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert not breaker.record(True)
+    assert not breaker.is_open
+    assert breaker.allow()
+
+
+def test_breaker_cancel_frees_the_trial():
+    breaker = _Breaker(threshold=1, cooldown=0)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.allow()
+
+
+def test_breaker_ignores_calls_sent_before_it_opened():
+    breaker = _Breaker(threshold=1, cooldown=60)
+    assert breaker.record(False)
+    assert not breaker.record(False)
+    assert breaker.is_open
+
+
+def test_breaker_disabled_with_zero_threshold():
+    breaker = _Breaker(threshold=0, cooldown=60)
+    for _ in range(10):
+        assert not breaker.record(False)
+    assert breaker.allow()
+
+
+def test_client_opens_circuit_on_unreachable_endpoint():
+    client = SparqlClient(connect_timeout=0.5, retries=0, breaker_threshold=2)
+    endpoint = 'http://127.0.0.1:9/sparql'
+    for _ in range(2):
+        with pytest.raises(SparqlError) as info:
+            client.query(endpoint, 'ASK {}')
+        assert not isinstance(info.value, CircuitOpen)
+    with pytest.raises(CircuitOpen):
+        client.query(endpoint, 'ASK {}')
+    assert client.breakers()[endpoint] == 'open'
+
+
+def test_budgeted_query_retries_transient_failures(budget, monkeypatch):
+    client = SparqlClient(retries=2, backoff_factor=0.01)
+    answers = [Response(503), Response(502), Response(200)]
+    monkeypatch.setattr(client, '_post', lambda *a, **kw: answers.pop(0))
+    budget(5)
+    assert client.query('http://example.org/sparql', 'ASK {}')['results'] == {'bindings': []}
+    assert not answers
+
+
+def test_budgeted_query_stops_when_budget_runs_out(budget, monkeypatch):
+    client = SparqlClient(retries=100, backoff_factor=0.05)
+    calls = []
+
+    def post(endpoint, query, **kwargs):
+        calls.append(kwargs['timeout'].total)
+        return Response(503)
+
+    monkeypatch.setattr(client, '_post', post)
+    budget(0.2)
+    started = time.monotonic()
+    with pytest.raises(SparqlError):
+        client.query('http://example.org/sparql', 'ASK {}')
+    assert time.monotonic() - started < 0.5
+    assert 1 < len(calls) < 100
+    # Every attempt's timeout fits in what was left of the budget
+    assert all(total <= 0.2 for total in calls)
+    assert remaining() <= 0.05
+
+
+def test_query_without_time_left_fails_fast(budget):
+    client = SparqlClient()
+    budget(0)
+    with pytest.raises(DeadlineExceeded):
+        client.query('http://127.0.0.1:9/sparql', 'ASK {}')
@@ -0,0 +1,45 @@
+import json
+import os
+
+from app.static_site import MANIFEST, SiteExport, item_key
+
+from .conftest import bindings
+
+ITEMS = ['http://x/1', 'http://x/2']
+
+
+def test_export_layout_and_incremental_rerun(app, endpoint, tmp_path):
+    endpoint.answer('ORDER BY ?sort_key STR(?item)', bindings(
+        {'item': ITEMS[0], 'title': 'Erbario', 'sort_key': 'erbario'},
+        {'item': ITEMS[1], 'title': 'Tavole', 'sort_key': 'tavole'}))
+    out = tmp_path / 'site'
+    stats = SiteExport(app, str(out), workers=1).run(['aldrovandi'], ['en'])
+    assert stats['items'] == 2
+
+    for rel_path in ['index.html', MANIFEST, 'en/index.html',
+                     'en/collection/aldrovandi/index.html',
+                     'en/catalogue/aldrovandi/index.html',
+                     'en/api/aldrovandi/filters.json',
+                     'en/api/aldrovandi/viz/object-types-bubble.json',
+                     *(f'en/collection/aldrovandi/item/{item_key(i)}.html' for i in ITEMS)]:
+        assert (out / rel_path).is_file(), rel_path
+    page = json.loads((out / 'en/api/aldrovandi/cards/1.json').read_text())
+    assert [card['id'] for card in page['cards']] == ITEMS
+    assert page['cards'][0]['href'] == f'/en/collection/aldrovandi/item/{item_key(ITEMS[0])}.html'
+    manifest = json.loads((out / MANIFEST).read_text())
+    assert len(manifest['items']) == 2
+
+    # Nothing changed: the manifest spares every item page
+    stats = SiteExport(app, str(out), workers=1).run(['aldrovandi'], ['en'])
+    assert (stats['items'], stats['unchanged']) == (0, 2)
+    # Unless asked for a full run
+    stats = SiteExport(app, str(out), workers=1, full=True).run(['aldrovandi'], ['en'])
+    assert stats['items'] == 2
+    assert os.path.exists(out / 'en/static')
+
+    # Pages of items gone from the collection are removed
+    endpoint.answer('ORDER BY ?sort_key STR(?item)', bindings(
+        {'item': ITEMS[0], 'title': 'Erbario', 'sort_key': 'erbario'}))
+    stats = SiteExport(app, str(out), workers=1).run(['aldrovandi'], ['en'])
+    assert (stats['unchanged'], stats['removed']) == (1, 1)
+    assert not (out / f'en/collection/aldrovandi/item/{item_key(ITEMS[1])}.html').exists()
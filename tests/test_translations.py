@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def test_template_messages_are_extracted():
+    extract = pytest.importorskip('babel.messages.extract')
+    pofile = pytest.importorskip('babel.messages.pofile')
+    with open(os.path.join(ROOT, 'messages.pot'), 'rb') as f:
+        catalog = pofile.read_po(f)
+    found = extract.extract_from_dir(
+        os.path.join(ROOT, 'app'), [('templates/**.html', 'jinja2')])
+    missing = sorted({msgid for _path, _line, msgid, _comments, _context in found
+                      if msgid not in catalog})
+    # Fix with: pybabel extract -F babel.cfg -o messages.pot .
+    assert not missing
@@ -0,0 +1,36 @@
+import time
+
+from app.extensions import viz_store
+
+from .conftest import bindings
+
+BUBBLE = '?type_label (COUNT(DISTINCT ?item) AS ?count)'
+
+
+def test_viz_api_serves_the_cached_aggregate(client, endpoint):
+    endpoint.answer(BUBBLE, bindings({'type_label': 'dipinto', 'count': 3},
+                                     {'type_label': 'Dipinto', 'count': 2}))
+    resp = client.get('/api/aldrovandi/viz/object-types-bubble?lang=it')
+    assert resp.status_code == 200
+    assert resp.get_json() == {'type': 'bubble', 'items': [{'label': 'Dipinto', 'count': 5}]}
+    etag = resp.headers['ETag']
+    again = client.get('/api/aldrovandi/viz/object-types-bubble?lang=it',
+                       headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert len(endpoint.queries) == 1
+
+
+def test_expired_aggregates_refresh_without_a_request(client, endpoint, monkeypatch):
+    endpoint.answer(BUBBLE, bindings({'type_label': 'Dipinto', 'count': 1}))
+    first = client.get('/api/aldrovandi/viz/object-types-bubble?lang=it').headers['ETag']
+    endpoint.answer(BUBBLE, bindings({'type_label': 'Dipinto', 'count': 4}))
+    monkeypatch.setattr(viz_store, 'ttl', 0)
+    viz_store.refresh_expired()
+    deadline = time.monotonic() + 2
+    while viz_store._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    monkeypatch.setattr(viz_store, 'ttl', 3600)
+    resp = client.get('/api/aldrovandi/viz/object-types-bubble?lang=it')
+    assert resp.get_json()['items'] == [{'label': 'Dipinto', 'count': 4}]
+    assert resp.headers['ETag'] != first
+    assert len(endpoint.queries) == 2